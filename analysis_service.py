@@ -0,0 +1,350 @@
+"""
+Engine analysis for /analyze, shared between concurrent requests.
+
+- Identical requests (same position and limits) in flight at the same time
+  wait on one engine search instead of each starting their own.
+- A request can name its client (one id per browser tab). A newer request
+  from the same client supersedes the older one: the older request returns
+  at once, and if nobody else is waiting on its search, the search is
+  dropped before it gets an engine or stopped if it is already running.
+- Finished searches are kept in an LRU cache, so positions seen before
+  return without an engine call.
+- prefetch() queues positions the user is likely to look at next (the
+  following plies of the open game, the main PV). A background worker
+  analyses them one at a time at background priority, and only while no
+  user search is running or waiting, here or in the engine pool (the bot).
+  A user request stops any speculative search before taking an engine.
+"""
+import time
+import threading
+import collections
+import chess
+import chess.engine
+import engine_pool
+import metrics
+
+ANALYSIS_TIME = 0.1
+MULTIPV = 3
+# How long a search may wait for a free engine before giving up
+ACQUIRE_TIMEOUT = 5.0
+CACHE_SIZE = 4096
+# Pending speculative positions; the oldest are dropped when full
+PREFETCH_QUEUE_SIZE = 64
+# Plies of the open game queued ahead of the one being viewed
+PREFETCH_PLIES = 4
+# Plies of the best line queued for pre-analysis after a user search
+PREFETCH_PV_PLIES = 2
+
+class Cancelled(Exception):
+    """The request was superseded by a newer one from the same client."""
+
+class _Search:
+    def __init__(self, key, board, speculative=False):
+        self.key = key
+        self.board = board
+        self.speculative = speculative
+        self.tickets = []
+        self.done = False
+        self.cancelled = False
+        self.result = None
+        self.error = None
+        self.analysis = None  # running SimpleAnalysisResult, for stop()
+
+class _Ticket:
+    """One waiting request."""
+    def __init__(self, search, client):
+        self.search = search
+        self.client = client
+        self.wake = threading.Event()
+        self.superseded = False
+
+def format_lines(infos):
+    """Engine multipv infos -> [{"best_move", "score" (cp, white POV), "pv"}]."""
+    lines = []
+    for info in infos:
+        if not info.get("pv") or "score" not in info:
+            continue
+        score = info["score"].white()
+        score_val = score.score() if score.score() is not None else (10000 if score.mate() > 0 else -10000)
+        lines.append({
+            "best_move": info["pv"][0].uci(),
+            "score": score_val,
+            "pv": [m.uci() for m in info["pv"][:5]]
+        })
+    return lines
+
+class AnalysisService:
+    def __init__(self, pool=None, time_limit=ANALYSIS_TIME, multipv=MULTIPV, cache_size=CACHE_SIZE):
+        self.pool = pool or engine_pool.get_pool()
+        self.time_limit = time_limit
+        self.multipv = multipv
+        self.cache_size = cache_size
+        self._inflight = {}  # key -> _Search
+        self._clients = {}   # client id -> latest _Ticket
+        self._cache = collections.OrderedDict()  # key -> lines
+        self._queue = collections.deque()        # FENs to pre-analyse, next first
+        self._queue_wake = threading.Condition()
+        self._worker = None
+        self._lock = threading.Lock()
+        # Notified when a user search finishes or is dropped
+        self._user_done = threading.Condition(self._lock)
+        self.counters = collections.Counter()
+
+    def _key(self, board):
+        return (board.fen(), self.time_limit, self.multipv)
+
+    def analyse(self, fen, client=None):
+        """
+        Returns the engine lines for the position. Raises Cancelled if a newer
+        request from `client` arrives first, or EngineUnavailable.
+        """
+        board = chess.Board(fen)
+        key = self._key(board)
+        start = None
+        with self._lock:
+            self.counters["requests"] += 1
+            if client is not None:
+                previous = self._clients.pop(client, None)
+                if previous is not None and previous.search.key != key:
+                    self._supersede(previous)
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+                self.counters["cache_hits"] += 1
+                metrics.inc("chess_mimic_analysis_cache_total", result="hit")
+                return cached
+            metrics.inc("chess_mimic_analysis_cache_total", result="miss")
+            search = self._inflight.get(key)
+            if search is None:
+                search = start = self._inflight[key] = _Search(key, board)
+                self.counters["searches"] += 1
+            else:
+                self.counters["coalesced"] += 1
+            ticket = _Ticket(search, client)
+            search.tickets.append(ticket)
+            if client is not None:
+                self._clients[client] = ticket
+        if start is not None:
+            threading.Thread(target=self._run, args=(start,), daemon=True).start()
+
+        with metrics.timer("analysis.wait"):
+            ticket.wake.wait()
+        with self._lock:
+            if client is not None and self._clients.get(client) is ticket:
+                del self._clients[client]
+        if ticket.superseded:
+            raise Cancelled()
+        if search.error is not None:
+            raise search.error
+        return search.result
+
+    def cached(self, fen):
+        """Cached lines for a position, or None."""
+        with self._lock:
+            return self._cache.get(self._key(chess.Board(fen)))
+
+    def _supersede(self, ticket):
+        """Releases a waiting request; cancels its search if it was the last waiter. Caller holds the lock."""
+        search = ticket.search
+        if search.done or ticket.superseded:
+            return
+        ticket.superseded = True
+        search.tickets.remove(ticket)
+        ticket.wake.set()
+        self.counters["superseded"] += 1
+        if not search.tickets:
+            self._cancel(search)
+            self.counters["cancelled"] += 1
+
+    def _user_searches(self):
+        """Caller holds the lock."""
+        return any(not search.speculative or search.tickets for search in self._inflight.values())
+
+    def _cancel(self, search):
+        """Caller holds the lock."""
+        search.cancelled = True
+        if self._inflight.get(search.key) is search:
+            del self._inflight[search.key]
+            self._user_done.notify_all()
+        if search.analysis is not None:
+            search.analysis.stop()
+
+    def _preempt(self):
+        """Stops speculative searches nobody is waiting on, to free their engines."""
+        with self._lock:
+            for search in list(self._inflight.values()):
+                if search.speculative and not search.tickets:
+                    self._cancel(search)
+                    self.counters["preempted"] += 1
+
+    def _finish(self, search, result=None, error=None):
+        with self._lock:
+            search.done = True
+            search.result = result
+            search.error = error
+            if self._inflight.get(search.key) is search:
+                del self._inflight[search.key]
+                self._user_done.notify_all()
+            # A stopped search only has partial lines
+            if error is None and not search.cancelled:
+                self._cache[search.key] = result
+                self._cache.move_to_end(search.key)
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+            for ticket in search.tickets:
+                ticket.wake.set()
+
+    def _run(self, search):
+        with self._lock:
+            if search.cancelled:
+                self.counters["dropped"] += 1
+                return
+        # Speculative searches never run alongside a user's, whether or not an engine is free
+        self._preempt()
+        try:
+            engine = self.pool.acquire(timeout=ACQUIRE_TIMEOUT)
+        except engine_pool.EngineUnavailable as e:
+            self._finish(search, error=e)
+            return
+        with self._lock:
+            if search.cancelled:
+                # Superseded while waiting for an engine
+                self.counters["dropped"] += 1
+                self.pool.release(engine)
+                return
+        self._search(search, engine)
+        if search.result and not search.cancelled:
+            self._prefetch_pv(search.board, search.result[0]["pv"])
+
+    def _search(self, search, engine):
+        broken = False
+        try:
+            start = time.perf_counter()
+            analysis = engine.analysis(search.board, chess.engine.Limit(time=self.time_limit), multipv=self.multipv)
+            with self._lock:
+                search.analysis = analysis
+                if search.cancelled:
+                    analysis.stop()
+            analysis.wait()
+            infos = analysis.multipv
+            metrics.engine_search(engine_pool.BACKGROUND if search.speculative else engine_pool.INTERACTIVE,
+                                  time.perf_counter() - start, infos[0] if infos else None)
+            self._finish(search, result=format_lines(infos))
+        except (chess.engine.EngineError, chess.engine.EngineTerminatedError) as e:
+            broken = True
+            self._finish(search, error=engine_pool.EngineUnavailable(str(e)))
+        except Exception as e:
+            # Never leave waiters hanging
+            self._finish(search, error=e)
+            raise
+        finally:
+            self.pool.release(engine, broken)
+
+    # --- Speculative pre-analysis ---
+
+    def prefetch(self, fens):
+        """
+        Queues positions for background analysis, the first one to be analysed
+        first. Positions that are cached or running by the time their turn
+        comes are skipped.
+        """
+        if not self.pool.available():
+            return
+        with self._queue_wake:
+            for fen in reversed(list(fens)):
+                if fen in self._queue:
+                    self._queue.remove(fen)
+                self._queue.appendleft(fen)
+            while len(self._queue) > PREFETCH_QUEUE_SIZE:
+                self._queue.pop()
+                self.counters["prefetch_dropped"] += 1
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._prefetch_loop, daemon=True)
+                self._worker.start()
+            self._queue_wake.notify()
+
+    def prefetch_game(self, fens, ply):
+        """
+        fens: the open game's positions (initial position first). Queues the
+        PREFETCH_PLIES plies after `ply` and the one before it.
+        """
+        ahead = fens[ply + 1:ply + 1 + PREFETCH_PLIES]
+        behind = [fens[ply - 1]] if ply > 0 else []
+        self.prefetch(ahead + behind)
+
+    def _prefetch_pv(self, board, pv):
+        board = board.copy(stack=False)
+        fens = []
+        for uci in pv[:PREFETCH_PV_PLIES]:
+            board.push_uci(uci)
+            fens.append(board.fen())
+        self.prefetch(fens)
+
+    def _next_prefetch(self):
+        """Pops queued positions until one is neither cached nor running; None if the queue runs out."""
+        while True:
+            with self._queue_wake:
+                if not self._queue:
+                    return None
+                fen = self._queue.popleft()
+            board = chess.Board(fen)
+            key = self._key(board)
+            with self._lock:
+                if key not in self._cache and key not in self._inflight:
+                    return board, key
+
+    def _prefetch_loop(self):
+        while True:
+            with self._queue_wake:
+                while not self._queue:
+                    self._queue_wake.wait()
+            with self._lock:
+                self._user_done.wait_for(lambda: not self._user_searches())
+            # Sleeps on the pool's condition until a background engine is free (after a scan, say)
+            try:
+                engine = self.pool.acquire(priority=engine_pool.BACKGROUND)
+            except engine_pool.EngineUnavailable:
+                # No engine to run on: drop the queue rather than retry in a loop
+                with self._queue_wake:
+                    self.counters["prefetch_dropped"] += len(self._queue)
+                    self._queue.clear()
+                continue
+            # Positions queued while waiting come first, so only choose now
+            item = self._next_prefetch()
+            if item is None:
+                self.pool.release(engine)
+                continue
+            board, key = item
+            # Interactive leases elsewhere in the pool (the bot) go first too
+            self.pool.wait_turn(engine)
+            with self._lock:
+                busy = self._user_searches()
+                search = None
+                if not busy and key not in self._cache and key not in self._inflight:
+                    search = self._inflight[key] = _Search(key, board, speculative=True)
+                    self.counters["prefetched"] += 1
+            if search is None:
+                self.pool.release(engine)
+                if busy:
+                    # A user search came in meanwhile: keep the position for after it
+                    with self._queue_wake:
+                        if board.fen() not in self._queue:
+                            self._queue.appendleft(board.fen())
+                continue
+            self._search(search, engine)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.counters, inflight=len(self._inflight), cached=len(self._cache))
+        stats["prefetch_queue"] = len(self._queue)
+        return stats
+
+_service = None
+_service_lock = threading.Lock()
+
+def get_service():
+    global _service
+    with _service_lock:
+        if _service is None:
+            _service = AnalysisService()
+        return _service
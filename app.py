@@ -3,20 +3,72 @@ import os
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 
-from flask import Flask, render_template, request, jsonify, Response
+from flask import Flask, render_template, request, jsonify, Response, send_file
 import database
-import ingest
 import positional_engine
+import position_index
+import http_cache
+import replay
+import export
+import metrics
+import profiling
 import chess.pgn
 import io
 import time
 import json as json_module
-import requests as http_requests
 import re
+import functools
+import threading
+import collections
 
 app = Flask(__name__)
+metrics.init_app(app)
+profiling.init_app(app)
+app.after_request(http_cache.compress)
 database.init_db()
 
+def read_pgn(pgn_io):
+    with metrics.timer("pgn.parse"):
+        return chess.pgn.read_game(pgn_io)
+
+def store_game(game, **fields):
+    """Inserts a parsed game with its pre-parsed replay and adds its positions to the search index."""
+    with metrics.timer("pgn.replay"):
+        game_replay = replay.pack(replay.build(game))
+    game_id = database.add_game(pgn=str(game), replay=game_replay, **fields)
+    with metrics.timer("index.game"):
+        position_index.index_game(game_id, game)
+    return game_id
+
+def _collect_metrics():
+    """
+    Counters kept by the engine pool, analysis service, model store and pawn hash.
+    Subsystems are loaded on first use; one that isn't loaded has nothing to report.
+    """
+    engine_pool = sys.modules.get("engine_pool")
+    if engine_pool is not None:
+        pool = engine_pool.get_pool()
+        stats = pool.stats()
+        for key in ("path", "threads", "counters"):
+            stats.pop(key)
+        yield from metrics.flatten("chess_mimic_engine_pool", stats)
+        for name, value in pool.counters.items():
+            yield "chess_mimic_engine_pool_events", {"event": name}, value
+    analysis_service = sys.modules.get("analysis_service")
+    if analysis_service is not None:
+        for name, value in analysis_service.get_service().stats().items():
+            yield "chess_mimic_analysis", {"stat": name}, value
+    model_store = sys.modules.get("model_store")
+    if model_store is not None:
+        store = model_store.get_store().stats()
+        yield "chess_mimic_models_loaded", {}, len(store["models"])
+        yield "chess_mimic_models_memory_bytes", {}, store["memory_used"]
+        for name, value in store["counters"].items():
+            yield "chess_mimic_models_events", {"event": name}, value
+    yield from metrics.flatten("chess_mimic_pawn_cache", positional_engine.pawn_cache_info())
+
+metrics.register_collector(_collect_metrics)
+
 # Force reload
 @app.route('/')
 def index():
@@ -36,7 +88,7 @@ def upload_pgn():
     
     games_added = 0
     while True:
-        game = chess.pgn.read_game(pgn_io)
+        game = read_pgn(pgn_io)
         if game is None:
             break
         
@@ -61,8 +113,8 @@ def upload_pgn():
                     if is_black_generic: black = black_parsed
             except: pass
 
-        database.add_game(
-            pgn=str(game),
+        store_game(
+            game,
             white=white,
             black=black,
             result=h.get("Result", "*"),
@@ -73,6 +125,7 @@ def upload_pgn():
     return jsonify({"success": True, "count": games_added})
 
 @app.route('/players')
+@http_cache.versioned
 def get_players():
     games = database.get_all_games()
     players = set()
@@ -84,6 +137,7 @@ def get_players():
     return jsonify(sorted(players, key=str.lower))
 
 @app.route('/tree')
+@http_cache.versioned
 def get_tree():
     game_ids_param = request.args.get('game_ids', '')
     if not game_ids_param.strip():
@@ -92,39 +146,28 @@ def get_tree():
         game_ids = set(int(x) for x in game_ids_param.split(',') if x.strip())
     except ValueError:
         return jsonify({}), 400
-    games = database.get_all_games()
-    move_db = {} 
-    for g in games:
+    move_db = {}
+    for g in database.get_all_games():
         if g['id'] not in game_ids: continue
         pgn_io = io.StringIO(g['pgn'])
-        game = chess.pgn.read_game(pgn_io)
+        game = read_pgn(pgn_io)
         if not game: continue
-        white = game.headers.get("White", "")
-        black = game.headers.get("Black", "")
-        res = g.get('result', '*')  # Use database result (correctly parsed), not PGN header
-        stat = "draw"
-        if res == "1-0": stat = "win"
-        elif res == "0-1": stat = "loss"
         # Load stored evals for this game
         game_evals = []
         if g.get('evals'):
             try: game_evals = json_module.loads(g['evals'])
             except: pass
-        board = game.board()
-        for move_idx, move in enumerate(game.mainline_moves()):
-            fen = " ".join(board.fen().split(' ')[:3])
-            move_san = board.san(move)
+        # Use database result (correctly parsed), not PGN header
+        for fen, move_san, stat, move_eval in export.tree_moves(game, g.get('result', '*'), game_evals):
             if fen not in move_db: move_db[fen] = {}
             if move_san not in move_db[fen]:
                 move_db[fen][move_san] = {"count": 0, "win": 0, "loss": 0, "draw": 0, "eval_sum": 0, "eval_count": 0}
             m = move_db[fen][move_san]
             m["count"] += 1
             m[stat] += 1
-            # Add eval if available (eval at move_idx = eval after this move)
-            if move_idx < len(game_evals):
-                m["eval_sum"] += game_evals[move_idx]
+            if move_eval is not None:
+                m["eval_sum"] += move_eval
                 m["eval_count"] += 1
-            board.push(move)
     # Compute average eval and remove accumulator fields
     for fen in move_db:
         for san in move_db[fen]:
@@ -137,38 +180,98 @@ def get_tree():
             del m["eval_count"]
     return jsonify(move_db)
 
+@app.route('/search/position')
+def search_position():
+    fen = request.args.get('fen', '').strip()
+    if not fen:
+        return jsonify({"error": "fen required"}), 400
+    try:
+        games = position_index.search_position(fen)
+    except ValueError:
+        return jsonify({"error": "Invalid FEN"}), 400
+    return jsonify({"fen": fen, "games": games})
+
+@app.route('/search/structure')
+def search_structure():
+    import structure_index
+    fen = request.args.get('fen', '').strip()
+    if not fen:
+        return jsonify({"error": "fen required"}), 400
+    mode = request.args.get('mode', 'pawns')
+    try:
+        max_distance = int(request.args.get('max_distance', 4))
+        limit = int(request.args.get('limit', 50))
+        games = structure_index.search_structure(fen, mode=mode, max_distance=max_distance, limit=limit)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"fen": fen, "mode": mode, "games": games})
+
 @app.route('/games', methods=['GET'])
+@http_cache.versioned
 def list_games():
     return jsonify(database.get_all_games())
 
+# Games opened recently: game id -> (ETag, first positions), so a 304 can queue them without a read
+OPENED_GAMES_SIZE = 64
+
+def _prefetch_opened_game(view):
+    """
+    Queues the first plies of the opened game for pre-analysis on every open,
+    including the cached bodies and 304s @versioned answers without the view.
+    A 304 reuses the positions kept from the game's last 200 with the same
+    ETag, and queues nothing if there are none.
+    """
+    opened = collections.OrderedDict()
+    opened_lock = threading.Lock()
+
+    @functools.wraps(view)
+    def wrapper(game_id):
+        response = view(game_id)
+        if response.status_code not in (200, 304):
+            return response
+        import engine_pool
+        if not engine_pool.get_pool().available():
+            return response
+        import analysis_service
+        etag = response.get_etag()[0]
+        if response.status_code == 304:
+            with opened_lock:
+                kept = opened.get(game_id)
+            fens = kept[1] if kept is not None and kept[0] == etag else None
+        else:
+            game_replay = replay.unpack(database.get_game_replay(game_id))
+            # The first plies are what the user looks at next
+            fens = replay.fens(game_replay)[:analysis_service.PREFETCH_PLIES + 1] if game_replay is not None else None
+            with opened_lock:
+                opened[game_id] = (etag, fens)
+                opened.move_to_end(game_id)
+                while len(opened) > OPENED_GAMES_SIZE:
+                    opened.popitem(last=False)
+        if fens:
+            analysis_service.get_service().prefetch_game(fens, 0)
+        return response
+    return wrapper
+
 @app.route('/games/<int:game_id>', methods=['GET'])
+@_prefetch_opened_game
+@http_cache.versioned
 def get_game(game_id):
-    games = database.get_all_games()
-    game = next((g for g in games if g['id'] == game_id), None)
+    game = database.get_game_view(game_id)
     if not game: return jsonify({"error": "No game"}), 404
-    
-    pgn_io = io.StringIO(game['pgn'])
-    parsed_game = chess.pgn.read_game(pgn_io)
-    moves = []
-    board = parsed_game.board()
-    
-    import json
+
+    game_replay = replay.unpack(game['replay'])
+    if game_replay is None:
+        # Stored before replays existed, or the PGN changed since
+        with metrics.timer("pgn.replay"):
+            game_replay = replay.build_from_pgn(game['pgn'] or database.get_game(game_id)['pgn'])
+        if game_replay is None: return jsonify({"error": "Unreadable PGN"}), 500
+        database.save_replay(game_id, replay.pack(game_replay))
+
     db_annotations = {}
     if game.get('annotations'):
-        try: db_annotations = json.loads(game['annotations'])
+        try: db_annotations = json_module.loads(game['annotations'])
         except: pass
 
-    # FIXED LOGIC: Store FEN AFTER move is pushed
-    for move in parsed_game.mainline_moves():
-        san = board.san(move)
-        board.push(move)
-        fen_after = board.fen()
-        moves.append({
-            "san": san,
-            "fen": fen_after,
-            "comment": db_annotations.get(fen_after, "")
-        })
-        
     # Parse saved evals
     saved_evals = []
     if game.get('evals'):
@@ -177,8 +280,9 @@ def get_game(game_id):
 
     return jsonify({
         "id": game['id'], "white": game['white'], "black": game['black'],
-        "date": game['date'], "result": game['result'], "moves": moves,
-        "initial_fen": parsed_game.board().fen(),
+        "date": game['date'], "result": game['result'],
+        "moves": replay.moves(game_replay, db_annotations),
+        "initial_fen": game_replay['initial_fen'],
         "evals": saved_evals
     })
 
@@ -208,23 +312,44 @@ def get_game_puzzles(game_id):
     puzzles = database.get_puzzles(game_id)
     return jsonify(puzzles)
 
+@app.route('/puzzles/rethreshold', methods=['POST'])
+def rethreshold_puzzles():
+    """
+    Re-derives puzzles from stored evals with a new threshold, for one game
+    (game_id), one folder (folder_id) or the whole library. mode "cp" compares
+    centipawns like the scan; "winprob" compares win probability (0-100).
+    The engine is only used for best moves that were never stored.
+    """
+    import puzzle_finder
+    body = request.get_json(silent=True) or {}
+    mode = body.get('mode', 'cp')
+    try:
+        threshold = float(body.get('threshold', 100 if mode == 'cp' else 15))
+        game_ids = [int(body['game_id'])] if body.get('game_id') is not None else None
+        folder_id = int(body['folder_id']) if body.get('folder_id') is not None else None
+        stats = puzzle_finder.rethreshold(threshold, mode, folder_id=folder_id, game_ids=game_ids)
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"success": True, "threshold": threshold, "mode": mode, **stats})
+
 @app.route('/games/<int:game_id>/scan', methods=['POST'])
 def scan_game_puzzles(game_id):
+    import engine_pool
+    import player_stats
     games = database.get_all_games()
     game = next((g for g in games if g['id'] == game_id), None)
     if not game: return jsonify({"error": "No game"}), 404
     
     # Clear existing puzzles for this game to avoid duplicates on re-scan
-    with database.get_db() as conn:
-        conn.execute("DELETE FROM puzzles WHERE game_id = ?", (game_id,))
+    database.delete_puzzles(game_id)
 
     pgn_io = io.StringIO(game['pgn'])
-    parsed_game = chess.pgn.read_game(pgn_io)
+    parsed_game = read_pgn(pgn_io)
     board = parsed_game.board()
-    engine_path = os.path.join(BASE_DIR, "engines", "stockfish")
     puzzles_found = 0
+    pool = engine_pool.get_pool()
     
-    with chess.engine.SimpleEngine.popen_uci(engine_path) as engine:
+    with pool.engine(priority=engine_pool.BACKGROUND) as engine:
         prev_eval = 0
         prev_fen = None
         prev_best_move = None
@@ -232,7 +357,8 @@ def scan_game_puzzles(game_id):
         
         for i, move in enumerate(parsed_game.mainline_moves()):
             current_fen = board.fen()
-            info = engine.analyse(board, chess.engine.Limit(time=0.1))
+            pool.wait_turn(engine)
+            info = engine_pool.analyse(engine, board, chess.engine.Limit(time=0.1), engine_pool.BACKGROUND)
             current_best_move = info["pv"][0]
             
             score = info["score"].white()
@@ -259,11 +385,19 @@ def scan_game_puzzles(game_id):
             prev_best_move = current_best_move
             prev_move = move
             board.push(move)
-            
+
+    player_stats.update_games([game_id])
     return jsonify({"success": True, "count": puzzles_found})
 
 @app.route('/games/<int:game_id>/scan-chunked', methods=['POST'])
 def scan_game_chunked(game_id):
+    """
+    Scans a game for puzzles, streaming progress as SSE every chunk_size plies.
+    workers: engines analysing ranges of the game at once (0 = as many as the
+    pool allows, default 1); events and puzzles come out in ply order either way.
+    """
+    import parallel_scan
+    import player_stats
     games = database.get_all_games()
     game = next((g for g in games if g['id'] == game_id), None)
     if not game:
@@ -271,82 +405,67 @@ def scan_game_chunked(game_id):
 
     body = request.get_json(silent=True) or {}
     chunk_size = body.get('chunk_size', 10)
-    delay_ms = body.get('delay_ms', 500)
     threshold = body.get('threshold', 100)
+    workers = body.get('workers', 1)
+    # Checked before the stream starts: errors inside it come after the 200
+    if type(workers) is not int or workers < 0:
+        return jsonify({"error": "workers must be a non-negative integer"}), 400
+    if type(chunk_size) is not int or chunk_size < 1:
+        return jsonify({"error": "chunk_size must be a positive integer"}), 400
 
     # Clear existing puzzles
-    with database.get_db() as conn:
-        conn.execute("DELETE FROM puzzles WHERE game_id = ?", (game_id,))
+    database.delete_puzzles(game_id)
 
     pgn_io = io.StringIO(game['pgn'])
-    parsed_game = chess.pgn.read_game(pgn_io)
+    parsed_game = read_pgn(pgn_io)
     all_moves = list(parsed_game.mainline_moves())
     total_moves = len(all_moves)
 
     def generate():
         board = parsed_game.board()
-        engine_path = os.path.join(BASE_DIR, "engines", "stockfish")
         puzzles_found = 0
         all_evals = []
+        all_best_moves = []
+        prev_fen = None
+
+        for i, current_eval, current_best_move in parallel_scan.analyse_game(
+                parsed_game.board(), all_moves, chunk_size, workers):
+            # Results arrive in ply order, so the previous ply is always known
+            if i > 0:
+                prev_eval = all_evals[-1]
+                eval_diff = abs(current_eval - prev_eval)
+                if eval_diff > threshold:
+                    database.add_puzzle(
+                        game_id=game_id,
+                        fen=prev_fen,
+                        best_move=all_best_moves[-1],
+                        played_move=all_moves[i - 1].uci(),
+                        score_before=prev_eval,
+                        score_after=current_eval,
+                        move_number=((i - 1) // 2) + 1,
+                        move_index=i - 1,
+                        turn="white" if (i - 1) % 2 == 0 else "black"
+                    )
+                    puzzles_found += 1
+
+            all_evals.append(current_eval)
+            all_best_moves.append(current_best_move)
+            prev_fen = board.fen()
+            board.push(all_moves[i])
 
-        with chess.engine.SimpleEngine.popen_uci(engine_path) as engine:
-            prev_eval = 0
-            prev_fen = None
-            prev_best_move = None
-            prev_move = None
-
-            for chunk_start in range(0, total_moves, chunk_size):
-                chunk_end = min(chunk_start + chunk_size, total_moves)
-
-                for i in range(chunk_start, chunk_end):
-                    move = all_moves[i]
-                    current_fen = board.fen()
-                    info = engine.analyse(board, chess.engine.Limit(time=0.1))
-                    current_best_move = info["pv"][0]
-
-                    score = info["score"].white()
-                    current_eval = score.score() if score.score() is not None else (10000 if score.mate() > 0 else -10000)
-
-                    if i > 0:
-                        eval_diff = abs(current_eval - prev_eval)
-                        if eval_diff > threshold:
-                            database.add_puzzle(
-                                game_id=game_id,
-                                fen=prev_fen,
-                                best_move=prev_best_move.uci(),
-                                played_move=prev_move.uci(),
-                                score_before=prev_eval,
-                                score_after=current_eval,
-                                move_number=((i - 1) // 2) + 1,
-                                move_index=i - 1,
-                                turn="white" if (i - 1) % 2 == 0 else "black"
-                            )
-                            puzzles_found += 1
-
-                    prev_eval = current_eval
-                    all_evals.append(current_eval)
-                    prev_fen = current_fen
-                    prev_best_move = current_best_move
-                    prev_move = move
-                    board.push(move)
-
-                # Emit progress after each chunk
+            # Emit progress after each chunk
+            if (i + 1) % chunk_size == 0 or i + 1 == total_moves:
                 event_data = json_module.dumps({
-                    "progress": chunk_end,
+                    "progress": i + 1,
                     "total": total_moves,
                     "puzzles_so_far": puzzles_found,
                     "evals": all_evals
                 })
                 yield f"data: {event_data}\n\n"
 
-                # Delay between chunks (skip on last chunk)
-                if chunk_end < total_moves:
-                    time.sleep(delay_ms / 1000.0)
-
-        # Save evals to database
-        with database.get_db() as conn:
-            conn.execute("UPDATE games SET evals = ? WHERE id = ?",
-                         (json_module.dumps(all_evals), game_id))
+        # Save evals (and best moves, for re-thresholding without the engine) to database
+        database.save_evals(game_id, json_module.dumps(all_evals), json_module.dumps(all_best_moves))
+        player_stats.update_games([game_id])
 
         # Final done event
         done_data = json_module.dumps({
@@ -363,6 +482,7 @@ def scan_game_chunked(game_id):
 # --- Folder endpoints ---
 
 @app.route('/folders', methods=['GET'])
+@http_cache.versioned
 def list_folders():
     folders = database.get_all_folders()
     stats = database.get_folder_stats()
@@ -405,27 +525,91 @@ def move_game(game_id):
     database.move_game_to_folder(game_id, folder_id)
     return jsonify({"success": True})
 
+# --- Statistics endpoints ---
+
+@app.route('/stats', methods=['GET'])
+@http_cache.versioned
+def get_stats():
+    """
+    Average centipawn loss, accuracy and inaccuracy/mistake/blunder counts by
+    phase, side and month (?trend=year) for ?player= (either colour) and/or
+    ?folder_id=, from the stored evals; no engine involved.
+    """
+    import player_stats
+    player = request.args.get('player', '').strip() or None
+    folder_id = request.args.get('folder_id', type=int)
+    try:
+        return jsonify(player_stats.report(player, folder_id, request.args.get('trend', 'month')))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+# --- Export endpoints ---
+# Streamed straight from export's generators: constant memory whatever the library size.
+
+def _export_filters():
+    folder_id = request.args.get('folder_id', type=int)
+    game_ids_param = request.args.get('game_ids', '')
+    game_ids = [int(x) for x in game_ids_param.split(',') if x.strip()] if game_ids_param.strip() else None
+    return folder_id, game_ids
+
+def _download(chunks, mimetype, filename):
+    return Response(chunks, mimetype=mimetype,
+                    headers={"Content-Disposition": f'attachment; filename="{filename}"'})
+
+@app.route('/export/pgn')
+def export_games_pgn():
+    """All games (or ?folder_id= / ?game_ids=) as PGN with annotations and [%eval] comments."""
+    try:
+        folder_id, game_ids = _export_filters()
+    except ValueError:
+        return jsonify({"error": "Invalid game_ids"}), 400
+    return _download(export.export_pgn(folder_id, game_ids), 'application/x-chess-pgn', 'chess-mimic.pgn')
+
+@app.route('/export/puzzles')
+def export_puzzles():
+    """Puzzles as CSV (default) or ?format=ndjson, optionally for one ?folder_id=."""
+    folder_id = request.args.get('folder_id', type=int)
+    if request.args.get('format') == 'ndjson':
+        return _download(export.export_puzzles_ndjson(folder_id), 'application/x-ndjson', 'puzzles.ndjson')
+    return _download(export.export_puzzles_csv(folder_id), 'text/csv', 'puzzles.csv')
+
+@app.route('/export/tree')
+def export_tree():
+    """The opening tree as NDJSON, one position per line."""
+    try:
+        folder_id, game_ids = _export_filters()
+    except ValueError:
+        return jsonify({"error": "Invalid game_ids"}), 400
+    return _download(export.export_tree_ndjson(folder_id, game_ids), 'application/x-ndjson', 'tree.ndjson')
+
 @app.route('/analyze')
 def analyze_fen():
+    """
+    ?fen=...&client=<tab id>[&game_id=..&ply=..]. Identical concurrent requests
+    share one engine search; a newer request from the same client cancels the
+    older one (409). With game_id/ply, the neighbouring plies of that game are
+    queued for pre-analysis.
+    """
+    import engine_pool
+    import analysis_service
     fen = request.args.get('fen', chess.STARTING_FEN)
-    
+    client = request.args.get('client')
+    game_id = request.args.get('game_id', type=int)
+    ply = request.args.get('ply', type=int)
+
     # 1. Engine Analysis (Tactical)
-    engine_path = os.path.join(BASE_DIR, "engines", "stockfish")
-    if not os.path.exists(engine_path): return jsonify({"error": "No engine"}), 404
-    
-    board = chess.Board(fen)
-    tactical_data = []
-    with chess.engine.SimpleEngine.popen_uci(engine_path) as engine:
-        results = engine.analyse(board, chess.engine.Limit(time=0.1), multipv=3)
-        for res in results:
-            score = res["score"].white()
-            score_val = score.score() if score.score() is not None else (10000 if score.mate() > 0 else -10000)
-            tactical_data.append({
-                "best_move": res["pv"][0].uci(), 
-                "score": score_val, 
-                "pv": [m.uci() for m in res["pv"][:5]]
-            })
-            
+    if not engine_pool.get_pool().available(): return jsonify({"error": "No engine"}), 404
+
+    try:
+        tactical_data = analysis_service.get_service().analyse(fen, client)
+    except analysis_service.Cancelled:
+        return jsonify({"cancelled": True}), 409
+    except engine_pool.EngineUnavailable as e:
+        return jsonify({"error": str(e)}), 503
+
+    if game_id is not None and ply is not None:
+        prefetch_game_plies(game_id, ply, fen)
+
     # 2. Positional Analysis
     positional_data = positional_engine.analyze_positional_features(fen)
     
@@ -434,12 +618,210 @@ def analyze_fen():
         "positional": positional_data
     })
 
+def prefetch_game_plies(game_id, ply, fen):
+    import analysis_service
+    game = database.get_game_view(game_id)
+    game_replay = replay.unpack(game['replay']) if game else None
+    if game_replay is None:
+        return
+    fens = replay.fens(game_replay)
+    # Only if the client is really on that ply of the game
+    if 0 <= ply < len(fens) and fens[ply] == fen:
+        analysis_service.get_service().prefetch_game(fens, ply)
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Prometheus text exposition: request/stage latency histograms, engine and cache counters."""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/profiles', methods=['GET'])
+def list_profiles():
+    """Saved request profiles (newest first) and the state of the profiling window."""
+    return jsonify({"profiles": profiling.list_profiles(), "window": profiling.window_status()})
+
+@app.route('/profiles/window', methods=['POST'])
+def open_profile_window():
+    """Profile every request (or those under `path`) for the next `seconds`."""
+    body = request.get_json(silent=True) or {}
+    try:
+        seconds = float(body.get('seconds', 60))
+    except (TypeError, ValueError):
+        return jsonify({"error": "seconds must be a number"}), 400
+    return jsonify(profiling.open_window(seconds, body.get('path')))
+
+@app.route('/profiles/window', methods=['DELETE'])
+def close_profile_window():
+    return jsonify(profiling.close_window())
+
+@app.route('/profiles/<name>', methods=['GET'])
+def get_profile(name):
+    """Downloads a .prof file, or with ?format=text returns its pstats report."""
+    if request.args.get('format') == 'text':
+        report = profiling.summary(name, request.args.get('sort', 'cumulative'), request.args.get('limit', 60, type=int))
+        if report is None:
+            return jsonify({"error": "Profile not found"}), 404
+        return Response(report, mimetype='text/plain')
+    path = profiling.profile_path(name)
+    if path is None:
+        return jsonify({"error": "Profile not found"}), 404
+    return send_file(path, mimetype='application/octet-stream', as_attachment=True, download_name=name)
+
+@app.route('/engine')
+def engine_status():
+    """Engine budget, queue depths per priority and utilisation."""
+    import engine_pool
+    return jsonify(engine_pool.get_pool().stats())
+
+@app.route('/analyze/stats')
+def analyze_stats():
+    """Request, search, cache and prefetch counters."""
+    import analysis_service
+    return jsonify(analysis_service.get_service().stats())
+
+@app.route('/positional/batch', methods=['POST'])
+def positional_batch_analysis():
+    """
+    Body: {"fens": [...]} | {"game_id": int} | {"game_ids": [...], "player": str}
+    FENs return findings per FEN, one game returns findings for every ply,
+    several games return per-game summaries (and a player profile if given).
+    """
+    import positional_batch
+    data = request.get_json(silent=True) or {}
+    if 'fens' in data:
+        fens = data['fens']
+        if not isinstance(fens, list) or not all(isinstance(fen, str) for fen in fens):
+            return jsonify({"error": "fens must be a list of FEN strings"}), 400
+        try:
+            return jsonify({"results": positional_batch.analyze_fens(fens)})
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+    if 'game_id' in data:
+        try:
+            game_id = int(data['game_id'])
+        except (TypeError, ValueError):
+            return jsonify({"error": "game_id must be an integer"}), 400
+        results = positional_batch.analyze_games([game_id])
+        if game_id not in results:
+            return jsonify({"error": "No game"}), 404
+        return jsonify(dict(results[game_id], game_id=game_id))
+
+    game_ids = data.get('game_ids')
+    if not game_ids:
+        return jsonify({"error": "fens, game_id or game_ids required"}), 400
+    try:
+        if not isinstance(game_ids, list):
+            raise TypeError
+        game_ids = [int(gid) for gid in game_ids]
+    except (TypeError, ValueError):
+        return jsonify({"error": "game_ids must be a list of integers"}), 400
+    results = positional_batch.analyze_games(game_ids)
+    response = {
+        "games": [{"game_id": gid, "summary": results[gid]["summary"]} for gid in game_ids if gid in results],
+        "pawn_cache": positional_batch.pawn_cache_stats()
+    }
+    if data.get('player'):
+        games = database.get_games_by_ids(results.keys())
+        response["profile"] = positional_batch.player_profile(results, games, data['player'])
+    return jsonify(response)
+
+@app.route('/positional/cache')
+def positional_cache_stats():
+    import positional_batch
+    return jsonify({
+        "process": positional_engine.pawn_cache_info(),
+        "batch": positional_batch.pawn_cache_stats()
+    })
+
+# --- Mimic prediction ---
+
+@app.route('/mimic/predict')
+def mimic_predict():
+    import model_store
+    import position_neighbors
+    fen = request.args.get('fen', chess.STARTING_FEN)
+    player = request.args.get('player', '').strip() or None
+    try:
+        board = chess.Board(fen)
+        limit = int(request.args.get('limit', 5))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    store = model_store.get_store()
+    model = store.get(player)
+    has_neighbors = bool(player) and position_neighbors.get_index(player) is not None
+    if model is None and not has_neighbors:
+        return jsonify({"error": "No model for player"}), 404
+    moves = store.predict(board, player, limit=limit) if model else []
+    source = "model"
+    if not moves and has_neighbors:
+        # Unseen position: predict from the most similar positions in the player's history
+        moves = position_neighbors.predict(board, player, limit=limit)
+        source = "neighbors"
+    for m in moves:
+        m["san"] = board.san(chess.Move.from_uci(m["move"]))
+    return jsonify({"fen": fen, "player": player, "known": source == "model" and bool(moves),
+                    "source": source, "moves": moves,
+                    "model_mtime": model.mtime if model else None})
+
+@app.route('/mimic/models')
+def mimic_models():
+    import model_store
+    return jsonify(model_store.get_store().stats())
+
+@app.route('/mimic/book', methods=['GET', 'POST'])
+def mimic_book():
+    """
+    The player's model as a Polyglot .bin book, for UCI GUIs and engines.
+    GET downloads it, compiling it first if missing or older than the model;
+    ?weighting=score weights moves by 2 * wins + draws instead of by count.
+    POST recompiles the book the model store serves from.
+    """
+    import model_store
+    import polyglot_book
+    data = request.get_json(silent=True) or request.args
+    player = (data.get('player') or '').strip() or None
+    if not os.path.exists(model_store.model_path(player)):
+        return jsonify({"error": "No model for player"}), 404
+    path = model_store.book_path(player)
+    if request.method == 'POST':
+        entries = model_store.compile_book(player)
+        return jsonify({"success": True, "entries": entries, "path": os.path.relpath(path, BASE_DIR)})
+    weighting = data.get('weighting', 'count')
+    if weighting != 'count':
+        try:
+            book = polyglot_book.book_bytes(model_store.load_raw(player), weighting)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        return send_file(io.BytesIO(book), mimetype='application/octet-stream', as_attachment=True,
+                         download_name=os.path.basename(path).replace(".bin", f"_{weighting}.bin"))
+    if model_store.source_path(player) != path:
+        model_store.compile_book(player)
+    return send_file(path, mimetype='application/octet-stream', as_attachment=True,
+                     download_name=os.path.basename(path))
+
+@app.route('/bot/move', methods=['GET', 'POST'])
+def bot_move():
+    import bot
+    data = request.get_json(silent=True) or request.args
+    fen = data.get('fen', chess.STARTING_FEN)
+    player = (data.get('player') or '').strip() or None
+    try:
+        budget_ms = float(data.get('budget_ms', bot.DEFAULT_BUDGET_MS))
+        temperature = float(data.get('temperature', 1.0))
+        result = bot.choose_move(fen, player, budget_ms=budget_ms, temperature=temperature)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if result["move"] is None:
+        return jsonify(dict(result, error="No legal moves")), 400
+    return jsonify(dict(result, fen=fen, player=player))
+
 # --- Lichess Import ---
 
 LICHESS_API = 'https://lichess.org'
 
 @app.route('/lichess/studies')
 def lichess_studies():
+    import requests as http_requests
     username = request.args.get('username', '').strip()
     if not username:
         return jsonify({"error": "Username required"}), 400
@@ -507,6 +889,7 @@ def parse_players_from_event(event_name):
 
 @app.route('/lichess/import', methods=['POST'])
 def lichess_import():
+    import requests as http_requests
     data = request.json
     study_id = data.get('study_id', '').strip()
     study_name = data.get('study_name', 'Lichess Study')
@@ -544,10 +927,9 @@ def lichess_import():
     pgn_io = io.StringIO(pgn_text)
     imported = 0
     while True:
-        game = chess.pgn.read_game(pgn_io)
+        game = read_pgn(pgn_io)
         if game is None:
             break
-        game_pgn = str(game)
         headers_dict = dict(game.headers)
         event_name = headers_dict.get('Event', '?')
 
@@ -584,8 +966,8 @@ def lichess_import():
         if not game_date or game_date.startswith('???'):
             game_date = study_date
 
-        game_id = database.add_game(
-            pgn=game_pgn,
+        game_id = store_game(
+            game,
             name=chapter_name,
             white=white,
             black=black,
@@ -0,0 +1,73 @@
+"""
+Move latency of the "play like player X" bot under concurrent games.
+
+    python benchmarks/bench_bot.py "<player>" [--games 8] [--moves 40] [--budget 300]
+
+Each game runs in its own thread: the bot picks a move for the player's side,
+a random opponent replies. Reports p50/p99/max latency per source
+(model / neighbors / engine / fallback) and the share of budget overruns.
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import threading
+import collections
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+import chess
+import bot
+
+def percentile(values, p):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100.0 * (len(values) - 1))))]
+
+def play_game(seed, player, moves, budget_ms, samples, lock):
+    rng = random.Random(seed)
+    board = chess.Board()
+    bot_color = chess.WHITE if seed % 2 == 0 else chess.BLACK
+    while not board.is_game_over() and board.ply() < moves * 2:
+        if board.turn == bot_color:
+            start = time.perf_counter()
+            result = bot.choose_move(board.fen(), player, budget_ms=budget_ms, rng=rng)
+            elapsed = (time.perf_counter() - start) * 1000
+            with lock:
+                samples[result["source"]].append(elapsed)
+            board.push_uci(result["move"])
+        else:
+            board.push(rng.choice(list(board.legal_moves)))
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("player", nargs="?")
+    parser.add_argument("--games", type=int, default=8)
+    parser.add_argument("--moves", type=int, default=40)
+    parser.add_argument("--budget", type=float, default=300)
+    args = parser.parse_args()
+
+    samples = collections.defaultdict(list)
+    lock = threading.Lock()
+    threads = [threading.Thread(target=play_game, args=(i, args.player, args.moves, args.budget, samples, lock))
+               for i in range(args.games)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - start
+
+    everything = [v for values in samples.values() for v in values]
+    print(f"{args.games} concurrent games, budget {args.budget:.0f} ms, {len(everything)} bot moves in {wall:.1f}s")
+    print(f"{'source':<10} {'moves':>6} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    for source, values in sorted(samples.items()) + [("all", everything)]:
+        print(f"{source:<10} {len(values):>6} {percentile(values, 50):>8.2f} {percentile(values, 99):>8.2f} {max(values):>8.2f}")
+    over = sum(1 for v in everything if v > args.budget)
+    print(f"over budget: {over} ({over / max(len(everything), 1):.1%})")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+Cross-check and benchmark for the vectorized feature extraction.
+
+    python benchmarks/bench_feature_planes.py [copies]
+
+Runs feature_planes.extract_features over the positional corpus (repeated
+`copies` times to make a large batch), checks every mask against the scalar
+positional_engine findings and compares throughput.
+"""
+import os
+import sys
+import json
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+import numpy as np
+import chess
+import feature_planes
+import positional_engine
+
+CORPUS_FILE = os.path.join(HERE, "positional_corpus.json")
+
+def main():
+    copies = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    with open(CORPUS_FILE) as f:
+        boards = [chess.Board(entry["fen"]) for entry in json.load(f)]
+
+    planes, turns = feature_planes.boards_to_packed(boards)
+    features = feature_planes.extract_features(planes, turns)
+    unpacked = feature_planes.extract_features(feature_planes.unpack_planes(planes), turns)
+
+    mismatches = 0
+    for i, board in enumerate(boards):
+        expected = feature_planes.scalar_features(board)
+        for key, mask in expected.items():
+            if int(features[key][i]) != mask or int(unpacked[key][i]) != mask:
+                mismatches += 1
+                if mismatches <= 5:
+                    print(f"❌ {key} differs for {board.fen()}: {int(features[key][i]):#x} != {mask:#x}")
+    print(f"{'✅' if not mismatches else '❌'} {len(boards)} positions checked, {mismatches} mismatches")
+
+    big_planes = np.tile(planes, (copies, 1))
+    big_turns = np.tile(turns, copies)
+    start = time.perf_counter()
+    feature_planes.extract_features(big_planes, big_turns)
+    vector_s = time.perf_counter() - start
+
+    positional_engine.clear_pawn_cache()
+    start = time.perf_counter()
+    for board in boards:
+        positional_engine.analyze_board(board)
+    scalar_s = time.perf_counter() - start
+
+    n = len(big_turns)
+    print(f"vectorized: {n / vector_s:12.0f} positions/s ({n} positions)")
+    print(f"scalar:     {len(boards) / scalar_s:12.0f} positions/s")
+    return 1 if mismatches else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,116 @@
+"""
+Regression check and micro-benchmark for positional_engine.
+
+    python benchmarks/bench_positional.py              # verify corpus + time
+    python benchmarks/bench_positional.py --regenerate # rebuild corpus from the reference
+
+The corpus holds FENs with the findings produced by the square-by-square
+reference implementation (positional_reference.py). Any difference between
+those and the current engine is reported and makes the script exit non-zero.
+"""
+import os
+import sys
+import json
+import random
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, HERE)
+
+import chess
+import positional_engine
+import positional_reference
+
+CORPUS_FILE = os.path.join(HERE, "positional_corpus.json")
+
+FIXED_FENS = [
+    "r1bqk2r/pp2bppp/2n1p3/3pP3/3P4/5N2/PP3PPP/RNBQKB1R w KQkq - 0 1",
+    "r1bqkb1r/pppp1ppp/2n5/4N3/4P3/8/PPPP1PPP/RNBQKB1R w KQkq - 0 4",
+    "r1bq1rk1/ppp2ppp/2np1n2/2b1p3/4P3/3P1N2/PPP2PPP/RNBQ1RK1 w - - 0 6",
+    chess.STARTING_FEN,
+]
+
+def random_game_fens(seed, games=24, max_plies=140, stride=3):
+    """Positions from random playouts, biased towards pawn moves so pawn structures vary."""
+    rng = random.Random(seed)
+    fens = []
+    for _ in range(games):
+        board = chess.Board()
+        for ply in range(max_plies):
+            moves = list(board.legal_moves)
+            if not moves:
+                break
+            pawn_moves = [m for m in moves if board.piece_type_at(m.from_square) == chess.PAWN]
+            pool = pawn_moves if pawn_moves and rng.random() < 0.4 else moves
+            board.push(rng.choice(pool))
+            if ply % stride == 0:
+                fens.append(board.fen())
+    return fens
+
+def regenerate():
+    fens = FIXED_FENS + random_game_fens(seed=28)
+    corpus = [{"fen": fen, "findings": positional_reference.analyze_positional_features(fen)} for fen in fens]
+    with open(CORPUS_FILE, "w") as f:
+        json.dump(corpus, f, separators=(",", ":"))
+    print(f"💾 Wrote {len(corpus)} positions to {CORPUS_FILE}")
+
+def load_corpus():
+    with open(CORPUS_FILE) as f:
+        return json.load(f)
+
+def verify(corpus):
+    mismatches = 0
+    for entry in corpus:
+        got = positional_engine.analyze_positional_features(entry["fen"])
+        if got != entry["findings"]:
+            mismatches += 1
+            if mismatches <= 5:
+                print(f"❌ Mismatch for {entry['fen']}")
+                print(f"   expected: {entry['findings']}")
+                print(f"   got:      {got}")
+    return mismatches
+
+def time_boards(analyze, boards, repeat=5):
+    """Best-of-`repeat` time per position in microseconds, excluding FEN parsing."""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for board in boards:
+            analyze(board)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best / len(boards) * 1e6
+
+def reference_board(board):
+    findings = []
+    findings.extend(positional_reference.get_bad_bishops(board))
+    findings.extend(positional_reference.get_isolated_pawns(board))
+    findings.extend(positional_reference.get_open_files(board))
+    findings.extend(positional_reference.get_king_safety(board))
+    findings.extend(positional_reference.get_knight_outposts(board))
+    return findings
+
+def main():
+    if "--regenerate" in sys.argv:
+        regenerate()
+        return 0
+
+    corpus = load_corpus()
+    mismatches = verify(corpus)
+    print(f"{'✅' if not mismatches else '❌'} {len(corpus) - mismatches}/{len(corpus)} positions identical")
+
+    boards = [chess.Board(entry["fen"]) for entry in corpus]
+    positional_engine.clear_pawn_cache()
+    for board in boards:
+        positional_engine.analyze_board(board)
+    print(f"pawn cache, one pass: {positional_engine.pawn_cache_info()}")
+
+    ref_us = time_boards(reference_board, boards)
+    new_us = time_boards(positional_engine.analyze_board, boards)
+    print(f"reference: {ref_us:8.1f} us/position")
+    print(f"bitboard:  {new_us:8.1f} us/position  ({ref_us / new_us:.1f}x)")
+    return 1 if mismatches else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,136 @@
+"""
+Startup cost of the web app: cold import, schema check and per-worker fork.
+
+    python benchmarks/bench_startup.py [--runs 10] [--forks 20] [--db path.db] [--json]
+
+- import: fresh interpreters run `import app` against an up-to-date database;
+  reports the import time and the whole process wall time.
+- init_db: one call on a database whose schema is current (what every
+  worker start pays), and the full migration of an empty database.
+- fork: a parent that already imported app forks workers (preload model);
+  each child serves one request. Reports fork-to-first-response time.
+- Lists the heavy modules that `import app` pulled in, which should not
+  include the engine pool, model store, numpy or the HTTP client.
+
+Runs on a copy of --db (default: the library) so the original is not touched.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import subprocess
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+
+HEAVY_MODULES = ["engine_pool", "analysis_service", "model_store", "position_neighbors", "bot",
+                 "structure_index", "positional_batch", "numpy", "requests"]
+
+IMPORT_PROBE = """
+import sys, time, json
+start = time.perf_counter()
+import app
+elapsed = time.perf_counter() - start
+print(json.dumps({"import_ms": elapsed * 1000, "loaded": [m for m in %r if m in sys.modules]}))
+""" % (HEAVY_MODULES,)
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100.0 * (len(values) - 1))))]
+
+def summary(samples):
+    return {"n": len(samples), "mean_ms": round(sum(samples) / len(samples), 2),
+            "p50_ms": round(percentile(samples, 50), 2), "max_ms": round(max(samples), 2)}
+
+def bench_import(env, runs):
+    import_ms, process_ms, loaded = [], [], []
+    for _ in range(runs):
+        start = time.perf_counter()
+        out = subprocess.run([sys.executable, "-c", IMPORT_PROBE], cwd=ROOT, env=env,
+                             capture_output=True, text=True, check=True).stdout
+        process_ms.append((time.perf_counter() - start) * 1000)
+        probe = json.loads(out.strip().splitlines()[-1])
+        import_ms.append(probe["import_ms"])
+        loaded = probe["loaded"]
+    return {"import": summary(import_ms), "process": summary(process_ms), "heavy_modules_loaded": loaded}
+
+def bench_init_db(tmp, runs):
+    import database
+    current = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        database.init_db()
+        current.append((time.perf_counter() - start) * 1000)
+    database.DB_PATH = os.path.join(tmp, "empty.db")
+    start = time.perf_counter()
+    database.init_db()
+    fresh = (time.perf_counter() - start) * 1000
+    return {"schema_current": summary(current), "fresh_database_ms": round(fresh, 2)}
+
+def bench_fork(forks):
+    import app
+    client = app.app.test_client()
+    client.get("/players")  # parent warm-up, like a preloaded master
+    samples = []
+    for _ in range(forks):
+        read_fd, write_fd = os.pipe()
+        start = time.perf_counter()
+        pid = os.fork()
+        if pid == 0:
+            os.close(read_fd)
+            status = app.app.test_client().get("/players").status_code
+            os.write(write_fd, str(status).encode())
+            os._exit(0)
+        os.close(write_fd)
+        status = os.read(read_fd, 16)
+        samples.append((time.perf_counter() - start) * 1000)
+        os.close(read_fd)
+        os.waitpid(pid, 0)
+        if status != b"200":
+            raise RuntimeError(f"Forked worker answered {status!r}")
+    return summary(samples)
+
+def main():
+    parser = argparse.ArgumentParser(description="chess-mimic startup benchmark")
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--forks", type=int, default=20)
+    parser.add_argument("--db", default=os.path.join(ROOT, "chess_mimic.db"))
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="chess-mimic-startup-")
+    db = os.path.join(tmp, "startup.db")
+    if os.path.exists(args.db):
+        shutil.copy(args.db, db)
+    # Must be set before database is imported
+    os.environ["CHESS_MIMIC_DB"] = db
+    env = dict(os.environ)
+    sys.path.insert(0, ROOT)
+    try:
+        # First run brings the copy's schema up to date
+        subprocess.run([sys.executable, "-c", "import app"], cwd=ROOT, env=env, check=True, capture_output=True)
+        results = {"import": bench_import(env, args.runs), "init_db": bench_init_db(tmp, args.runs)}
+        os.environ["CHESS_MIMIC_DB"] = db
+        import database
+        database.DB_PATH = db
+        if hasattr(os, "fork"):
+            results["fork"] = bench_fork(args.forks)
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    imp = results["import"]
+    print(f"⏱️  import app     p50 {imp['import']['p50_ms']:>8} ms   (process {imp['process']['p50_ms']} ms)")
+    print(f"⏱️  init_db        p50 {results['init_db']['schema_current']['p50_ms']:>8} ms   "
+          f"(empty database {results['init_db']['fresh_database_ms']} ms)")
+    if "fork" in results:
+        print(f"⏱️  fork + request p50 {results['fork']['p50_ms']:>8} ms")
+    print(f"📦 Heavy modules loaded at import: {', '.join(imp['heavy_modules_loaded']) or 'none'}")
+
+if __name__ == "__main__":
+    main()
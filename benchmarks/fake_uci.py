@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Stand-in UCI engine for benchmarks: answers every search after a fixed
+latency instead of needing a Stockfish binary.
+
+    CHESS_MIMIC_ENGINE=benchmarks/fake_uci.py FAKE_UCI_LATENCY_MS=20 python app.py
+
+A search takes FAKE_UCI_LATENCY_MS (default 50), or less if `go movetime`
+asks for less or `stop` arrives. It reports MultiPV lines over the first
+legal moves with a material-based score, so results are deterministic.
+Threads/Hash/MultiPV options are accepted like a real engine's.
+"""
+import os
+import sys
+import time
+import threading
+import chess
+
+LATENCY_MS = float(os.environ.get("FAKE_UCI_LATENCY_MS", 50))
+PIECE_VALUES = {chess.PAWN: 100, chess.KNIGHT: 300, chess.BISHOP: 300, chess.ROOK: 500, chess.QUEEN: 900}
+
+def say(line):
+    sys.stdout.write(line + "\n")
+    sys.stdout.flush()
+
+def material(board):
+    """Centipawns from the side to move's point of view."""
+    score = 0
+    for piece_type, value in PIECE_VALUES.items():
+        score += value * (len(board.pieces(piece_type, board.turn)) - len(board.pieces(piece_type, not board.turn)))
+    return score
+
+def search(board, latency_ms, multipv, stop):
+    stop.wait(latency_ms / 1000.0)
+    moves = sorted(board.legal_moves, key=lambda m: m.uci())
+    if not moves:
+        say("info depth 0 score mate 0" if board.is_checkmate() else "info depth 0 score cp 0")
+        say("bestmove (none)")
+        return
+    lines = []
+    for move in moves:
+        board.push(move)
+        lines.append((-material(board), move))
+        board.pop()
+    lines.sort(key=lambda line: -line[0])
+    for i, (score, move) in enumerate(lines[:multipv], 1):
+        say(f"info depth 1 seldepth 1 multipv {i} score cp {score} nodes 1 nps 1000 time {int(latency_ms)} pv {move.uci()}")
+    say(f"bestmove {lines[0][1].uci()}")
+
+def main():
+    board = chess.Board()
+    multipv = 1
+    stop = threading.Event()
+    worker = None
+    for line in sys.stdin:
+        cmd = line.split()
+        if not cmd:
+            continue
+        if cmd[0] == "uci":
+            say("id name FakeUCI")
+            say("id author chess-mimic benchmarks")
+            say("option name Threads type spin default 1 min 1 max 1024")
+            say("option name Hash type spin default 16 min 1 max 33554432")
+            say("option name MultiPV type spin default 1 min 1 max 500")
+            say("uciok")
+        elif cmd[0] == "isready":
+            say("readyok")
+        elif cmd[0] == "setoption" and len(cmd) >= 5 and cmd[2] == "MultiPV":
+            multipv = int(cmd[4])
+        elif cmd[0] == "ucinewgame":
+            board = chess.Board()
+        elif cmd[0] == "position":
+            moves_at = cmd.index("moves") if "moves" in cmd else len(cmd)
+            board = chess.Board() if cmd[1] == "startpos" else chess.Board(" ".join(cmd[2:moves_at]))
+            for uci in cmd[moves_at + 1:]:
+                board.push_uci(uci)
+        elif cmd[0] == "go":
+            latency = LATENCY_MS
+            if "movetime" in cmd:
+                latency = min(latency, float(cmd[cmd.index("movetime") + 1]))
+            stop = threading.Event()
+            worker = threading.Thread(target=search, args=(board.copy(), latency, multipv, stop))
+            worker.start()
+        elif cmd[0] == "stop":
+            stop.set()
+            if worker is not None:
+                worker.join()
+        elif cmd[0] == "quit":
+            stop.set()
+            break
+
+if __name__ == "__main__":
+    main()
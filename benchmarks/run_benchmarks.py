@@ -0,0 +1,309 @@
+"""
+End-to-end performance baseline on a synthetic corpus and a fake engine.
+
+    python benchmarks/run_benchmarks.py [--games 1000] [--seed 41] [--latency-ms 20]
+                                        [--only tree,analyze] [--output results.json]
+                                        [--compare previous.json]
+
+Everything runs against a throwaway database (CHESS_MIMIC_DB) and
+benchmarks/fake_uci.py as the engine (CHESS_MIMIC_ENGINE), so no Stockfish
+binary is needed and the real library is never touched. Results are written
+as JSON to benchmarks/results/<commit>-<time>.json; --compare prints the
+change against an earlier run.
+"""
+import io
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import platform
+import tempfile
+import subprocess
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+sys.path.insert(0, ROOT)
+sys.path.insert(0, HERE)
+
+import chess
+import chess.pgn
+
+RESULTS_DIR = os.path.join(HERE, "results")
+BENCHMARKS = ["ingest", "upload", "database", "tree", "game", "analyze", "scan", "rethreshold", "stats", "positional"]
+PLAYER = "Synthetic Player 1"
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100.0 * (len(values) - 1))))]
+
+def timed(fn, repeat):
+    """Runs fn `repeat` times; returns latency stats in milliseconds."""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return {"n": repeat, "mean_ms": round(sum(samples) / repeat, 3),
+            "p50_ms": round(percentile(samples, 50), 3), "p99_ms": round(percentile(samples, 99), 3)}
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "-C", ROOT, "rev-parse", "--short", "HEAD"],
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+# --- Benchmarks. Each takes the context dict and returns a dict of metrics. ---
+
+def bench_ingest(ctx):
+    import ingest
+    out = os.path.join(ctx["tmp"], "model.json")
+    start = time.perf_counter()
+    ingest.ingest_pgn(ctx["pgn"], PLAYER, output_file=out)
+    elapsed = time.perf_counter() - start
+    return {"seconds": round(elapsed, 3), "games_per_second": round(ctx["games"] / elapsed, 1)}
+
+def bench_upload(ctx):
+    client = ctx["client"]
+    with open(ctx["pgn"], "rb") as f:
+        data = f.read()
+    start = time.perf_counter()
+    response = client.post("/upload", data={"file": (io.BytesIO(data), "games.pgn")},
+                           content_type="multipart/form-data")
+    elapsed = time.perf_counter() - start
+    count = response.get_json()["count"]
+    return {"seconds": round(elapsed, 3), "games": count, "games_per_second": round(count / elapsed, 1)}
+
+def bench_database(ctx):
+    import database
+    import position_index
+    ids = ctx["ids"]
+    rng = random.Random(1)
+    sample = rng.sample(ids, min(100, len(ids)))
+    zobrist = position_index.position_key(chess.Board())
+    return {
+        "get_all_games": timed(database.get_all_games, 5),
+        "get_game": timed(lambda: database.get_game(rng.choice(ids)), 200),
+        "get_game_view": timed(lambda: database.get_game_view(rng.choice(ids)), 200),
+        "get_games_by_ids": timed(lambda: database.get_games_by_ids(sample), 50),
+        "get_folder_stats": timed(database.get_folder_stats, 20),
+        "find_positions_start": timed(lambda: database.find_positions(zobrist), 20),
+        "get_puzzles": timed(lambda: database.get_puzzles(rng.choice(ids)), 200),
+    }
+
+def _uncached(client, url):
+    # A fresh query string per call keeps http_cache from answering
+    _uncached.n = getattr(_uncached, "n", 0) + 1
+    sep = "&" if "?" in url else "?"
+    return client.get(f"{url}{sep}_bench={_uncached.n}")
+
+def bench_tree(ctx):
+    client, ids = ctx["client"], ctx["ids"]
+    results = {}
+    for size in (10, 100, 1000):
+        if size > len(ids):
+            continue
+        url = "/tree?game_ids=" + ",".join(str(i) for i in ids[:size])
+        results[f"games_{size}"] = timed(lambda: _uncached(client, url), 3 if size >= 1000 else 10)
+    url = "/tree?game_ids=" + ",".join(str(i) for i in ids[:100])
+    etag = client.get(url).headers.get("ETag")
+    results["revalidate_304"] = timed(lambda: client.get(url, headers={"If-None-Match": etag}), 100)
+    return results
+
+def bench_game(ctx):
+    client, ids = ctx["client"], ctx["ids"]
+    rng = random.Random(2)
+    return {
+        "first_open": timed(lambda: _uncached(client, f"/games/{rng.choice(ids)}"), 100),
+        "list_games": timed(lambda: _uncached(client, "/games"), 5),
+    }
+
+def bench_analyze(ctx):
+    import analysis_service
+    client = ctx["client"]
+    rng = random.Random(3)
+    board = chess.Board()
+    fens = []
+    while len(fens) < 50:
+        if board.is_game_over():
+            board = chess.Board()
+        board.push(rng.choice(list(board.legal_moves)))
+        fens.append(board.fen())
+    it = iter(fens)
+    cold = timed(lambda: client.get("/analyze", query_string={"fen": next(it)}), len(fens))
+    it = iter(fens)
+    cached = timed(lambda: client.get("/analyze", query_string={"fen": next(it)}), len(fens))
+    return {"cold": cold, "cached": cached, "engine_latency_ms": ctx["latency_ms"],
+            "service": analysis_service.get_service().stats()}
+
+def _scan_games(client, ids, workers):
+    results = []
+    plies = 0
+    start = time.perf_counter()
+    for game_id in ids:
+        response = client.post(f"/games/{game_id}/scan-chunked", json={"chunk_size": 10, "workers": workers})
+        last = None
+        for chunk in response.response:
+            last = chunk
+        done = json.loads(last.decode().split("data: ", 1)[1])
+        plies += done["total"]
+        results.append(done["total_puzzles"])
+    elapsed = time.perf_counter() - start
+    return {"games": len(results), "plies": plies, "seconds": round(elapsed, 3),
+            "ms_per_ply": round(elapsed * 1000 / max(plies, 1), 3)}
+
+def bench_scan(ctx):
+    import engine_pool
+    import parallel_scan
+    client, ids = ctx["client"], ctx["ids"]
+    results = _scan_games(client, ids[:3], 1)
+    # Same games again with every engine the pool allows (the first game also spawns them)
+    results["parallel"] = _scan_games(client, ids[:3], 0)
+    results["parallel"]["workers"] = parallel_scan.max_workers(engine_pool.get_pool())
+    results["parallel"]["speedup"] = round(results["seconds"] / results["parallel"]["seconds"], 2)
+    results["engine_latency_ms"] = ctx["latency_ms"]
+    return results
+
+def _fake_scans():
+    """Random-walk evals and stored best moves for every game, as if all were scanned. Returns the game count."""
+    import database
+    import replay
+    rng = random.Random(4)
+    rows = []
+    for game in database.iter_games(columns="id, replay"):
+        moves = replay.unpack(game["replay"])["uci"]
+        value, evals = 0, []
+        for _ in moves:
+            value += int(rng.gauss(0, 80))
+            evals.append(value)
+        rows.append((json.dumps(evals), json.dumps(moves), game["id"]))
+    with database.get_db() as conn:
+        conn.executemany("UPDATE games SET evals = ?, best_moves = ? WHERE id = ?", rows)
+    return len(rows)
+
+def bench_rethreshold(ctx):
+    import puzzle_finder
+    return {"games": _fake_scans(),
+            "cp": puzzle_finder.rethreshold(150),
+            "winprob": puzzle_finder.rethreshold(15, "winprob")}
+
+def bench_stats(ctx):
+    import database
+    import player_stats
+    client, ids = ctx["client"], ctx["ids"]
+    if "rethreshold" not in ctx["results"]:
+        _fake_scans()
+    # Score the whole library from scratch, as the first report after an upgrade does
+    database.replace_game_stats(ids, [])
+    start = time.perf_counter()
+    scored = player_stats.update_games(ids)
+    backfill = time.perf_counter() - start
+    return {
+        "games_scored": scored,
+        "backfill_seconds": round(backfill, 3),
+        "player": timed(lambda: _uncached(client, f"/stats?player={PLAYER}"), 50),
+        "library": timed(lambda: _uncached(client, "/stats"), 10),
+    }
+
+def bench_positional(ctx):
+    import positional_engine
+    fens = []
+    with open(ctx["pgn"]) as f:
+        for _ in range(50):
+            game = chess.pgn.read_game(f)
+            if game is None:
+                break
+            board = game.board()
+            for move in game.mainline_moves():
+                board.push(move)
+                fens.append(board.fen())
+    positional_engine.clear_pawn_cache()
+    start = time.perf_counter()
+    for fen in fens:
+        positional_engine.analyze_positional_features(fen)
+    elapsed = time.perf_counter() - start
+    return {"positions": len(fens), "us_per_position": round(elapsed * 1e6 / len(fens), 2),
+            "pawn_cache": positional_engine.pawn_cache_info()}
+
+def compare(current, previous):
+    """Prints metrics that moved by more than 10% between two result files."""
+    def flatten(d, prefix=""):
+        for key, value in d.items():
+            if isinstance(value, dict):
+                yield from flatten(value, f"{prefix}{key}.")
+            elif isinstance(value, (int, float)) and not isinstance(value, bool):
+                yield f"{prefix}{key}", value
+    before = dict(flatten(previous["results"]))
+    print(f"\nChange vs {previous.get('commit')} ({previous.get('timestamp')}):")
+    for key, value in flatten(current["results"]):
+        old = before.get(key)
+        if old and (key.endswith("_ms") or key.endswith("seconds") or key.endswith("per_second")
+                    or key.endswith("us_per_position") or key.endswith("ms_per_ply")):
+            change = (value - old) / old
+            if abs(change) > 0.10:
+                print(f"  {key:<45} {old:>10} -> {value:<10} ({change:+.0%})")
+
+def main():
+    parser = argparse.ArgumentParser(description="chess-mimic performance baseline")
+    parser.add_argument("--games", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=41)
+    parser.add_argument("--latency-ms", type=float, default=20)
+    parser.add_argument("--only", help="Comma-separated subset of: " + ",".join(BENCHMARKS))
+    parser.add_argument("--output")
+    parser.add_argument("--compare")
+    parser.add_argument("--keep", action="store_true", help="Keep the temporary database and PGN")
+    args = parser.parse_args()
+    selected = args.only.split(",") if args.only else BENCHMARKS
+
+    tmp = tempfile.mkdtemp(prefix="chess-mimic-bench-")
+    # Must be set before the app modules are imported
+    os.environ["CHESS_MIMIC_DB"] = os.path.join(tmp, "bench.db")
+    os.environ["CHESS_MIMIC_ENGINE"] = os.path.join(HERE, "fake_uci.py")
+    os.environ["FAKE_UCI_LATENCY_MS"] = str(args.latency_ms)
+
+    import synthetic_pgn
+    pgn = os.path.join(tmp, "games.pgn")
+    start = time.perf_counter()
+    synthetic_pgn.write_pgn(pgn, args.games, args.seed)
+    print(f"📂 Generated {args.games} games in {time.perf_counter() - start:.1f}s ({tmp})")
+
+    import app
+    import database
+    client = app.app.test_client()
+    ctx = {"tmp": tmp, "pgn": pgn, "games": args.games, "latency_ms": args.latency_ms, "client": client}
+
+    results = ctx["results"] = {}
+    for name in BENCHMARKS:
+        if name not in selected and not (name == "upload" and set(selected) & {"database", "tree", "game", "scan", "rethreshold", "stats"}):
+            continue
+        start = time.perf_counter()
+        results[name] = globals()["bench_" + name](ctx)
+        if name == "upload":
+            ctx["ids"] = [g["id"] for g in database.get_all_games()]
+        print(f"⏱️  {name:<11} {time.perf_counter() - start:6.1f}s  {json.dumps(results[name])[:150]}")
+
+    report = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "cpus": os.cpu_count(),
+        "params": {"games": args.games, "seed": args.seed, "latency_ms": args.latency_ms},
+        "results": results,
+    }
+    output = args.output or os.path.join(RESULTS_DIR, f"{report['commit']}-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"💾 Results saved to {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(report, json.load(f))
+    if not args.keep:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Deterministic synthetic PGN corpus for benchmarks.
+
+    python benchmarks/synthetic_pgn.py <games> <output.pgn> [--seed 41]
+
+The same count and seed always produce the same file. Moves are picked with
+a strong bias towards the first few legal moves, so openings repeat and the
+opening tree has depth, the way a real player's games do. Players come from
+a fixed roster where the first names appear most often.
+"""
+import os
+import sys
+import random
+import argparse
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+import chess
+import chess.pgn
+
+PLAYERS = ["Synthetic Player %d" % i for i in range(1, 41)]
+# Relative chance of playing the k-th legal move (ordered by UCI), then uniform
+MOVE_WEIGHTS = [40, 20, 10, 6, 4]
+MIN_PLIES, MAX_PLIES = 20, 120
+RESULTS = ["1-0", "0-1", "1/2-1/2"]
+
+def _player(rng):
+    # Zipf-like: "Synthetic Player 1" plays the most games
+    return PLAYERS[min(int(rng.paretovariate(1.2)) - 1, len(PLAYERS) - 1)]
+
+def _pick(rng, board):
+    moves = sorted(board.legal_moves, key=lambda m: m.uci())
+    weights = MOVE_WEIGHTS[:len(moves)] + [1] * max(0, len(moves) - len(MOVE_WEIGHTS))
+    return rng.choices(moves, weights=weights)[0]
+
+def generate_game(rng, index):
+    game = chess.pgn.Game()
+    white = _player(rng)
+    black = _player(rng)
+    while black == white:
+        black = rng.choice(PLAYERS)
+    game.headers["Event"] = "Synthetic %d" % (index // 100)
+    game.headers["Site"] = "?"
+    game.headers["Date"] = "%04d.%02d.%02d" % (2015 + index * 10 // 1000 % 10, rng.randint(1, 12), rng.randint(1, 28))
+    game.headers["Round"] = str(index % 100 + 1)
+    game.headers["White"] = white
+    game.headers["Black"] = black
+
+    node = game
+    board = game.board()
+    for _ in range(rng.randint(MIN_PLIES, MAX_PLIES)):
+        if board.is_game_over():
+            break
+        move = _pick(rng, board)
+        node = node.add_variation(move)
+        board.push(move)
+    game.headers["Result"] = board.result() if board.is_game_over() else rng.choice(RESULTS)
+    return game
+
+def generate_games(count, seed=41):
+    """Yields `count` chess.pgn.Game objects, the same ones for the same seed."""
+    rng = random.Random(seed)
+    for index in range(count):
+        yield generate_game(rng, index)
+
+def write_pgn(path, count, seed=41):
+    with open(path, "w") as f:
+        for game in generate_games(count, seed):
+            print(game, file=f, end="\n\n")
+    return path
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("games", type=int)
+    parser.add_argument("output")
+    parser.add_argument("--seed", type=int, default=41)
+    args = parser.parse_args()
+    write_pgn(args.output, args.games, args.seed)
+    print(f"✅ Wrote {args.games} games to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""
+"Play like player X": picks a move for a position within a latency budget.
+
+1. Model hit: sample from the player's move counts (no engine call).
+2. Unseen position: sample from the nearest-neighbour prediction, if the
+   player has an index.
+3. Otherwise: a short engine search sized to what is left of the budget.
+4. If the engine is missing, busy or too slow: any legal move, preferring captures.
+
+Reading a player's model or neighbour index from disk counts against the
+budget too. A cold load runs in the background and the move waits for it
+only until the deadline; past that the bot plays the fallback move and the
+load carries on, so the next move finds it in memory.
+"""
+import time
+import random
+import threading
+import chess
+import chess.engine
+import engine_pool
+import metrics
+import model_store
+import position_neighbors
+
+DEFAULT_BUDGET_MS = 500
+# Held back from the engine's search time for process I/O and response handling
+ENGINE_MARGIN_MS = 40
+# Searches shorter than this are not worth starting
+MIN_SEARCH_MS = 20
+
+# Cold loads in progress: key -> (done event, result dict); moves for the same player share one
+_loads = {}
+_loads_lock = threading.Lock()
+
+def sample_move(board, moves, rng, temperature=1.0):
+    """Samples a legal move from [{"move": uci, "count": int}] weighted by count^(1/temperature)."""
+    legal = [(chess.Move.from_uci(m["move"]), m["count"]) for m in moves]
+    legal = [(move, count) for move, count in legal if board.is_legal(move)]
+    if not legal:
+        return None
+    weights = [max(count, 1e-6) ** (1.0 / max(temperature, 1e-3)) for _, count in legal]
+    return rng.choices([move for move, _ in legal], weights=weights)[0]
+
+def fallback_move(board, rng):
+    moves = list(board.legal_moves)
+    if not moves:
+        return None
+    captures = [m for m in moves if board.is_capture(m)]
+    return rng.choice(captures or moves)
+
+def _loaded_by(deadline, key, load):
+    """
+    Runs load() in a background thread and waits for it until `deadline`.
+    Returns True if it finished in time (re-raising its error, if any); False
+    if the deadline passed first, leaving it to finish for later calls.
+    """
+    with _loads_lock:
+        loading = _loads.get(key)
+        if loading is None:
+            loading = _loads[key] = (threading.Event(), {})
+            threading.Thread(target=_run_load, args=(key, load, loading), daemon=True).start()
+    done, result = loading
+    if not done.wait(timeout=max(0.0, deadline - time.monotonic())):
+        return False
+    if "error" in result:
+        raise result["error"]
+    return True
+
+def _run_load(key, load, loading):
+    done, result = loading
+    try:
+        load()
+    except Exception as e:
+        result["error"] = e
+    finally:
+        with _loads_lock:
+            _loads.pop(key, None)
+        done.set()
+
+def engine_move(board, deadline):
+    """
+    Runs a search that ends before `deadline` (time.monotonic()). Returns the
+    move, or None if no engine could answer in time. A search that overruns is
+    left to finish in the background and its engine goes back to the pool then.
+    """
+    remaining_ms = (deadline - time.monotonic()) * 1000 - ENGINE_MARGIN_MS
+    if remaining_ms < MIN_SEARCH_MS:
+        return None
+    pool = engine_pool.get_pool()
+    try:
+        engine = pool.acquire(timeout=remaining_ms / 2000.0)
+    except engine_pool.EngineUnavailable:
+        return None
+
+    remaining_ms = (deadline - time.monotonic()) * 1000 - ENGINE_MARGIN_MS
+    if remaining_ms < MIN_SEARCH_MS:
+        pool.release(engine)
+        return None
+
+    result = {}
+    done = threading.Event()
+
+    def search():
+        broken = False
+        try:
+            start = time.perf_counter()
+            played = engine.play(board.copy(), chess.engine.Limit(time=remaining_ms / 1000.0), info=chess.engine.INFO_BASIC)
+            metrics.engine_search(engine_pool.INTERACTIVE, time.perf_counter() - start, played.info)
+            result["move"] = played.move
+        except (chess.engine.EngineError, chess.engine.EngineTerminatedError):
+            broken = True
+        finally:
+            pool.release(engine, broken)
+            done.set()
+
+    threading.Thread(target=search, daemon=True).start()
+    done.wait(timeout=max(0.0, deadline - time.monotonic()))
+    return result.get("move")
+
+def choose_move(fen, player=None, budget_ms=DEFAULT_BUDGET_MS, temperature=1.0, rng=None):
+    """
+    Returns { "move": uci|None, "san": str|None, "source": "model"|"neighbors"|"engine"|"fallback",
+              "elapsed_ms": float }
+    """
+    start = time.monotonic()
+    deadline = start + budget_ms / 1000.0
+    rng = rng or random
+    board = chess.Board(fen)
+
+    move, source = None, None
+    store = model_store.get_store()
+    if store.is_loaded(player) or _loaded_by(deadline, ("model", player), lambda: store.get(player)):
+        moves = store.predict(board, player, limit=None)
+        if moves:
+            move, source = sample_move(board, moves, rng, temperature), "model"
+    if move is None and player and (position_neighbors.is_loaded(player) or _loaded_by(
+            deadline, ("neighbors", player), lambda: position_neighbors.get_index(player))):
+        moves = position_neighbors.predict(board, player)
+        if moves:
+            move, source = sample_move(board, moves, rng, temperature), "neighbors"
+    if move is None:
+        move, source = engine_move(board, deadline), "engine"
+    if move is None:
+        move, source = fallback_move(board, rng), "fallback"
+
+    return {
+        "move": move.uci() if move else None,
+        "san": board.san(move) if move else None,
+        "source": source,
+        "elapsed_ms": round((time.monotonic() - start) * 1000, 2),
+    }
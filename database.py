@@ -1,131 +1,527 @@
 import sqlite3
 import os
+import metrics
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-DB_PATH = os.path.join(BASE_DIR, "chess_mimic.db")
+DB_PATH = os.environ.get("CHESS_MIMIC_DB", os.path.join(BASE_DIR, "chess_mimic.db"))
 
 def get_db():
     conn = sqlite3.connect(DB_PATH)
     conn.row_factory = sqlite3.Row
     return conn
 
+def _migrate_base(conn):
+    """
+    Schema as of the first versioned release. Also brings databases created
+    before versioning up to date, so every statement here is idempotent.
+    """
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS games (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            pgn TEXT NOT NULL,
+            name TEXT,
+            white TEXT,
+            black TEXT,
+            result TEXT,
+            date TEXT,
+            annotations TEXT,
+            tags TEXT,
+            evals TEXT,
+            positional TEXT,
+            replay BLOB,
+            folder_id INTEGER REFERENCES folders(id) ON DELETE SET NULL
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS puzzles (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            game_id INTEGER,
+            fen TEXT,
+            best_move TEXT,
+            played_move TEXT,
+            score_before INTEGER,
+            score_after INTEGER,
+            move_number INTEGER,
+            move_index INTEGER,
+            turn TEXT,
+            FOREIGN KEY(game_id) REFERENCES games(id) ON DELETE CASCADE
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS folders (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            created_at TEXT DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS positions (
+            game_id INTEGER NOT NULL,
+            ply INTEGER NOT NULL,
+            zobrist INTEGER NOT NULL,
+            white_pawns INTEGER,
+            black_pawns INTEGER,
+            material INTEGER,
+            PRIMARY KEY (game_id, ply)
+        ) WITHOUT ROWID
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_positions_zobrist ON positions(zobrist)")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS meta (
+            key TEXT PRIMARY KEY,
+            value INTEGER NOT NULL
+        )
+    """)
+    conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('library_version', 0)")
+    pos_cols = [row[1] for row in conn.execute("PRAGMA table_info(positions)").fetchall()]
+    if 'white_pawns' not in pos_cols:
+        # Older index rows lack the structure columns; drop them so they get re-indexed
+        conn.execute("ALTER TABLE positions ADD COLUMN white_pawns INTEGER")
+        conn.execute("ALTER TABLE positions ADD COLUMN black_pawns INTEGER")
+        conn.execute("ALTER TABLE positions ADD COLUMN material INTEGER")
+        conn.execute("DELETE FROM positions")
+    # Migrate: add missing columns to existing games table
+    cols = [row[1] for row in conn.execute("PRAGMA table_info(games)").fetchall()]
+    if 'folder_id' not in cols:
+        conn.execute("ALTER TABLE games ADD COLUMN folder_id INTEGER REFERENCES folders(id) ON DELETE SET NULL")
+    if 'name' not in cols:
+        conn.execute("ALTER TABLE games ADD COLUMN name TEXT")
+    if 'evals' not in cols:
+        conn.execute("ALTER TABLE games ADD COLUMN evals TEXT")
+    if 'positional' not in cols:
+        conn.execute("ALTER TABLE games ADD COLUMN positional TEXT")
+    if 'replay' not in cols:
+        conn.execute("ALTER TABLE games ADD COLUMN replay BLOB")
+    # The pre-parsed move list is only valid for the PGN it was built from
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS games_replay_invalidate
+        AFTER UPDATE OF pgn ON games WHEN OLD.pgn IS NOT NEW.pgn
+        BEGIN
+            UPDATE games SET replay = NULL WHERE id = NEW.id;
+        END
+    """)
+
+def _migrate_best_moves(conn):
+    # Engine best move per ply, aligned with games.evals, so puzzles can be re-derived without the engine
+    conn.execute("ALTER TABLE games ADD COLUMN best_moves TEXT")
+
+def _migrate_game_stats(conn):
+    # Per game, side and phase totals derived from evals and puzzles (see player_stats.py)
+    conn.execute("""
+        CREATE TABLE game_stats (
+            game_id INTEGER NOT NULL,
+            side TEXT NOT NULL,
+            phase TEXT NOT NULL,
+            player TEXT COLLATE NOCASE,
+            date TEXT,
+            moves INTEGER NOT NULL,
+            cp_loss INTEGER NOT NULL,
+            accuracy REAL NOT NULL,
+            inaccuracies INTEGER NOT NULL,
+            mistakes INTEGER NOT NULL,
+            blunders INTEGER NOT NULL,
+            puzzles INTEGER NOT NULL,
+            PRIMARY KEY (game_id, side, phase)
+        ) WITHOUT ROWID
+    """)
+    conn.execute("CREATE INDEX idx_game_stats_player ON game_stats(player, date)")
+    # The same sums per player, side, phase and month ('' if the date is unknown)
+    conn.execute("""
+        CREATE TABLE player_summary (
+            player TEXT NOT NULL COLLATE NOCASE,
+            side TEXT NOT NULL,
+            phase TEXT NOT NULL,
+            month TEXT NOT NULL,
+            games INTEGER NOT NULL,
+            moves INTEGER NOT NULL,
+            cp_loss INTEGER NOT NULL,
+            accuracy REAL NOT NULL,
+            inaccuracies INTEGER NOT NULL,
+            mistakes INTEGER NOT NULL,
+            blunders INTEGER NOT NULL,
+            puzzles INTEGER NOT NULL,
+            PRIMARY KEY (player, side, phase, month)
+        ) WITHOUT ROWID
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_puzzles_game ON puzzles(game_id)")
+
+def _migrate_positions_version(conn):
+    # Index version shared by every process using the database (see get_positions_version)
+    conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('positions_version', 0)")
+
+# Schema migrations, applied in order. A database's PRAGMA user_version is the
+# number of steps it has had; append new steps, never edit applied ones.
+MIGRATIONS = [
+    _migrate_base,
+    _migrate_best_moves,
+    _migrate_game_stats,
+    _migrate_positions_version,
+]
+SCHEMA_VERSION = len(MIGRATIONS)
+
+def schema_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
 def init_db():
+    """Applies pending migrations. Once the schema is current this is one PRAGMA read."""
     with get_db() as conn:
-        conn.execute("""
-            CREATE TABLE IF NOT EXISTS games (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                pgn TEXT NOT NULL,
-                name TEXT,
-                white TEXT,
-                black TEXT,
-                result TEXT,
-                date TEXT,
-                annotations TEXT,
-                tags TEXT,
-                evals TEXT,
-                folder_id INTEGER REFERENCES folders(id) ON DELETE SET NULL
-            )
-        """)
-        conn.execute("""
-            CREATE TABLE IF NOT EXISTS puzzles (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                game_id INTEGER,
-                fen TEXT,
-                best_move TEXT,
-                played_move TEXT,
-                score_before INTEGER,
-                score_after INTEGER,
-                move_number INTEGER,
-                move_index INTEGER,
-                turn TEXT,
-                FOREIGN KEY(game_id) REFERENCES games(id) ON DELETE CASCADE
-            )
-        """)
-        conn.execute("""
-            CREATE TABLE IF NOT EXISTS folders (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT NOT NULL,
-                created_at TEXT DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-        # Migrate: add missing columns to existing games table
-        cols = [row[1] for row in conn.execute("PRAGMA table_info(games)").fetchall()]
-        if 'folder_id' not in cols:
-            conn.execute("ALTER TABLE games ADD COLUMN folder_id INTEGER REFERENCES folders(id) ON DELETE SET NULL")
-        if 'name' not in cols:
-            conn.execute("ALTER TABLE games ADD COLUMN name TEXT")
-        if 'evals' not in cols:
-            conn.execute("ALTER TABLE games ADD COLUMN evals TEXT")
-        conn.commit()
-
-def add_game(pgn, white="", black="", result="", date="", annotations="", tags="", name=None):
+        if schema_version(conn) == SCHEMA_VERSION:
+            return
+        # Take the write lock before re-checking, so concurrent workers migrate once
+        conn.isolation_level = None
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            version = schema_version(conn)
+            if version > SCHEMA_VERSION:
+                raise RuntimeError(f"Database schema version {version} is newer than this code ({SCHEMA_VERSION})")
+            for step in range(version, SCHEMA_VERSION):
+                MIGRATIONS[step](conn)
+                conn.execute(f"PRAGMA user_version = {step + 1}")
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+# --- Library version ---
+# Bumped in the same transaction as every change to games, puzzles or folders,
+# so HTTP responses built from them can be revalidated by version alone.
+
+def _bump_library(conn):
+    conn.execute("UPDATE meta SET value = value + 1 WHERE key = 'library_version'")
+
+@metrics.timed("db.get_library_version")
+def get_library_version():
+    """
+    Current library version, read from the meta table on every call (one
+    primary-key lookup). File timestamps are too coarse to cache it by: two
+    commits in the same tick would leave the first version in place.
+    """
+    with get_db() as conn:
+        row = conn.execute("SELECT value FROM meta WHERE key = 'library_version'").fetchone()
+    return row[0] if row else 0
+
+@metrics.timed("db.add_game")
+def add_game(pgn, white="", black="", result="", date="", annotations="", tags="", name=None, replay=None):
     with get_db() as conn:
         cursor = conn.execute(
-            "INSERT INTO games (pgn, name, white, black, result, date, annotations, tags) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
-            (pgn, name, white, black, result, date, annotations, tags)
+            "INSERT INTO games (pgn, name, white, black, result, date, annotations, tags, replay) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (pgn, name, white, black, result, date, annotations, tags, replay)
         )
+        _bump_library(conn)
         return cursor.lastrowid
 
+@metrics.timed("db.delete_game")
 def delete_game(game_id):
     with get_db() as conn:
         conn.execute("DELETE FROM games WHERE id = ?", (game_id,))
         # Cascade delete is not enabled by default in SQLite for some versions/drivers, so manual delete for safety
         conn.execute("DELETE FROM puzzles WHERE game_id = ?", (game_id,))
+        conn.execute("DELETE FROM positions WHERE game_id = ?", (game_id,))
+        _delete_game_stats(conn, [game_id])
+        _bump_library(conn)
+        _bump_positions(conn)
 
+@metrics.timed("db.update_game")
 def update_game(game_id, annotations=None, tags=None):
     with get_db() as conn:
         if annotations is not None:
             conn.execute("UPDATE games SET annotations = ? WHERE id = ?", (annotations, game_id))
         if tags is not None:
             conn.execute("UPDATE games SET tags = ? WHERE id = ?", (tags, game_id))
+        _bump_library(conn)
+
+@metrics.timed("db.save_evals")
+def save_evals(game_id, evals_json, best_moves_json=None):
+    with get_db() as conn:
+        conn.execute("UPDATE games SET evals = ?, best_moves = ? WHERE id = ?", (evals_json, best_moves_json, game_id))
+        _bump_library(conn)
+
+@metrics.timed("db.save_best_moves")
+def save_best_moves(game_id, best_moves_json):
+    # Engine output only; nothing served from the library changes
+    with get_db() as conn:
+        conn.execute("UPDATE games SET best_moves = ? WHERE id = ?", (best_moves_json, game_id))
 
+@metrics.timed("db.replace_puzzles")
+def replace_puzzles(game_ids, puzzles):
+    """
+    Replaces the puzzles of the given games in one transaction.
+    puzzles: [(game_id, fen, best_move, played_move, score_before, score_after, move_number, move_index, turn)]
+    """
+    ids = list(game_ids)
+    with get_db() as conn:
+        for i in range(0, len(ids), 500):
+            chunk = ids[i:i + 500]
+            conn.execute(f"DELETE FROM puzzles WHERE game_id IN ({','.join('?' * len(chunk))})", chunk)
+        conn.executemany(
+            "INSERT INTO puzzles (game_id, fen, best_move, played_move, score_before, score_after, move_number, move_index, turn) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            puzzles
+        )
+        _bump_library(conn)
+
+@metrics.timed("db.add_puzzle")
 def add_puzzle(game_id, fen, best_move, played_move, score_before, score_after, move_number, move_index, turn):
     with get_db() as conn:
         conn.execute(
             "INSERT INTO puzzles (game_id, fen, best_move, played_move, score_before, score_after, move_number, move_index, turn) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
             (game_id, fen, best_move, played_move, score_before, score_after, move_number, move_index, turn)
         )
+        _bump_library(conn)
 
+@metrics.timed("db.delete_puzzles")
+def delete_puzzles(game_id):
+    with get_db() as conn:
+        conn.execute("DELETE FROM puzzles WHERE game_id = ?", (game_id,))
+        _bump_library(conn)
+
+@metrics.timed("db.get_puzzles")
 def get_puzzles(game_id):
     with get_db() as conn:
         return [dict(row) for row in conn.execute("SELECT * FROM puzzles WHERE game_id = ?", (game_id,)).fetchall()]
 
+# Columns returned by get_all_games; per-ply analysis blobs are left out
+GAME_COLUMNS = "id, pgn, name, white, black, result, date, annotations, tags, evals, folder_id"
+
+@metrics.timed("db.get_game")
+def get_game(game_id):
+    with get_db() as conn:
+        row = conn.execute(f"SELECT {GAME_COLUMNS} FROM games WHERE id = ?", (game_id,)).fetchone()
+        return dict(row) if row else None
+
+@metrics.timed("db.get_game_view")
+def get_game_view(game_id):
+    """
+    The fields the game viewer needs, in one row read. `pgn` is only
+    returned when the stored replay is missing and has to be rebuilt.
+    """
+    with get_db() as conn:
+        row = conn.execute("""
+            SELECT id, white, black, result, date, annotations, evals, replay,
+                   CASE WHEN replay IS NULL THEN pgn END AS pgn
+            FROM games WHERE id = ?
+        """, (game_id,)).fetchone()
+        return dict(row) if row else None
+
+@metrics.timed("db.get_game_replay")
+def get_game_replay(game_id):
+    """The stored replay blob of a game, or None."""
+    with get_db() as conn:
+        row = conn.execute("SELECT replay FROM games WHERE id = ?", (game_id,)).fetchone()
+        return row[0] if row else None
+
+@metrics.timed("db.save_replay")
+def save_replay(game_id, replay):
+    # Derived from the PGN, so the library version is left alone
+    with get_db() as conn:
+        conn.execute("UPDATE games SET replay = ? WHERE id = ?", (replay, game_id))
+
+@metrics.timed("db.save_replays")
+def save_replays(replays):
+    """replays: {game_id: packed replay}, written in one transaction."""
+    with get_db() as conn:
+        conn.executemany("UPDATE games SET replay = ? WHERE id = ?", [(blob, game_id) for game_id, blob in replays.items()])
+
+@metrics.timed("db.get_positional_sources")
+def get_positional_sources(game_ids):
+    """Returns [(id, pgn, positional)] for the given games."""
+    ids = list(game_ids)
+    rows = []
+    with get_db() as conn:
+        for i in range(0, len(ids), 500):
+            chunk = ids[i:i + 500]
+            rows.extend(tuple(row) for row in conn.execute(
+                f"SELECT id, pgn, positional FROM games WHERE id IN ({','.join('?' * len(chunk))})",
+                chunk
+            ).fetchall())
+    return rows
+
+@metrics.timed("db.save_positional_many")
+def save_positional_many(rows):
+    """rows: iterable of (positional, game_id)"""
+    # A cache of the analysis of the stored moves; the library version is left alone
+    with get_db() as conn:
+        conn.executemany("UPDATE games SET positional = ? WHERE id = ?", rows)
+
+@metrics.timed("db.get_all_games")
 def get_all_games():
     with get_db() as conn:
-        return [dict(row) for row in conn.execute("SELECT * FROM games").fetchall()]
+        return [dict(row) for row in conn.execute(f"SELECT {GAME_COLUMNS} FROM games").fetchall()]
+
+# --- Bulk iteration (exports) ---
+# Keyset-paged: each batch is its own short read, so a long export neither holds
+# rows in memory nor keeps the database locked against writers between batches.
+
+EXPORT_BATCH_SIZE = 500
+
+def iter_games(folder_id=None, game_ids=None, columns=GAME_COLUMNS, batch_size=EXPORT_BATCH_SIZE):
+    """Yields game rows (dicts) in id order, optionally limited to a folder and/or a set of ids."""
+    where = "AND folder_id = ?" if folder_id is not None else ""
+    params = (folder_id,) if folder_id is not None else ()
+    if game_ids is not None:
+        ids = sorted(set(game_ids))
+        for i in range(0, len(ids), batch_size):
+            chunk = ids[i:i + batch_size]
+            with get_db() as conn:
+                rows = conn.execute(
+                    f"SELECT {columns} FROM games WHERE id IN ({','.join('?' * len(chunk))}) {where} ORDER BY id",
+                    chunk + list(params)
+                ).fetchall()
+            for row in rows:
+                yield dict(row)
+        return
+    last_id = 0
+    while True:
+        with get_db() as conn:
+            rows = conn.execute(
+                f"SELECT {columns} FROM games WHERE id > ? {where} ORDER BY id LIMIT ?",
+                (last_id,) + params + (batch_size,)
+            ).fetchall()
+        for row in rows:
+            yield dict(row)
+        if len(rows) < batch_size:
+            return
+        last_id = rows[-1]['id']
+
+def iter_puzzles(folder_id=None, batch_size=EXPORT_BATCH_SIZE):
+    """Yields puzzles in id order with the players and date of their game."""
+    where = "AND g.folder_id = ?" if folder_id is not None else ""
+    params = (folder_id,) if folder_id is not None else ()
+    last_id = 0
+    while True:
+        with get_db() as conn:
+            rows = conn.execute(f"""
+                SELECT p.*, g.white, g.black, g.date FROM puzzles p
+                JOIN games g ON g.id = p.game_id
+                WHERE p.id > ? {where} ORDER BY p.id LIMIT ?
+            """, (last_id,) + params + (batch_size,)).fetchall()
+        for row in rows:
+            yield dict(row)
+        if len(rows) < batch_size:
+            return
+        last_id = rows[-1]['id']
+
+# --- Position index functions ---
+
+@metrics.timed("db.add_positions")
+def add_positions(game_id, rows):
+    """
+    Replaces the index entries of a game.
+    rows: [(game_id, ply, zobrist, white_pawns, black_pawns, material)]
+    """
+    with get_db() as conn:
+        conn.execute("DELETE FROM positions WHERE game_id = ?", (game_id,))
+        conn.executemany(
+            "INSERT INTO positions (game_id, ply, zobrist, white_pawns, black_pawns, material) VALUES (?, ?, ?, ?, ?, ?)",
+            rows
+        )
+        _bump_positions(conn)
+
+# Bumped with every change to the index rows, in the same transaction, so
+# in-memory copies of the index (in any process) know to reload
+
+def _bump_positions(conn):
+    conn.execute("UPDATE meta SET value = value + 1 WHERE key = 'positions_version'")
+
+def get_positions_version():
+    with get_db() as conn:
+        row = conn.execute("SELECT value FROM meta WHERE key = 'positions_version'").fetchone()
+    return row[0] if row else 0
+
+def iter_position_structures(batch_size=10000):
+    """
+    Yields lists of (game_id, ply, white_pawns, black_pawns, material) rows,
+    batch_size at a time, covering every indexed ply. One read, so the
+    batches are a consistent snapshot of the index.
+    """
+    with get_db() as conn:
+        # Plain tuples: cheaper than Row objects, and what np.fromiter takes
+        conn.row_factory = None
+        cursor = conn.execute("SELECT game_id, ply, white_pawns, black_pawns, material FROM positions")
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                return
+            yield rows
+
+@metrics.timed("db.get_games_by_ids")
+def get_games_by_ids(game_ids):
+    """Returns {id: game} without the PGN text."""
+    result = {}
+    ids = list(game_ids)
+    with get_db() as conn:
+        for i in range(0, len(ids), 500):
+            chunk = ids[i:i + 500]
+            rows = conn.execute(
+                f"SELECT id, white, black, result, date, name, folder_id FROM games WHERE id IN ({','.join('?' * len(chunk))})",
+                chunk
+            ).fetchall()
+            result.update({row['id']: dict(row) for row in rows})
+    return result
+
+@metrics.timed("db.get_unindexed_games")
+def get_unindexed_games():
+    with get_db() as conn:
+        return [(row['id'], row['pgn']) for row in conn.execute("""
+            SELECT id, pgn FROM games
+            WHERE NOT EXISTS (SELECT 1 FROM positions p WHERE p.game_id = games.id)
+        """).fetchall()]
+
+@metrics.timed("db.find_positions")
+def find_positions(zobrist):
+    with get_db() as conn:
+        return [dict(row) for row in conn.execute("""
+            SELECT p.game_id, p.ply, g.white, g.black, g.result, g.date, g.name, g.folder_id
+            FROM positions p
+            JOIN games g ON g.id = p.game_id
+            WHERE p.zobrist = ?
+            ORDER BY p.game_id, p.ply
+        """, (zobrist,)).fetchall()]
 
 # --- Folder functions ---
 
+@metrics.timed("db.create_folder")
 def create_folder(name):
     with get_db() as conn:
         cursor = conn.execute("INSERT INTO folders (name) VALUES (?)", (name,))
+        _bump_library(conn)
         return cursor.lastrowid
 
+@metrics.timed("db.get_all_folders")
 def get_all_folders():
     with get_db() as conn:
         return [dict(row) for row in conn.execute("SELECT * FROM folders ORDER BY name").fetchall()]
 
+@metrics.timed("db.rename_folder")
 def rename_folder(folder_id, name):
     with get_db() as conn:
         conn.execute("UPDATE folders SET name = ? WHERE id = ?", (name, folder_id))
+        _bump_library(conn)
 
+@metrics.timed("db.delete_folder")
 def delete_folder(folder_id, delete_games=False):
     with get_db() as conn:
         if delete_games:
             # Delete all puzzles for games in this folder, then the games
             game_ids = [r['id'] for r in conn.execute("SELECT id FROM games WHERE folder_id = ?", (folder_id,)).fetchall()]
+            _delete_game_stats(conn, game_ids)
             for gid in game_ids:
                 conn.execute("DELETE FROM puzzles WHERE game_id = ?", (gid,))
+                conn.execute("DELETE FROM positions WHERE game_id = ?", (gid,))
                 conn.execute("DELETE FROM games WHERE id = ?", (gid,))
+            _bump_positions(conn)
         else:
             # Move games back to unfiled
             conn.execute("UPDATE games SET folder_id = NULL WHERE folder_id = ?", (folder_id,))
         conn.execute("DELETE FROM folders WHERE id = ?", (folder_id,))
+        _bump_library(conn)
 
+@metrics.timed("db.move_game_to_folder")
 def move_game_to_folder(game_id, folder_id):
     with get_db() as conn:
         conn.execute("UPDATE games SET folder_id = ? WHERE id = ?", (folder_id, game_id))
+        _bump_library(conn)
 
+@metrics.timed("db.get_folder_stats")
 def get_folder_stats():
     """Returns {folder_id: {game_count, puzzle_count}} including None for unfiled."""
     with get_db() as conn:
@@ -139,6 +535,126 @@ def get_folder_stats():
         """).fetchall()
         return {row['folder_id']: {'game_count': row['game_count'], 'puzzle_count': row['puzzle_count']} for row in rows}
 
+# --- Player statistics ---
+# game_stats holds one row per game, side and phase, rewritten whenever a game's
+# evals or puzzles change. player_summary keeps the same sums per player, side,
+# phase and month, adjusted by the difference in the same transaction, so a
+# player's report reads a few dozen rows however many games they have.
+
+GAME_STATS_COLUMNS = ("game_id", "side", "phase", "player", "date", "moves", "cp_loss", "accuracy",
+                      "inaccuracies", "mistakes", "blunders", "puzzles")
+STATS_SUMS = ("moves", "cp_loss", "accuracy", "inaccuracies", "mistakes", "blunders", "puzzles")
+# Group keys over game_stats and over player_summary
+STATS_GROUPS = {
+    None: ("NULL", "NULL"),
+    "phase": ("s.phase", "s.phase"),
+    "side": ("s.side", "s.side"),
+    "month": ("substr(s.date, 1, 7)", "NULLIF(s.month, '')"),
+    "year": ("substr(s.date, 1, 4)", "NULLIF(substr(s.month, 1, 4), '')"),
+}
+
+def _add_to_summary(conn, game_ids, sign):
+    # Adds (sign 1) or takes away (sign -1) these games' rows for named players
+    conn.execute(f"""
+        INSERT INTO player_summary (player, side, phase, month, games, {', '.join(STATS_SUMS)})
+        SELECT player, side, phase, COALESCE(substr(date, 1, 7), ''), {sign} * COUNT(*),
+               {', '.join(f"{sign} * SUM({column})" for column in STATS_SUMS)}
+        FROM game_stats
+        WHERE game_id IN ({','.join('?' * len(game_ids))}) AND player IS NOT NULL
+        GROUP BY player, side, phase, COALESCE(substr(date, 1, 7), '')
+        ON CONFLICT (player, side, phase, month) DO UPDATE SET
+            games = games + excluded.games, {', '.join(f"{column} = {column} + excluded.{column}" for column in STATS_SUMS)}
+    """, game_ids)
+
+def _delete_game_stats(conn, game_ids):
+    """Returns the number of game_stats rows deleted."""
+    ids = list(game_ids)
+    deleted = 0
+    for i in range(0, len(ids), 500):
+        chunk = ids[i:i + 500]
+        _add_to_summary(conn, chunk, -1)
+        deleted += conn.execute(f"DELETE FROM game_stats WHERE game_id IN ({','.join('?' * len(chunk))})", chunk).rowcount
+    conn.execute("DELETE FROM player_summary WHERE games <= 0")
+    return deleted
+
+@metrics.timed("db.replace_game_stats")
+def replace_game_stats(game_ids, rows):
+    """
+    Replaces the stats rows of the given games in one transaction. rows: tuples
+    in GAME_STATS_COLUMNS order. The library version only moves if rows were
+    deleted or written, so re-checking games that cannot be scored changes nothing.
+    """
+    ids = list(game_ids)
+    with get_db() as conn:
+        deleted = _delete_game_stats(conn, ids)
+        conn.executemany(
+            f"INSERT INTO game_stats ({', '.join(GAME_STATS_COLUMNS)}) VALUES ({', '.join('?' * len(GAME_STATS_COLUMNS))})",
+            rows
+        )
+        written = sorted({row[0] for row in rows})
+        for i in range(0, len(written), 500):
+            _add_to_summary(conn, written[i:i + 500], 1)
+        if deleted or rows:
+            _bump_library(conn)
+
+@metrics.timed("db.get_puzzle_moves")
+def get_puzzle_moves(game_ids):
+    """{game_id: [(move_index, turn)]} for the puzzles of the given games."""
+    ids = list(game_ids)
+    result = {}
+    with get_db() as conn:
+        for i in range(0, len(ids), 500):
+            chunk = ids[i:i + 500]
+            for row in conn.execute(
+                f"SELECT game_id, move_index, turn FROM puzzles WHERE game_id IN ({','.join('?' * len(chunk))})", chunk
+            ).fetchall():
+                result.setdefault(row['game_id'], []).append((row['move_index'], row['turn']))
+    return result
+
+@metrics.timed("db.get_games_missing_stats")
+def get_games_missing_stats():
+    """Ids of games with evals but no stats rows yet (scanned before stats were kept)."""
+    with get_db() as conn:
+        return [row[0] for row in conn.execute("""
+            SELECT id FROM games g
+            WHERE evals IS NOT NULL AND evals != '[]'
+              AND NOT EXISTS (SELECT 1 FROM game_stats s WHERE s.game_id = g.id)
+        """).fetchall()]
+
+@metrics.timed("db.sum_game_stats")
+def sum_game_stats(player=None, folder_id=None, group=None):
+    """
+    Sums the stats of a player's games (either side, case-insensitive) and/or a
+    folder's. Returns one dict per group value ("key") with the number of games.
+    """
+    if group not in STATS_GROUPS:
+        raise ValueError(f"group must be one of {', '.join(g for g in STATS_GROUPS if g)}")
+    sums = ", ".join(f"SUM(s.{column}) AS {column}" for column in STATS_SUMS)
+    if player is not None and folder_id is None:
+        # Each side's first move is in the opening, so opening rows count every game once
+        games = "SUM(s.games)" if group == "phase" else "SUM(CASE WHEN s.phase = 'opening' THEN s.games END)"
+        sql = f"""
+            SELECT {STATS_GROUPS[group][1]} AS key, {games} AS games, {sums}
+            FROM player_summary s WHERE s.player = ? GROUP BY key ORDER BY key
+        """
+        params = [player]
+    else:
+        join, where, params = "", [], []
+        if player is not None:
+            where.append("s.player = ?")
+            params.append(player)
+        if folder_id is not None:
+            join = "JOIN games g ON g.id = s.game_id"
+            where.append("g.folder_id = ?")
+            params.append(folder_id)
+        sql = f"""
+            SELECT {STATS_GROUPS[group][0]} AS key, COUNT(DISTINCT s.game_id) AS games, {sums}
+            FROM game_stats s {join} {"WHERE " + " AND ".join(where) if where else ""}
+            GROUP BY key ORDER BY key
+        """
+    with get_db() as conn:
+        return [dict(row) for row in conn.execute(sql, params).fetchall()]
+
 if __name__ == "__main__":
     init_db()
     print("✅ Database initialized.")
@@ -0,0 +1,297 @@
+"""
+Shared UCI engines and the CPU/memory budget they run in.
+
+Engines are kept running between requests so callers skip the spawn and
+handshake. Every lease has a priority:
+
+- INTERACTIVE (/analyze, the bot): served first, searches with more threads.
+- BACKGROUND (game scans, speculative pre-analysis): limited to size - 1
+  engines so an interactive request always finds one, searches with fewer
+  threads, and only gets an engine when no interactive request is waiting.
+  Long-running background work calls wait_turn() between searches, which
+  blocks while interactive searches are running or waiting.
+
+Engines get Hash = hash budget / pool size once, and Threads per lease.
+Leases together never hold more threads than the core budget: a lease gets
+its priority's share or what is left of the budget if that is less, and
+waits if nothing is left. Background work paused in wait_turn(engine) lends
+its threads to the interactive searches it is waiting for.
+The pool holds one engine per core plus the one kept for interactive use
+(CHESS_MIMIC_ENGINES overrides), so a parallel scan can keep every core busy
+with single-threaded searches; engines are only spawned when leased.
+"""
+import os
+import time
+import atexit
+import threading
+import contextlib
+import collections
+import chess.engine
+import metrics
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+ENGINE_PATH = os.environ.get("CHESS_MIMIC_ENGINE", os.path.join(BASE_DIR, "engines", "stockfish"))
+# Cores and hash memory (MB) all engines together may use
+CPU_BUDGET = int(os.environ.get("CHESS_MIMIC_ENGINE_CORES", 0)) or os.cpu_count() or 1
+HASH_BUDGET_MB = int(os.environ.get("CHESS_MIMIC_ENGINE_HASH_MB", 256))
+POOL_SIZE = int(os.environ.get("CHESS_MIMIC_ENGINES", 0)) or max(2, CPU_BUDGET + 1)
+
+INTERACTIVE = "interactive"
+BACKGROUND = "background"
+PRIORITIES = (INTERACTIVE, BACKGROUND)
+
+class EngineUnavailable(Exception):
+    """No engine could be handed out (missing binary or pool exhausted until the timeout)."""
+
+class _Lease:
+    def __init__(self, priority, threads):
+        self.priority = priority
+        self.threads = threads
+        self.started = time.monotonic()
+        self.paused = False
+
+class EnginePool:
+    def __init__(self, path=ENGINE_PATH, size=POOL_SIZE, cores=CPU_BUDGET, hash_mb=HASH_BUDGET_MB):
+        self.path = path
+        self.size = size
+        self.cores = cores
+        self.hash_mb = hash_mb
+        self._idle = []
+        self._count = 0
+        self._leases = {}   # engine -> _Lease
+        self._threads = {}  # engine -> Threads it is configured with
+        self._leased = 0    # threads of all leases
+        self._paused = 0    # threads of background leases paused in wait_turn
+        self._active = collections.Counter()
+        self._waiting = collections.Counter()
+        self._cond = threading.Condition()
+        self._started = time.monotonic()
+        self._closed = False
+        self.busy_thread_seconds = collections.Counter()
+        self.counters = collections.Counter()
+
+    def available(self):
+        return os.path.exists(self.path)
+
+    def threads_for(self, priority):
+        """Interactive searches get half the cores, background ones a quarter (at least one each)."""
+        if priority == INTERACTIVE:
+            return max(1, self.cores // 2)
+        return max(1, self.cores // 4)
+
+    def hash_per_engine(self):
+        return max(1, self.hash_mb // max(1, self.size))
+
+    def _interactive_busy(self):
+        return self._active[INTERACTIVE] > 0 or self._waiting[INTERACTIVE] > 0
+
+    def _may_take(self, priority, threads):
+        """Threads a new lease may have now, within the core budget; 0 if it has to wait."""
+        if priority == INTERACTIVE:
+            free = self.cores - (self._leased - self._paused)
+        else:
+            # Interactive requests go first and always keep one engine free
+            if self._waiting[INTERACTIVE] or self._active[BACKGROUND] >= max(1, self.size - 1):
+                return 0
+            # Threads lent out by paused background leases are still theirs
+            free = self.cores - self._leased
+        return min(threads, free) if free > 0 else 0
+
+    def acquire(self, timeout=None, priority=INTERACTIVE, threads=None):
+        """
+        Returns an engine; pair with release(). Raises EngineUnavailable.
+        threads: search threads for this lease instead of the priority's default
+        (fewer if the core budget is short).
+        """
+        if not self.available():
+            raise EngineUnavailable(f"Engine not found at {self.path}")
+        wanted = threads or self.threads_for(priority)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        engine, spawn = None, False
+        waited = time.perf_counter()
+        with self._cond:
+            self._waiting[priority] += 1
+            try:
+                while True:
+                    threads = self._may_take(priority, wanted)
+                    if threads:
+                        if self._idle:
+                            engine = self._idle.pop()
+                            break
+                        if self._count < self.size:
+                            self._count += 1
+                            spawn = True
+                            break
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        if timeout:
+                            self.counters[f"{priority}_timeouts"] += 1
+                        raise EngineUnavailable("All engines busy")
+                    self._cond.wait(remaining)
+            finally:
+                self._waiting[priority] -= 1
+                self._cond.notify_all()
+            self._active[priority] += 1
+            self._leased += threads
+            self.counters[f"{priority}_leases"] += 1
+        metrics.observe("chess_mimic_engine_wait_seconds", time.perf_counter() - waited, priority=priority)
+
+        try:
+            if spawn:
+                with metrics.timer("engine.spawn"):
+                    engine = chess.engine.SimpleEngine.popen_uci(self.path)
+                    self._configure(engine, {"Hash": self.hash_per_engine()})
+            if self._threads.get(engine) != threads:
+                self._configure(engine, {"Threads": threads})
+                self._threads[engine] = threads
+        except Exception as e:
+            with self._cond:
+                self._active[priority] -= 1
+                self._leased -= threads
+                self._count -= 1
+                self._cond.notify_all()
+            if engine is not None:
+                self._close(engine)
+            raise EngineUnavailable(str(e)) from e
+        with self._cond:
+            self._leases[engine] = _Lease(priority, threads)
+        return engine
+
+    def try_acquire(self, priority=INTERACTIVE, threads=None):
+        """Returns an engine if one can be handed out without waiting, else None."""
+        try:
+            return self.acquire(timeout=0, priority=priority, threads=threads)
+        except EngineUnavailable:
+            return None
+
+    def _configure(self, engine, options):
+        # Engines without the option just keep their defaults
+        options = {name: value for name, value in options.items() if name in engine.options}
+        if options:
+            engine.configure(options)
+
+    def _close(self, engine):
+        self._threads.pop(engine, None)
+        try:
+            engine.close()
+        except Exception:
+            pass
+
+    def release(self, engine, broken=False):
+        with self._cond:
+            lease = self._leases.pop(engine, None)
+            if lease is not None:
+                self._active[lease.priority] -= 1
+                self._leased -= lease.threads
+                if lease.paused:
+                    self._paused -= lease.threads
+                else:
+                    self.busy_thread_seconds[lease.priority] += lease.threads * (time.monotonic() - lease.started)
+            # Engines coming back after close() are shut down too
+            broken = broken or self._closed
+            if broken:
+                self._count -= 1
+            else:
+                self._idle.append(engine)
+            self._cond.notify_all()
+        if broken:
+            self._close(engine)
+
+    @contextlib.contextmanager
+    def engine(self, timeout=None, priority=INTERACTIVE, threads=None):
+        engine = self.acquire(timeout, priority, threads)
+        broken = False
+        try:
+            yield engine
+        except (chess.engine.EngineError, chess.engine.EngineTerminatedError):
+            broken = True
+            raise
+        finally:
+            self.release(engine, broken)
+
+    def wait_turn(self, engine=None, timeout=None):
+        """
+        Backpressure for background work holding an engine: blocks while
+        interactive searches are running or waiting. Returns the seconds waited.
+        Given the engine, its lease's threads are free for interactive
+        searches while it waits.
+        """
+        start = time.monotonic()
+        with self._cond:
+            if self._interactive_busy():
+                self.counters["background_pauses"] += 1
+                lease = self._leases.get(engine)
+                if lease is not None:
+                    self._pause(lease, True)
+                try:
+                    self._cond.wait_for(lambda: not self._interactive_busy(), timeout)
+                finally:
+                    if lease is not None:
+                        self._pause(lease, False)
+        waited = time.monotonic() - start
+        self.counters["background_paused_ms"] += int(waited * 1000)
+        return waited
+
+    def _pause(self, lease, paused):
+        """Caller holds the condition."""
+        now = time.monotonic()
+        if paused:
+            self.busy_thread_seconds[lease.priority] += lease.threads * (now - lease.started)
+            self._paused += lease.threads
+            self._cond.notify_all()
+        else:
+            lease.started = now
+            self._paused -= lease.threads
+        lease.paused = paused
+
+    def stats(self):
+        with self._cond:
+            now = time.monotonic()
+            searching = [lease for lease in self._leases.values() if not lease.paused]
+            in_use = sum(lease.threads for lease in searching)
+            busy = sum(self.busy_thread_seconds.values())
+            busy += sum(lease.threads * (now - lease.started) for lease in searching)
+            return {
+                "path": self.path,
+                "available": self.available(),
+                "cores": self.cores,
+                "hash_mb": self.hash_mb,
+                "size": self.size,
+                "engines": self._count,
+                "idle": len(self._idle),
+                "threads": {p: self.threads_for(p) for p in PRIORITIES},
+                "active": {p: self._active[p] for p in PRIORITIES},
+                "waiting": {p: self._waiting[p] for p in PRIORITIES},
+                "threads_in_use": in_use,
+                "utilisation": round(in_use / self.cores, 3),
+                "average_utilisation": round(busy / (self.cores * max(now - self._started, 1e-9)), 3),
+                "counters": dict(self.counters),
+            }
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._count -= len(idle)
+        for engine in idle:
+            self._close(engine)
+
+def analyse(engine, board, limit, priority=INTERACTIVE, **kwargs):
+    """engine.analyse() with its search time and nodes recorded in metrics."""
+    start = time.perf_counter()
+    info = engine.analyse(board, limit, **kwargs)
+    metrics.engine_search(priority, time.perf_counter() - start, info)
+    return info
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = EnginePool()
+            # Pooled engines keep a non-daemon python-chess thread alive; close them
+            # before the interpreter starts waiting for those threads at exit.
+            getattr(threading, "_register_atexit", atexit.register)(_pool.close)
+        return _pool
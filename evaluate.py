@@ -0,0 +1,210 @@
+"""
+Measures how well a model built by ingest.py predicts a player.
+
+    python evaluate.py games.pgn "<player>" [--split-date 2024.01.01 | --test-fraction 0.2]
+                       [--processes N] [--neighbors] [--json results.json]
+
+The player's games are ordered by their Date header (games without a date
+count as oldest). The model is built from the older games exactly as
+ingest.py builds it, then every position in the newer games where the player
+was to move is replayed through the predictor in a process pool.
+
+Reports:
+- coverage: share of test positions the model has any moves for
+- top-1 / top-3: share of test positions where the played move was the
+  model's first / one of its first three predictions (uncovered positions count as misses)
+- with --neighbors, the same numbers when unseen positions fall back to a
+  nearest-neighbour index built from the training games
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import concurrent.futures
+import chess
+import chess.pgn
+import chess.polyglot
+import ingest
+import model_store
+
+TOP_K = 3
+# Test games handed to a worker at a time
+CHUNK_GAMES = 32
+
+# Set in each worker by _init_worker
+_model = None
+_neighbors = None
+
+def game_date(game):
+    """Sortable date key; unknown or partial dates ("????.??.??") sort first."""
+    date = game.headers.get("Date", "")
+    return date if date[:4].isdigit() else ""
+
+def load_games(file_path, target_player):
+    """Returns [(date, game)] for the player's games in file order."""
+    games = []
+    with open(file_path) as pgn:
+        while True:
+            game = chess.pgn.read_game(pgn)
+            if game is None:
+                break
+            if any(ingest.player_sides(game, target_player)):
+                games.append((game_date(game), game))
+    return games
+
+def split_games(games, split_date=None, test_fraction=0.2):
+    """
+    Splits [(date, game)] into (train, test) game lists. With split_date,
+    games on or after that date are the test set; otherwise the newest
+    `test_fraction` of games are.
+    """
+    # Stable sort keeps file order within a date
+    ordered = [game for _, game in sorted(games, key=lambda e: e[0])]
+    if split_date:
+        train = [g for g in ordered if game_date(g) < split_date]
+        test = [g for g in ordered if game_date(g) >= split_date]
+        return train, test
+    cut = len(ordered) - int(round(len(ordered) * test_fraction))
+    return ordered[:cut], ordered[cut:]
+
+def build_model(games, target_player):
+    move_db = ingest.new_move_db()
+    for game in games:
+        ingest.record_game(move_db, game, target_player)
+    return model_store.PlayerModel.from_dict(move_db)
+
+def build_neighbors(games, target_player):
+    import position_neighbors
+    history = position_neighbors.games_history(
+        (i, game) + ingest.player_sides(game, target_player) for i, game in enumerate(games))
+    return position_neighbors.NeighborIndex.build(*history)
+
+def test_positions(game, target_player):
+    """(starting FEN, [uci], is_white, is_black) - cheap to send to workers, no PGN re-parsing."""
+    is_white, is_black = ingest.player_sides(game, target_player)
+    return game.board().fen(), [m.uci() for m in game.mainline_moves()], is_white, is_black
+
+def _init_worker(positions, neighbors):
+    global _model, _neighbors
+    _model = positions
+    _neighbors = neighbors
+
+def _new_counts():
+    return {"positions": 0, "covered": 0, "top1": 0, "top3": 0,
+            "neighbor_covered": 0, "neighbor_top1": 0, "neighbor_top3": 0}
+
+def _evaluate_chunk(games):
+    import position_neighbors
+    counts = _new_counts()
+    for fen, moves, is_white, is_black in games:
+        board = chess.Board(fen)
+        for uci in moves:
+            if (board.turn == chess.WHITE and is_white) or (board.turn == chess.BLACK and is_black):
+                counts["positions"] += 1
+                entries = _model.get(chess.polyglot.zobrist_hash(board))
+                if entries:
+                    predicted = [move for move, _ in entries[:TOP_K]]
+                    prefix = ""
+                    counts["covered"] += 1
+                elif _neighbors is not None:
+                    predicted = [p["move"] for p in position_neighbors.predict_from_index(_neighbors, board, limit=TOP_K)]
+                    prefix = "neighbor_"
+                    if predicted:
+                        counts["neighbor_covered"] += 1
+                else:
+                    predicted = []
+                if predicted and predicted[0] == uci:
+                    counts[prefix + "top1"] += 1
+                if uci in predicted:
+                    counts[prefix + "top3"] += 1
+            board.push_uci(uci)
+    return counts
+
+def evaluate(train, test, target_player, processes=None, neighbors=False):
+    """Builds the model from `train` and scores it on `test`. Returns a results dict."""
+    start = time.perf_counter()
+    model = build_model(train, target_player)
+    index = build_neighbors(train, target_player) if neighbors else None
+    build_time = time.perf_counter() - start
+
+    work = [test_positions(game, target_player) for game in test]
+    chunks = [work[i:i + CHUNK_GAMES] for i in range(0, len(work), CHUNK_GAMES)]
+    counts = _new_counts()
+    start = time.perf_counter()
+    if processes == 1 or len(chunks) <= 1:
+        _init_worker(model.positions, index)
+        results = map(_evaluate_chunk, chunks)
+        for chunk_counts in results:
+            for key, value in chunk_counts.items():
+                counts[key] += value
+    else:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=processes, initializer=_init_worker,
+                                                    initargs=(model.positions, index)) as pool:
+            for chunk_counts in pool.map(_evaluate_chunk, chunks):
+                for key, value in chunk_counts.items():
+                    counts[key] += value
+    replay_time = time.perf_counter() - start
+
+    total = counts["positions"] or 1
+    results = {
+        "player": target_player,
+        "train_games": len(train),
+        "test_games": len(test),
+        "model_positions": len(model.positions),
+        "test_positions": counts["positions"],
+        "coverage": round(counts["covered"] / total, 4),
+        "top1": round(counts["top1"] / total, 4),
+        "top3": round(counts["top3"] / total, 4),
+        "build_seconds": round(build_time, 2),
+        "replay_seconds": round(replay_time, 2),
+        "positions_per_second": round(counts["positions"] / replay_time) if replay_time else None,
+    }
+    if neighbors:
+        results["with_neighbors"] = {
+            "coverage": round((counts["covered"] + counts["neighbor_covered"]) / total, 4),
+            "top1": round((counts["top1"] + counts["neighbor_top1"]) / total, 4),
+            "top3": round((counts["top3"] + counts["neighbor_top3"]) / total, 4),
+        }
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Train/test evaluation of a player's move model.")
+    parser.add_argument("pgn")
+    parser.add_argument("player")
+    parser.add_argument("--split-date", help="YYYY.MM.DD; games from this date on are the test set")
+    parser.add_argument("--test-fraction", type=float, default=0.2)
+    parser.add_argument("--processes", type=int, default=None)
+    parser.add_argument("--neighbors", action="store_true", help="Also score the nearest-neighbour fallback")
+    parser.add_argument("--json", dest="json_file", help="Write the results to this file")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.pgn):
+        print(f"❌ Error: {args.pgn} not found.")
+        sys.exit(1)
+
+    print(f"📂 Reading {args.pgn} for player '{args.player}'...")
+    games = load_games(args.pgn, args.player)
+    train, test = split_games(games, args.split_date, args.test_fraction)
+    if not train or not test:
+        print(f"❌ Need games on both sides of the split (train: {len(train)}, test: {len(test)}).")
+        sys.exit(1)
+
+    results = evaluate(train, test, args.player, args.processes, args.neighbors)
+
+    print(f"✅ {results['train_games']} training games ({results['model_positions']} positions), "
+          f"{results['test_games']} test games ({results['test_positions']} positions)")
+    print(f"   coverage {results['coverage']:.1%}   top-1 {results['top1']:.1%}   top-3 {results['top3']:.1%}")
+    if "with_neighbors" in results:
+        n = results["with_neighbors"]
+        print(f"   + neighbours: coverage {n['coverage']:.1%}   top-1 {n['top1']:.1%}   top-3 {n['top3']:.1%}")
+    print(f"⏱️  {results['positions_per_second']} positions/s (replay {results['replay_seconds']}s, "
+          f"build {results['build_seconds']}s)")
+
+    if args.json_file:
+        with open(args.json_file, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"💾 Results saved to {args.json_file}")
+
+if __name__ == "__main__":
+    main()
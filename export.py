@@ -0,0 +1,189 @@
+"""
+Streaming export of the library for off-box analysis.
+
+    python export.py pgn [--folder ID] [-o games.pgn]
+    python export.py puzzles [--format csv|ndjson] [--folder ID] [-o puzzles.csv]
+    python export.py tree [--folder ID] [-o tree.ndjson]
+
+- pgn: every game with its annotations as comments and its stored engine
+  evals as [%eval] comments. Player names, result and date missing from the
+  PGN headers are filled in from the library.
+- puzzles: one row per puzzle with the players and date of its game.
+- tree: the opening tree (same numbers as /tree), one NDJSON line per position.
+
+Each export is a generator of text chunks, served as-is by the /export
+endpoints. Games and puzzles are read in keyset-paged batches
+(database.iter_games / iter_puzzles). The tree is aggregated in a SQLite
+temp table instead of a dict, so memory stays flat however large the
+library is.
+"""
+import io
+import os
+import sys
+import csv
+import json
+import argparse
+import chess
+import chess.pgn
+import chess.engine
+import database
+
+PUZZLE_FIELDS = ["id", "game_id", "white", "black", "date", "move_number", "move_index", "turn",
+                 "fen", "best_move", "played_move", "score_before", "score_after"]
+# Stored evals of this size are mates (see puzzle_finder)
+MATE_SCORE = 10000
+# Rows inserted into the tree's temp table per statement
+TREE_INSERT_BATCH = 5000
+
+def _load_json(text, default):
+    if not text:
+        return default
+    try:
+        return json.loads(text)
+    except ValueError:
+        return default
+
+def _result_stat(result):
+    if result == "1-0":
+        return "win"
+    if result == "0-1":
+        return "loss"
+    return "draw"
+
+def tree_moves(game, result, evals):
+    """
+    Yields (position key, SAN, stat, eval or None) for every mainline move;
+    the rows /tree aggregates. The key is the first three FEN fields (placement,
+    side to move, castling): no en passant square or move counters.
+    """
+    stat = _result_stat(result)
+    board = game.board()
+    for move_idx, move in enumerate(game.mainline_moves()):
+        fen = " ".join(board.fen().split(' ')[:3])
+        yield fen, board.san(move), stat, evals[move_idx] if move_idx < len(evals) else None
+        board.push(move)
+
+# --- PGN ---
+
+def annotate_game(game, annotations, evals):
+    """
+    Adds the viewer's annotations and the scan's evals to the mainline comments.
+    evals[i] is the evaluation of the position before ply i (White's view), so
+    the eval shown after ply i is evals[i + 1]. Mates are stored as +-MATE_SCORE
+    without their distance, so they get no [%eval] rather than a wrong one.
+    """
+    board = game.board()
+    for ply, node in enumerate(game.mainline()):
+        board.push(node.move)
+        note = annotations.get(board.fen())
+        if note and note not in node.comment:
+            node.comment = f"{node.comment} {note}".strip()
+        if ply + 1 < len(evals) and abs(evals[ply + 1]) < MATE_SCORE:
+            node.set_eval(chess.engine.PovScore(chess.engine.Cp(int(evals[ply + 1])), chess.WHITE))
+    return game
+
+def export_pgn(folder_id=None, game_ids=None):
+    """Yields one PGN text (with a blank line after it) per game."""
+    for row in database.iter_games(folder_id, game_ids):
+        game = chess.pgn.read_game(io.StringIO(row['pgn']))
+        if game is None:
+            continue
+        for header, value in (("White", row['white']), ("Black", row['black']),
+                              ("Result", row['result']), ("Date", row['date'])):
+            if value and game.headers.get(header, "?").strip("?.*") == "":
+                game.headers[header] = value
+        annotate_game(game, _load_json(row['annotations'], {}), _load_json(row['evals'], []))
+        yield game.accept(chess.pgn.StringExporter(headers=True, variations=True, comments=True)) + "\n\n"
+
+# --- Puzzles ---
+
+def export_puzzles_csv(folder_id=None):
+    out = io.StringIO()
+    writer = csv.DictWriter(out, fieldnames=PUZZLE_FIELDS, extrasaction="ignore")
+    writer.writeheader()
+    for n, puzzle in enumerate(database.iter_puzzles(folder_id), 1):
+        writer.writerow(puzzle)
+        if n % database.EXPORT_BATCH_SIZE == 0:
+            yield out.getvalue()
+            out.seek(0)
+            out.truncate()
+    yield out.getvalue()
+
+def export_puzzles_ndjson(folder_id=None):
+    for puzzle in database.iter_puzzles(folder_id):
+        yield json.dumps({field: puzzle.get(field) for field in PUZZLE_FIELDS}) + "\n"
+
+# --- Opening tree ---
+
+def _fill_tree_table(conn, folder_id, game_ids):
+    rows = []
+    for row in database.iter_games(folder_id, game_ids, columns="id, pgn, result, evals"):
+        game = chess.pgn.read_game(io.StringIO(row['pgn']))
+        if game is None:
+            continue
+        for fen, san, stat, ev in tree_moves(game, row.get('result', '*'), _load_json(row['evals'], [])):
+            rows.append((fen, san, stat == "win", stat == "loss", stat == "draw", ev))
+        if len(rows) >= TREE_INSERT_BATCH:
+            conn.executemany("INSERT INTO tree_moves VALUES (?, ?, ?, ?, ?, ?)", rows)
+            rows = []
+    if rows:
+        conn.executemany("INSERT INTO tree_moves VALUES (?, ?, ?, ?, ?, ?)", rows)
+
+def export_tree_ndjson(folder_id=None, game_ids=None):
+    """Yields {"fen", "moves": {san: {count, win, loss, draw, avg_eval}}} lines, ordered by FEN."""
+    # The temp table belongs to this connection and lives in a temp file, not in the library
+    conn = database.get_db()
+    try:
+        conn.execute("PRAGMA temp_store = FILE")
+        conn.execute("""
+            CREATE TEMP TABLE tree_moves (
+                fen TEXT, san TEXT, win INTEGER, loss INTEGER, draw INTEGER, eval INTEGER
+            )
+        """)
+        _fill_tree_table(conn, folder_id, game_ids)
+        current, moves = None, {}
+        for fen, san, count, win, loss, draw, eval_sum, eval_count in conn.execute("""
+            SELECT fen, san, COUNT(*), SUM(win), SUM(loss), SUM(draw), SUM(eval), COUNT(eval)
+            FROM tree_moves GROUP BY fen, san ORDER BY fen, san
+        """):
+            if fen != current:
+                if current is not None:
+                    yield json.dumps({"fen": current, "moves": moves}) + "\n"
+                current, moves = fen, {}
+            moves[san] = {"count": count, "win": win, "loss": loss, "draw": draw,
+                          "avg_eval": round(eval_sum / eval_count) if eval_count else None}
+        if current is not None:
+            yield json.dumps({"fen": current, "moves": moves}) + "\n"
+    finally:
+        conn.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Export games, puzzles or the opening tree.")
+    parser.add_argument("what", choices=["pgn", "puzzles", "tree"])
+    parser.add_argument("--folder", type=int, help="Only games in this folder")
+    parser.add_argument("--format", choices=["csv", "ndjson"], default="csv", help="Puzzle format")
+    parser.add_argument("-o", "--output", help="Output file (default: stdout)")
+    args = parser.parse_args()
+
+    database.init_db()
+    if args.what == "pgn":
+        chunks = export_pgn(args.folder)
+    elif args.what == "tree":
+        chunks = export_tree_ndjson(args.folder)
+    elif args.format == "ndjson":
+        chunks = export_puzzles_ndjson(args.folder)
+    else:
+        chunks = export_puzzles_csv(args.folder)
+
+    out = open(args.output, "w", newline="") if args.output else sys.stdout
+    try:
+        for chunk in chunks:
+            out.write(chunk)
+    finally:
+        if args.output:
+            out.close()
+    if args.output:
+        print(f"💾 Exported {args.what} to {args.output} ({os.path.getsize(args.output)} bytes)", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+"""
+Vectorized positional features for batches of positions.
+
+Boards are turned into packed bit-planes (one uint64 per piece type and colour)
+and every positional_engine detector is evaluated for the whole batch with
+NumPy array operations. Results are square masks from the side to move's
+point of view and match the scalar detectors exactly.
+"""
+import numpy as np
+import chess
+import positional_engine
+
+# Plane order: white P N B R Q K, then black P N B R Q K
+PLANES = [(color, piece_type) for color in (chess.WHITE, chess.BLACK) for piece_type in chess.PIECE_TYPES]
+
+_U64 = np.uint64
+_FILES = np.array(chess.BB_FILES, dtype=_U64)
+_ADJACENT_FILES = np.array(positional_engine.BB_ADJACENT_FILES, dtype=_U64)
+_LIGHT = _U64(chess.BB_LIGHT_SQUARES)
+_DARK = _U64(chess.BB_DARK_SQUARES)
+_NOT_FILE_A = _U64(chess.BB_ALL & ~chess.BB_FILE_A)
+_NOT_FILE_H = _U64(chess.BB_ALL & ~chess.BB_FILE_H)
+_OUTPOST_RANKS = {color: _U64(mask) for color, mask in positional_engine.BB_OUTPOST_RANKS.items()}
+_KING_LIGHT = np.array([chess.popcount(chess.BB_KING_ATTACKS[sq] & chess.BB_LIGHT_SQUARES) for sq in chess.SQUARES], dtype=np.int8)
+_KING_ADJACENT = np.array([chess.popcount(chess.BB_KING_ATTACKS[sq]) for sq in chess.SQUARES], dtype=np.int8)
+_POPCOUNT8 = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+_BIT_INDEX = np.arange(64, dtype=_U64)
+
+def popcount(a):
+    """Per-element popcount of a uint64 array."""
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(a).astype(np.int32)
+    a = np.ascontiguousarray(a, dtype=_U64)
+    return _POPCOUNT8[a.view(np.uint8).reshape(a.shape + (8,))].sum(axis=-1, dtype=np.int32)
+
+def boards_to_packed(boards):
+    """
+    Returns (planes, turns): planes is uint64[N, 12] with one bitboard per
+    entry of PLANES, turns is bool[N] (True = white to move).
+    """
+    planes = np.empty((len(boards), 12), dtype=_U64)
+    turns = np.empty(len(boards), dtype=bool)
+    for i, board in enumerate(boards):
+        white, black = board.occupied_co[chess.WHITE], board.occupied_co[chess.BLACK]
+        planes[i] = (
+            board.pawns & white, board.knights & white, board.bishops & white,
+            board.rooks & white, board.queens & white, board.kings & white,
+            board.pawns & black, board.knights & black, board.bishops & black,
+            board.rooks & black, board.queens & black, board.kings & black,
+        )
+        turns[i] = board.turn
+    return planes, turns
+
+def unpack_planes(planes):
+    """Expands uint64[N, 12] packed planes into a bool[N, 12, 64] array."""
+    return ((planes[..., None] >> _BIT_INDEX) & _U64(1)).astype(bool)
+
+def pack_planes(bits):
+    """Inverse of unpack_planes."""
+    return (bits.astype(_U64) << _BIT_INDEX).sum(axis=-1, dtype=_U64)
+
+def _side_planes(planes, turns):
+    """Splits planes into (own[N, 6], enemy[N, 6]) relative to the side to move."""
+    white, black = planes[:, :6], planes[:, 6:]
+    own = np.where(turns[:, None], white, black)
+    enemy = np.where(turns[:, None], black, white)
+    return own, enemy
+
+def _south_fill(bb):
+    bb = bb | (bb >> _U64(8))
+    bb = bb | (bb >> _U64(16))
+    return bb | (bb >> _U64(32))
+
+def _north_fill(bb):
+    bb = bb | (bb << _U64(8))
+    bb = bb | (bb << _U64(16))
+    return bb | (bb << _U64(32))
+
+def _adjacent_files_of(bb):
+    return ((bb << _U64(1)) & _NOT_FILE_A) | ((bb >> _U64(1)) & _NOT_FILE_H)
+
+def extract_features(planes, turns):
+    """
+    Computes every positional detector for a batch of packed uint64[N, 12]
+    or unpacked bool[N, 12, 64] planes. Returns a dict of arrays,
+    all from the side to move's point of view:
+      "isolated_pawns":   uint64[N] isolated own pawns
+      "bad_bishops":      uint64[N] own bishops with >= 4 own pawns on their colour
+      "bad_bishops_high": uint64[N] the subset with >= 6 such pawns
+      "open_file_rooks":  uint64[N] own rooks on files without pawns
+      "semi_open_rooks":  uint64[N] own rooks on files with only enemy pawns
+      "weak_complex":     uint64[N] own king square if its colour complex is weak
+      "weak_complex_high":uint64[N] the subset with >= 5 dominant squares
+      "outposts":         uint64[N] own knights on unchallengeable outposts
+      "outposts_supported": uint64[N] the subset defended by an own pawn
+    """
+    planes = np.asarray(planes)
+    if planes.ndim == 3:
+        planes = pack_planes(planes)
+    planes = planes.astype(_U64, copy=False)
+    turns = np.asarray(turns, dtype=bool)
+    own, enemy = _side_planes(planes, turns)
+    own_pawns, enemy_pawns = own[:, 0], enemy[:, 0]
+    zero = _U64(0)
+
+    # File occupancy: bool[N, 8]
+    own_on_file = (own_pawns[:, None] & _FILES) != zero
+    enemy_on_file = (enemy_pawns[:, None] & _FILES) != zero
+    own_on_adjacent = (own_pawns[:, None] & _ADJACENT_FILES) != zero
+
+    isolated_files = np.where(own_on_file & ~own_on_adjacent, _FILES, zero)
+    isolated_pawns = own_pawns & np.bitwise_or.reduce(isolated_files, axis=1)
+
+    # Bad bishops: pawns on the bishop's colour
+    light_pawns = popcount(own_pawns & _LIGHT)
+    dark_pawns = popcount(own_pawns & _DARK)
+    bishops = own[:, 2]
+    bad_bishops = (np.where(light_pawns >= 4, bishops & _LIGHT, zero) |
+                   np.where(dark_pawns >= 4, bishops & _DARK, zero))
+    bad_bishops_high = (np.where(light_pawns >= 6, bishops & _LIGHT, zero) |
+                        np.where(dark_pawns >= 6, bishops & _DARK, zero))
+
+    # Rooks on open / semi-open files
+    open_files = np.bitwise_or.reduce(np.where(~own_on_file & ~enemy_on_file, _FILES, zero), axis=1)
+    semi_open_files = np.bitwise_or.reduce(np.where(~own_on_file & enemy_on_file, _FILES, zero), axis=1)
+    rooks = own[:, 3]
+    open_file_rooks = rooks & open_files
+    semi_open_rooks = rooks & semi_open_files
+
+    # King colour complex
+    kings = own[:, 5]
+    has_king = kings != zero
+    king_sq = np.where(has_king, np.log2(np.where(has_king, kings, _U64(1)).astype(np.float64)), 0).astype(np.int64)
+    light_count = _KING_LIGHT[king_sq].astype(np.int32)
+    dark_count = _KING_ADJACENT[king_sq].astype(np.int32) - light_count
+    dominant_is_light = light_count >= dark_count
+    dominant_count = np.maximum(light_count, dark_count)
+    matching_bishop = (bishops & np.where(dominant_is_light, _LIGHT, _DARK)) != zero
+    weak = has_king & ~matching_bishop & (dominant_count >= 3)
+    weak_complex = np.where(weak, kings, zero)
+    weak_complex_high = np.where(weak & (dominant_count >= 5), kings, zero)
+
+    # Knight outposts: squares below (White) / above (Black) an enemy pawn on an adjacent file are challenged
+    white_turn = turns
+    challenged = np.where(
+        white_turn,
+        _adjacent_files_of(_south_fill(enemy_pawns) >> _U64(8)),
+        _adjacent_files_of(_north_fill(enemy_pawns) << _U64(8)),
+    )
+    outpost_ranks = np.where(white_turn, _OUTPOST_RANKS[chess.WHITE], _OUTPOST_RANKS[chess.BLACK])
+    outposts = own[:, 1] & outpost_ranks & ~challenged
+    pawn_defended = np.where(
+        white_turn,
+        ((own_pawns << _U64(9)) & _NOT_FILE_A) | ((own_pawns << _U64(7)) & _NOT_FILE_H),
+        ((own_pawns >> _U64(7)) & _NOT_FILE_A) | ((own_pawns >> _U64(9)) & _NOT_FILE_H),
+    )
+
+    return {
+        "isolated_pawns": isolated_pawns,
+        "bad_bishops": bad_bishops,
+        "bad_bishops_high": bad_bishops_high,
+        "open_file_rooks": open_file_rooks,
+        "semi_open_rooks": semi_open_rooks,
+        "weak_complex": weak_complex,
+        "weak_complex_high": weak_complex_high,
+        "outposts": outposts,
+        "outposts_supported": outposts & pawn_defended,
+    }
+
+def extract_board_features(boards):
+    """Convenience wrapper: boards -> extract_features dict."""
+    planes, turns = boards_to_packed(boards)
+    return extract_features(planes, turns)
+
+def scalar_features(board):
+    """
+    The same masks derived from the scalar positional_engine findings,
+    for cross-checking extract_features.
+    """
+    masks = {key: 0 for key in ("isolated_pawns", "bad_bishops", "bad_bishops_high", "open_file_rooks",
+                                "semi_open_rooks", "weak_complex", "weak_complex_high", "outposts",
+                                "outposts_supported")}
+    for f in positional_engine.analyze_board(board):
+        bb = chess.BB_SQUARES[chess.parse_square(f["square"])]
+        if f["type"] == "Isolated Pawn":
+            masks["isolated_pawns"] |= bb
+        elif f["type"] == "Bad Bishop":
+            masks["bad_bishops"] |= bb
+            if f["severity"] == "High":
+                masks["bad_bishops_high"] |= bb
+        elif f["type"] == "Open File":
+            masks["open_file_rooks"] |= bb
+        elif f["type"] == "Semi-Open File":
+            masks["semi_open_rooks"] |= bb
+        elif f["type"] == "Weak Color Complex":
+            masks["weak_complex"] |= bb
+            if f["severity"] == "High":
+                masks["weak_complex_high"] |= bb
+        elif f["type"] == "Knight Outpost":
+            masks["outposts"] |= bb
+            if f["severity"] == "Good":
+                masks["outposts_supported"] |= bb
+    return masks
@@ -0,0 +1,99 @@
+"""
+HTTP caching for the read-heavy JSON endpoints.
+
+`@versioned` views are tagged with the library version (database.get_library_version):
+- a request whose If-None-Match carries the current version gets a 304
+  without the view running; the only database work is reading the version
+  (one primary-key lookup in the meta table, so other processes' writes count);
+- otherwise the rendered (and compressed) body is kept per URL and version,
+  so other clients loading the same unchanged page skip the rebuild too.
+
+`compress()` gzips (or brotli-compresses, if the brotli package is installed)
+JSON responses large enough to be worth it.
+"""
+import gzip
+import threading
+import collections
+from functools import wraps
+from flask import request, make_response, Response
+import database
+import metrics
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Responses smaller than this are sent uncompressed
+MIN_COMPRESS_SIZE = 1024
+GZIP_LEVEL = 5
+BROTLI_QUALITY = 5
+# Rendered bodies kept per (URL, version, encoding)
+BODY_CACHE_SIZE = 32
+
+_bodies = collections.OrderedDict()
+_bodies_lock = threading.Lock()
+
+def _encoding():
+    accepted = request.accept_encodings
+    if brotli is not None and accepted["br"]:
+        return "br"
+    if accepted["gzip"]:
+        return "gzip"
+    return None
+
+def _encode(data, encoding):
+    if encoding == "br":
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=GZIP_LEVEL)
+
+def compress(response):
+    """Compresses a JSON response in place if the client accepts it. Returns the response."""
+    if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+            or response.mimetype != "application/json" or "Content-Encoding" in response.headers):
+        return response
+    response.vary.add("Accept-Encoding")
+    encoding = _encoding()
+    data = response.get_data()
+    if encoding is None or len(data) < MIN_COMPRESS_SIZE:
+        return response
+    response.set_data(_encode(data, encoding))
+    response.headers["Content-Encoding"] = encoding
+    return response
+
+def _tag(version):
+    return f"lib-{version}"
+
+def versioned(view):
+    """Adds a library-version ETag, 304 revalidation and a body cache to a JSON view."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        version = database.get_library_version()
+        tag = _tag(version)
+        if request.if_none_match.contains_weak(tag):
+            metrics.inc("chess_mimic_http_cache_total", result="not_modified")
+            response = Response(status=304)
+        else:
+            key = (request.full_path, version, _encoding())
+            with _bodies_lock:
+                cached = _bodies.get(key)
+                if cached is not None:
+                    _bodies.move_to_end(key)
+            metrics.inc("chess_mimic_http_cache_total", result="hit" if cached is not None else "miss")
+            if cached is not None:
+                data, headers = cached
+                response = Response(data, mimetype="application/json", headers=headers)
+            else:
+                response = compress(make_response(view(*args, **kwargs)))
+                if response.status_code != 200:
+                    return response
+                headers = {name: response.headers[name] for name in ("Content-Encoding", "Vary") if name in response.headers}
+                with _bodies_lock:
+                    _bodies[key] = (response.get_data(), headers)
+                    while len(_bodies) > BODY_CACHE_SIZE:
+                        _bodies.popitem(last=False)
+        response.set_etag(tag, weak=True)
+        # Always revalidate; a 304 costs one meta-table read
+        response.headers["Cache-Control"] = "no-cache"
+        return response
+    return wrapper
@@ -1,7 +1,10 @@
 import os
 import json
 import collections
+import chess
 import chess.pgn
+import model_store
+import polyglot_book
 
 def get_fen_key(board):
     """
@@ -11,78 +14,111 @@ def get_fen_key(board):
     fen_parts = board.fen().split(' ')
     return " ".join(fen_parts[:4])
 
-def ingest_pgn(file_path, target_player):
+def new_move_db():
+    # move_db[fen][move] = {"count": 0, "win": 0, "loss": 0, "draw": 0}
+    return collections.defaultdict(lambda: collections.defaultdict(lambda: {"count": 0, "win": 0, "loss": 0, "draw": 0}))
+
+def player_sides(game, target_player):
+    """Returns (is_white, is_black) for the target player (case-insensitive substring match)."""
+    headers = game.headers
+    white = headers.get("White", "?")
+    black = headers.get("Black", "?")
+    return target_player.lower() in white.lower(), target_player.lower() in black.lower()
+
+def record_game(move_db, game, target_player):
+    """
+    Adds the target player's moves from one game to move_db.
+    Returns False if the player did not play in the game.
+    """
+    is_white, is_black = player_sides(game, target_player)
+    if not (is_white or is_black):
+        return False
+
+    result = game.headers.get("Result", "*") # "1-0", "0-1", "1/2-1/2"
+
+    # Map the game result to the target player's perspective
+    game_stat = "draw"
+    if result == "1-0":
+        game_stat = "win" if is_white else "loss"
+    elif result == "0-1":
+        game_stat = "win" if is_black else "loss"
+    elif result == "1/2-1/2":
+        game_stat = "draw"
+
+    board = game.board()
+    for move in game.mainline_moves():
+        # Record move if it was the target player's turn
+        if (board.turn == chess.WHITE and is_white) or \
+           (board.turn == chess.BLACK and is_black):
+
+            fen_key = get_fen_key(board)
+            move_uci = move.uci()
+
+            stats = move_db[fen_key][move_uci]
+            stats["count"] += 1
+            stats[game_stat] += 1
+
+        board.push(move)
+    return True
+
+def ingest_pgn(file_path, target_player, output_file=None, book_file=None):
     """
     Reads a PGN and tracks stats (win/loss/draw) for the target player's moves.
+    The model is written to the player's file in the model store unless
+    `output_file` is given. A Polyglot book of the same statistics is written
+    to `book_file`, or next to the model when it goes to the model store.
     """
-    # move_db[fen][move] = {"count": 0, "win": 0, "loss": 0, "draw": 0}
-    move_db = collections.defaultdict(lambda: collections.defaultdict(lambda: {"count": 0, "win": 0, "loss": 0, "draw": 0}))
-    
+    move_db = new_move_db()
+
     if not os.path.exists(file_path):
         print(f"❌ Error: {file_path} not found.")
         return
 
     print(f"📂 Processing {file_path} for player '{target_player}'...")
-    
+
     count = 0
     with open(file_path) as pgn:
         while True:
             game = chess.pgn.read_game(pgn)
             if game is None:
                 break
-            
-            headers = game.headers
-            white = headers.get("White", "?")
-            black = headers.get("Black", "?")
-            result = headers.get("Result", "*") # "1-0", "0-1", "1/2-1/2"
-
-            is_white = target_player.lower() in white.lower()
-            is_black = target_player.lower() in black.lower()
-            
-            if not (is_white or is_black):
+
+            if not record_game(move_db, game, target_player):
                 continue
 
-            # Map the game result to the target player's perspective
-            game_stat = "draw"
-            if result == "1-0":
-                game_stat = "win" if is_white else "loss"
-            elif result == "0-1":
-                game_stat = "win" if is_black else "loss"
-            elif result == "1/2-1/2":
-                game_stat = "draw"
-
-            board = game.board()
-            for move in game.mainline_moves():
-                # Record move if it was the target player's turn
-                if (board.turn == chess.WHITE and is_white) or \
-                   (board.turn == chess.BLACK and is_black):
-                    
-                    fen_key = get_fen_key(board)
-                    move_uci = move.uci()
-                    
-                    stats = move_db[fen_key][move_uci]
-                    stats["count"] += 1
-                    stats[game_stat] += 1
-                
-                board.push(move)
-            
             count += 1
             if count % 100 == 0:
                 print(f"  - Processed {count} games...")
 
     print(f"✅ Ingestion complete. Analyzed {count} games.")
-    
-    # Save to a structured JSON for the "Opening Tree" view
-    output_file = "stats_model.json"
-    with open(output_file, "w") as f:
+
+    # Save to a structured JSON for the "Opening Tree" view.
+    # Written to a temp file and renamed so the model store never reads a partial file.
+    output_file = output_file or model_store.model_path(target_player)
+    os.makedirs(os.path.dirname(os.path.abspath(output_file)), exist_ok=True)
+    tmp_file = output_file + ".tmp"
+    with open(tmp_file, "w") as f:
         json.dump(move_db, f, indent=2)
+    os.replace(tmp_file, output_file)
     print(f"💾 Tree stats saved to {output_file}")
 
+    if book_file is None and output_file == model_store.model_path(target_player):
+        book_file = model_store.book_path(target_player)
+    if book_file:
+        entries = polyglot_book.write_book(book_file, move_db)
+        print(f"📖 Polyglot book saved to {book_file} ({entries} entries)")
+
 if __name__ == "__main__":
     import sys
-    # Usage: python ingest.py [pgn_file] [player_name]
-    if len(sys.argv) > 2:
-        ingest_pgn(sys.argv[1], sys.argv[2])
+    # Usage: python ingest.py [pgn_file] [player_name] [output_file] [--book book.bin]
+    args = sys.argv[1:]
+    book = None
+    if "--book" in args:
+        i = args.index("--book")
+        book = args[i + 1]
+        del args[i:i + 2]
+    if len(args) > 1:
+        ingest_pgn(args[0], args[1], args[2] if len(args) > 2 else None, book)
     else:
         # Default for local testing
-        ingest_pgn("my_games.pgn", "Chipin")
+        ingest_pgn("my_games.pgn", "Chipin", book_file=book)
@@ -0,0 +1,220 @@
+"""
+Timing instrumentation and the Prometheus /metrics endpoint.
+
+- Every request is timed per route (chess_mimic_request_seconds).
+- Code inside a request is split into stages with `timer("stage")` or the
+  `@timed("stage")` decorator (SQLite helpers, PGN parsing, engine spawn and
+  search, ...); each stage feeds chess_mimic_stage_seconds.
+- Engine searches also count nodes and search time, so nodes/sec can be
+  derived per priority.
+- Modules with their own counters (engine pool, analysis cache, model store,
+  pawn hash) are exported through collectors at scrape time.
+
+With CHESS_MIMIC_TRACE set ("1" for requests.jsonl next to the app, or a
+file path), one JSON line per request is appended with its route, status,
+total time and per-stage breakdown. Off by default.
+"""
+import os
+import json
+import time
+import threading
+import contextlib
+from functools import wraps
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+# Upper bounds (seconds) of the latency histogram buckets
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_trace_setting = os.environ.get("CHESS_MIMIC_TRACE", "")
+TRACE_FILE = os.path.join(BASE_DIR, "requests.jsonl") if _trace_setting in ("1", "true") else (_trace_setting or None)
+
+_lock = threading.Lock()
+_histograms = {}  # (name, labels) -> [bucket counts..., sum, count]
+_counters = {}    # (name, labels) -> value
+_help = {}
+_collectors = []
+_local = threading.local()
+_trace_lock = threading.Lock()
+
+def _labels(labels):
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+def observe(name, seconds, **labels):
+    key = (name, _labels(labels))
+    with _lock:
+        h = _histograms.get(key)
+        if h is None:
+            h = _histograms[key] = [0] * (len(BUCKETS) + 2)
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                h[i] += 1
+                break
+        h[-2] += seconds
+        h[-1] += 1
+
+def inc(name, value=1, **labels):
+    key = (name, _labels(labels))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+def describe(name, text):
+    _help[name] = text
+
+def register_collector(fn):
+    """fn() -> iterable of (name, labels dict, value); exported as gauges on every scrape."""
+    _collectors.append(fn)
+
+def _record_stage(stage, seconds):
+    observe("chess_mimic_stage_seconds", seconds, stage=stage)
+    stages = getattr(_local, "stages", None)
+    if stages is not None:
+        entry = stages.setdefault(stage, [0.0, 0])
+        entry[0] += seconds
+        entry[1] += 1
+
+@contextlib.contextmanager
+def timer(stage):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _record_stage(stage, time.perf_counter() - start)
+
+def timed(stage):
+    """Decorator form of timer()."""
+    def decorate(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                _record_stage(stage, time.perf_counter() - start)
+        return wrapper
+    return decorate
+
+def engine_search(priority, seconds, info):
+    """Records one engine search and the nodes it reported."""
+    _record_stage("engine.search", seconds)
+    inc("chess_mimic_engine_searches_total", priority=priority)
+    inc("chess_mimic_engine_search_seconds_total", seconds, priority=priority)
+    nodes = (info or {}).get("nodes")
+    if nodes:
+        inc("chess_mimic_engine_nodes_total", nodes, priority=priority)
+
+# --- Flask integration ---
+
+def init_app(app):
+    from flask import request, g
+
+    @app.before_request
+    def _start():
+        g.metrics_start = time.perf_counter()
+        _local.stages = {}
+
+    @app.after_request
+    def _finish(response):
+        start = g.pop("metrics_start", None)
+        if start is None:
+            return response
+        elapsed = time.perf_counter() - start
+        route = request.url_rule.rule if request.url_rule is not None else "unmatched"
+        # Streamed responses (SSE scans) are timed up to their first byte only
+        observe("chess_mimic_request_seconds", elapsed, route=route, method=request.method,
+                status=response.status_code)
+        stages = getattr(_local, "stages", None)
+        _local.stages = None
+        if TRACE_FILE:
+            _write_trace({
+                "ts": round(time.time(), 3),
+                "method": request.method,
+                "path": request.full_path.rstrip("?"),
+                "route": route,
+                "status": response.status_code,
+                "ms": round(elapsed * 1000, 3),
+                "stages": {name: {"ms": round(s * 1000, 3), "n": n} for name, (s, n) in (stages or {}).items()},
+            })
+        return response
+
+def _write_trace(record):
+    line = json.dumps(record, separators=(",", ":")) + "\n"
+    with _trace_lock:
+        with open(TRACE_FILE, "a") as f:
+            f.write(line)
+
+# --- Prometheus text format ---
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+def _number(value):
+    if isinstance(value, float):
+        return repr(round(value, 6))
+    return str(value)
+
+def render():
+    lines = []
+    with _lock:
+        histograms = {k: list(v) for k, v in _histograms.items()}
+        counters = dict(_counters)
+
+    for name in sorted({k[0] for k in histograms}):
+        if name in _help:
+            lines.append(f"# HELP {name} {_help[name]}")
+        lines.append(f"# TYPE {name} histogram")
+        for (n, labels), h in sorted(histograms.items()):
+            if n != name:
+                continue
+            cumulative = 0
+            for bound, count in zip(BUCKETS, h):
+                cumulative += count
+                lines.append(f"{name}_bucket{_format_labels(labels, [('le', repr(bound))])} {cumulative}")
+            lines.append(f"{name}_bucket{_format_labels(labels, [('le', '+Inf')])} {h[-1]}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {_number(h[-2])}")
+            lines.append(f"{name}_count{_format_labels(labels)} {h[-1]}")
+
+    for name in sorted({k[0] for k in counters}):
+        if name in _help:
+            lines.append(f"# HELP {name} {_help[name]}")
+        lines.append(f"# TYPE {name} counter")
+        for (n, labels), value in sorted(counters.items()):
+            if n == name:
+                lines.append(f"{name}{_format_labels(labels)} {_number(value)}")
+
+    gauges = {}
+    for collector in _collectors:
+        try:
+            for name, labels, value in collector():
+                gauges.setdefault(name, []).append((_labels(labels), value))
+        except Exception as e:
+            # A broken collector must not take the whole scrape down
+            lines.append(f"# collector error: {_escape(str(e))}")
+    for name in sorted(gauges):
+        if name in _help:
+            lines.append(f"# HELP {name} {_help[name]}")
+        lines.append(f"# TYPE {name} gauge")
+        for labels, value in gauges[name]:
+            lines.append(f"{name}{_format_labels(labels)} {_number(value)}")
+    return "\n".join(lines) + "\n"
+
+def flatten(prefix, stats, **labels):
+    """Turns a nested stats dict of numbers into collector samples: {"a": {"b": 1}} -> prefix_a_b."""
+    for key, value in stats.items():
+        name = f"{prefix}_{key}"
+        if isinstance(value, dict):
+            yield from flatten(name, value, **labels)
+        elif isinstance(value, bool):
+            yield name, labels, int(value)
+        elif isinstance(value, (int, float)):
+            yield name, labels, value
+
+describe("chess_mimic_request_seconds", "HTTP request latency by route (time to first byte for streams).")
+describe("chess_mimic_stage_seconds", "Time spent in instrumented stages (db.*, pgn.*, engine.*, ...).")
+describe("chess_mimic_engine_nodes_total", "Nodes reported by engine searches.")
+describe("chess_mimic_engine_search_seconds_total", "Wall time of engine searches.")
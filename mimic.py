@@ -2,10 +2,12 @@ import json
 import chess
 import chess.engine
 import os
+import model_store
+import position_neighbors
 
 # Paths relative to this script
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-MODEL_FILE = os.path.join(BASE_DIR, "model.json")
+MODEL_FILE = model_store.DEFAULT_MODEL_FILE
 STOCKFISH_PATH = os.path.join(BASE_DIR, "engines", "stockfish")
 
 def load_model():
@@ -14,7 +16,7 @@ def load_model():
     with open(MODEL_FILE, "r") as f:
         return json.load(f)
 
-def get_analysis(fen, model=None):
+def get_analysis(fen, model=None, player=None):
     """
     Returns a dict with analysis data:
     {
@@ -23,10 +25,8 @@ def get_analysis(fen, model=None):
         "stockfish": { "best_move": str, "score": float },
         "mimic": [ { "move": str, "count": int, "score": float, "is_best": bool } ]
     }
+    Moves come from `model` if given, otherwise from the player's model in the model store.
     """
-    if model is None:
-        model = load_model()
-
     board = chess.Board(fen)
     result = {
         "fen": fen,
@@ -36,9 +36,15 @@ def get_analysis(fen, model=None):
     }
 
     # 1. Lookup Mimic Moves
-    fen_parts = fen.split(' ')
-    lookup_fen = " ".join(fen_parts[:4])
-    player_moves = model.get(lookup_fen, {})
+    if model is not None:
+        fen_parts = fen.split(' ')
+        lookup_fen = " ".join(fen_parts[:4])
+        player_moves = [(uci, model_store.move_stats(stats)["count"]) for uci, stats in model.get(lookup_fen, {}).items()]
+    else:
+        player_moves = [(m["move"], m["count"]) for m in model_store.get_store().predict(board, player)]
+        if not player_moves and player:
+            # Position never seen: fall back to the player's moves in similar positions
+            player_moves = [(m["move"], m["count"]) for m in position_neighbors.predict(board, player)]
 
     try:
         with chess.engine.SimpleEngine.popen_uci(STOCKFISH_PATH) as engine:
@@ -59,7 +65,7 @@ def get_analysis(fen, model=None):
                 return result
 
             # Analyze Mimic moves
-            sorted_moves = sorted(player_moves.items(), key=lambda x: x[1], reverse=True)
+            sorted_moves = sorted(player_moves, key=lambda x: x[1], reverse=True)
             for move_uci, count in sorted_moves[:5]: # Top 5
                 try:
                     move = chess.Move.from_uci(move_uci)
@@ -123,7 +129,7 @@ def main():
     # Let's try to find a position from the model that isn't start
     # Pick a random one with > 2 moves
     for fen, moves in model.items():
-        if len(moves) > 1 and sum(moves.values()) > 2:
+        if len(moves) > 1 and sum(model_store.move_stats(m)["count"] for m in moves.values()) > 2:
             # Reconstruct full FEN (just guess clocks for analysis)
             # Actually chess.Board(fen) works if it's just piece placement + active color + castling + ep
             # But our key is ONLY piece placement. We need to handle that.
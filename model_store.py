@@ -0,0 +1,248 @@
+import os
+import re
+import json
+import time
+import threading
+import collections
+import chess
+import chess.polyglot
+import position_index
+import polyglot_book
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+MODELS_DIR = os.path.join(BASE_DIR, "models")
+# Single-model file used when no player is given (see mimic.MODEL_FILE)
+DEFAULT_MODEL_FILE = os.path.join(BASE_DIR, "model.json")
+
+# Rough in-memory cost of a loaded model, used for the memory budget
+BYTES_PER_POSITION = 200
+BYTES_PER_MOVE = 150
+DEFAULT_MEMORY_BUDGET = 256 * 1024 * 1024
+# How often (seconds) a model file's mtime is checked for changes
+CHECK_INTERVAL = 1.0
+
+def model_filename(player):
+    """Filesystem-safe model name for a player, e.g. 'Oliver Hsiao' -> 'oliver_hsiao'."""
+    return re.sub(r"[^a-z0-9]+", "_", player.strip().lower()).strip("_") or "unknown"
+
+def model_path(player):
+    if not player:
+        return DEFAULT_MODEL_FILE
+    return os.path.join(MODELS_DIR, model_filename(player) + ".json")
+
+def book_path(player):
+    """Polyglot book compiled from the player's model (see polyglot_book)."""
+    return os.path.splitext(model_path(player))[0] + ".bin"
+
+def source_path(player):
+    """
+    File a player's model is served from: the book if it is at least as new as
+    the JSON model, otherwise the JSON model. None if neither exists.
+    """
+    return _source_for(model_path(player))
+
+def _source_for(json_path):
+    bin_path = os.path.splitext(json_path)[0] + ".bin"
+    try:
+        book_mtime = os.path.getmtime(bin_path)
+    except OSError:
+        return json_path if os.path.exists(json_path) else None
+    try:
+        return bin_path if book_mtime >= os.path.getmtime(json_path) else json_path
+    except OSError:
+        return bin_path
+
+def load_model(path):
+    if path.endswith(".bin"):
+        return polyglot_book.BookModel.load(path)
+    return PlayerModel.load(path)
+
+def load_raw(player=None):
+    """The player's JSON model as written by ingest.py."""
+    with open(model_path(player)) as f:
+        return json.load(f)
+
+def compile_book(player=None):
+    """Writes the player's JSON model as a (count-weighted) Polyglot book next to it. Returns the entry count."""
+    return polyglot_book.write_book(book_path(player), load_raw(player))
+
+def move_stats(stats):
+    """Normalizes a model entry (ingest dict or bare count) to {count, win, loss, draw}."""
+    if isinstance(stats, dict):
+        return {"count": stats.get("count", 0), "win": stats.get("win", 0),
+                "loss": stats.get("loss", 0), "draw": stats.get("draw", 0)}
+    return {"count": stats, "win": 0, "loss": 0, "draw": 0}
+
+class PlayerModel:
+    """
+    A player's move statistics indexed by Zobrist hash:
+    positions[hash] = [(uci, {count, win, loss, draw}), ...] most played first.
+    """
+    format = "json"
+
+    def __init__(self, path, mtime, positions):
+        self.path = path
+        self.mtime = mtime
+        self.positions = positions
+        self.loaded_at = time.time()
+        self.checked_at = self.loaded_at
+        self.size = sum(BYTES_PER_POSITION + BYTES_PER_MOVE * len(m) for m in positions.values())
+
+    @classmethod
+    def load(cls, path):
+        mtime = os.path.getmtime(path)
+        with open(path) as f:
+            raw = json.load(f)
+        return cls.from_dict(raw, path, mtime)
+
+    @classmethod
+    def from_dict(cls, raw, path=None, mtime=None):
+        """Builds a model from the JSON layout written by ingest.py ({fen: {uci: stats}})."""
+        positions = {}
+        for fen, moves in raw.items():
+            entries = [(uci, move_stats(stats)) for uci, stats in moves.items()]
+            entries.sort(key=lambda e: e[1]["count"], reverse=True)
+            positions[position_index.fen_zobrist(fen)] = entries
+        return cls(path, mtime, positions)
+
+    def lookup(self, board):
+        return self.positions.get(chess.polyglot.zobrist_hash(board), [])
+
+    def close(self):
+        pass
+
+class ModelStore:
+    """
+    Keeps player models in memory. Each model is loaded once, reloaded in a
+    background thread when its file changes (the old version keeps serving
+    until the new one is ready), and evicted least-recently-used first when
+    the total estimated size exceeds the memory budget. A player with an
+    up-to-date Polyglot book is served from the book (memory-mapped) instead
+    of the JSON model. Models are keyed by the player's JSON model path.
+    """
+    def __init__(self, memory_budget=DEFAULT_MEMORY_BUDGET, check_interval=CHECK_INTERVAL):
+        self.memory_budget = memory_budget
+        self.check_interval = check_interval
+        self._models = collections.OrderedDict()
+        self._reloading = set()
+        self._lock = threading.Lock()
+        self.counters = collections.Counter()
+
+    def get(self, player=None):
+        """Returns the PlayerModel or BookModel for a player, or None if there is no model file."""
+        key = model_path(player)
+        with self._lock:
+            model = self._models.get(key)
+            if model is not None:
+                self._models.move_to_end(key)
+                self.counters["hits"] += 1
+        if model is not None:
+            self._check_fresh(key, model)
+            return model
+
+        path = source_path(player)
+        if path is None:
+            return None
+        self.counters["loads"] += 1
+        model = load_model(path)
+        self._install(key, model)
+        return model
+
+    def is_loaded(self, player=None):
+        """True if get(player) would not read a model file: it is in memory, or there is none."""
+        with self._lock:
+            if model_path(player) in self._models:
+                return True
+        return source_path(player) is None
+
+    def _check_fresh(self, key, model):
+        now = time.time()
+        if now - model.checked_at < self.check_interval:
+            return
+        model.checked_at = now
+        # The book and the JSON model can each become the newer file, so pick again
+        path = _source_for(key)
+        if path is None:
+            return
+        try:
+            mtime = os.path.getmtime(path)
+        except OSError:
+            return
+        if path == model.path and mtime == model.mtime:
+            return
+        with self._lock:
+            if key in self._reloading:
+                return
+            self._reloading.add(key)
+        threading.Thread(target=self._reload, args=(key, path), daemon=True).start()
+
+    def _reload(self, key, path):
+        try:
+            model = load_model(path)
+            self.counters["reloads"] += 1
+            self._install(key, model)
+        except (OSError, ValueError) as e:
+            # Keep serving the old version; a half-written file will be retried on the next check
+            print(f"Model reload failed for {path}: {e}")
+        finally:
+            with self._lock:
+                self._reloading.discard(key)
+
+    def _install(self, key, model):
+        retired = []
+        with self._lock:
+            old = self._models.get(key)
+            if old is not None and old is not model:
+                retired.append(old)
+            self._models[key] = model
+            self._models.move_to_end(key)
+            while len(self._models) > 1 and self.memory_used() > self.memory_budget:
+                retired.append(self._models.popitem(last=False)[1])
+                self.counters["evictions"] += 1
+        # Books hold a file mapping and descriptor until closed
+        for old in retired:
+            old.close()
+
+    def memory_used(self):
+        return sum(m.size for m in self._models.values())
+
+    def predict(self, board, player=None, limit=5):
+        """
+        Returns the player's moves in this position, most played first:
+        [ { "move": uci, "count": int, "probability": float, "win": int, "loss": int, "draw": int } ]
+        """
+        model = self.get(player)
+        if model is None:
+            return []
+        entries = model.lookup(board)
+        total = sum(stats["count"] for _, stats in entries) or 1
+        return [dict(stats, move=uci, probability=round(stats["count"] / total, 4))
+                for uci, stats in entries[:limit]]
+
+    def _describe(self, model):
+        info = {"path": os.path.relpath(model.path, BASE_DIR), "format": model.format,
+                "size": model.size, "mtime": model.mtime}
+        if model.format == "json":
+            info["positions"] = len(model.positions)
+        else:
+            info["entries"] = model.entries
+        return info
+
+    def stats(self):
+        with self._lock:
+            return {
+                "models": [self._describe(m) for m in self._models.values()],
+                "memory_used": self.memory_used(),
+                "memory_budget": self.memory_budget,
+                "counters": dict(self.counters),
+            }
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_store():
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = ModelStore()
+        return _store
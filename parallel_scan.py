@@ -0,0 +1,159 @@
+"""
+Single-game scans spread over several engines.
+
+A scan needs the engine's eval and best move for the position before every
+ply, and each of those searches stands on its own. The plies are cut into
+short ranges; up to `workers` engines (one search thread each, at background
+priority) take the next unanalysed range in turn, so the start of the game
+finishes first and a slow range never holds the others back. A range is
+searched like the serial scan does it, pushing its moves on one board, so
+the engine keeps the game history (repetitions) and its hash within a range.
+
+analyse_game() hands results back strictly in ply order whatever order the
+ranges finish in. Callers compare each eval with the previous one exactly as
+before, so a swing across the boundary between two ranges is a puzzle like
+any other. With one worker it is the serial scan: one engine, plies in
+order, run in the caller's thread.
+"""
+import math
+import threading
+import chess
+import chess.engine
+import engine_pool
+
+SEARCH_SECONDS = 0.1
+# Mates are stored as +-MATE_SCORE centipawns
+MATE_SCORE = 10000
+
+def max_workers(pool):
+    """Engines one scan may use: one per core, within the pool's background share."""
+    return max(1, min(pool.cores, pool.size - 1))
+
+def score_cp(info):
+    score = info["score"].white()
+    if score.score() is not None:
+        return score.score()
+    return MATE_SCORE if score.mate() > 0 else -MATE_SCORE
+
+def _analyse_serial(pool, board, moves, limit):
+    board = board.copy(stack=False)
+    with pool.engine(priority=engine_pool.BACKGROUND) as engine:
+        for ply, move in enumerate(moves):
+            # Interactive analysis goes first; the scan pauses between positions
+            pool.wait_turn(engine)
+            info = engine_pool.analyse(engine, board, limit, engine_pool.BACKGROUND)
+            yield ply, score_cp(info), info["pv"][0].uci()
+            board.push(move)
+
+class _Scan:
+    def __init__(self, pool, board, moves, range_plies, workers, limit):
+        self.pool = pool
+        self.board = board
+        self.moves = moves
+        self.range_plies = range_plies
+        self.workers = workers
+        self.limit = limit
+        self.results = [None] * len(moves)
+        self.next_ply = 0
+        self.running = 0
+        self.error = None
+        self.cancelled = False
+        self.cond = threading.Condition()
+
+    def start(self):
+        # Workers share the cores, one search thread each
+        self.running = self.workers
+        for n in range(self.workers):
+            threading.Thread(target=self._worker, args=(n == 0,), daemon=True).start()
+
+    def _take_range(self):
+        with self.cond:
+            if self.cancelled or self.error is not None or self.next_ply >= len(self.moves):
+                return None
+            start = self.next_ply
+            self.next_ply = min(start + self.range_plies, len(self.moves))
+            return start, self.next_ply
+
+    def _analyse_ranges(self, engine):
+        while True:
+            taken = self._take_range()
+            if taken is None:
+                return
+            start, end = taken
+            board = self.board.copy(stack=False)
+            for move in self.moves[:start]:
+                board.push(move)
+            for ply in range(start, end):
+                if self.cancelled:
+                    return
+                # Interactive analysis goes first; the scan pauses between positions
+                self.pool.wait_turn(engine)
+                info = engine_pool.analyse(engine, board, self.limit, engine_pool.BACKGROUND)
+                with self.cond:
+                    self.results[ply] = (score_cp(info), info["pv"][0].uci())
+                    self.cond.notify_all()
+                board.push(self.moves[ply])
+
+    def _worker(self, first):
+        engine, broken = None, False
+        try:
+            # The first engine is waited for like a serial scan's; extra ones only if free now
+            if first:
+                engine = self.pool.acquire(priority=engine_pool.BACKGROUND, threads=1)
+            else:
+                engine = self.pool.try_acquire(engine_pool.BACKGROUND, threads=1)
+            if engine is not None:
+                self._analyse_ranges(engine)
+        except Exception as e:
+            broken = isinstance(e, (chess.engine.EngineError, chess.engine.EngineTerminatedError))
+            with self.cond:
+                if self.error is None:
+                    self.error = e
+        finally:
+            if engine is not None:
+                self.pool.release(engine, broken)
+            with self.cond:
+                self.running -= 1
+                self.cond.notify_all()
+
+    def ordered(self):
+        for ply in range(len(self.moves)):
+            with self.cond:
+                self.cond.wait_for(lambda: self.results[ply] is not None or self.error is not None
+                                   or self.running == 0)
+                if self.results[ply] is None:
+                    raise self.error or engine_pool.EngineUnavailable("Scan workers stopped")
+                score, best_move = self.results[ply]
+            yield ply, score, best_move
+
+    def cancel(self):
+        with self.cond:
+            self.cancelled = True
+            self.cond.notify_all()
+
+def analyse_game(board, moves, chunk_size=10, workers=1, seconds=SEARCH_SECONDS):
+    """
+    Yields (ply, eval, best move UCI) for every move of `moves` played from
+    `board`, in ply order. eval is the position before the ply, in centipawns
+    from White's view. workers: engines to use at most; 0 means as many as the
+    pool allows. Ranges are at most chunk_size plies, and short enough that
+    every worker gets two. Closing the generator stops the workers after
+    their current search.
+    """
+    if not moves:
+        return
+    pool = engine_pool.get_pool()
+    workers = max_workers(pool) if not workers or workers < 1 else min(workers, max_workers(pool))
+    range_plies = max(1, min(chunk_size, math.ceil(len(moves) / (2 * workers))))
+    workers = min(workers, math.ceil(len(moves) / range_plies))
+    limit = chess.engine.Limit(time=seconds)
+    if workers == 1:
+        # In the request's own thread, where per-request profiling can see the searches
+        yield from _analyse_serial(pool, board, moves, limit)
+        return
+    scan = _Scan(pool, board, list(moves), range_plies, workers, limit)
+    scan.start()
+    try:
+        yield from scan.ordered()
+    finally:
+        scan.cancel()
@@ -0,0 +1,213 @@
+"""
+Per-player accuracy and mistake statistics from stored evals.
+
+A scanned game keeps the engine's evaluation before every ply (games.evals,
+centipawns from White's view) and its puzzles, so these numbers need no
+engine. For each move, from the mover's point of view:
+
+- cp loss: how far the eval dropped, with evals capped at +-1000 so a move in
+  an already lost position cannot lose more (Lichess's ACPL rule);
+- accuracy: Lichess's move accuracy, 103.1668 * exp(-0.04354 * drop) - 3.1669,
+  where drop is the fall in win percentage;
+- inaccuracy / mistake / blunder: a win percentage drop of 5 / 10 / 15 points
+  or more (Lichess's 0.1 / 0.2 / 0.3 winning chances);
+- puzzles: the game's puzzles whose move the player made.
+
+Moves are split by phase: opening for the first 10 moves, endgame once at
+most 6 queens, rooks and minor pieces are left, middlegame in between. The
+last move has no eval after it and is not counted.
+
+Totals are kept per game, side and phase in the game_stats table, and per
+player, side, phase and month in player_summary. A scan that saves evals, or
+a re-threshold that replaces puzzles, rewrites its games' rows and adjusts
+the summary (update_games), so a player's report() reads a few dozen rows
+however many games they have. Folder reports sum the folder's game rows.
+
+Games scanned before stats were kept are scored by a backfill that report()
+starts in a background thread; until it is done, reports cover the games
+scored so far (each batch it writes bumps the library version, so cached
+/stats responses are refreshed as it goes).
+"""
+import re
+import json
+import threading
+from collections import Counter
+import numpy as np
+import database
+import puzzle_finder
+import replay
+
+PHASES = ("opening", "middlegame", "endgame")
+TRENDS = ("month", "year")
+CP_CAP = 1000
+INACCURACY, MISTAKE, BLUNDER = 5, 10, 15
+OPENING_PLIES = 20
+ENDGAME_PIECES = 6
+COLUMNS = "id, white, black, date, evals, replay, CASE WHEN replay IS NULL THEN pgn END AS pgn"
+
+# (database path, library version) at the last check for unscored games
+_checked = None
+_backfill_lock = threading.Lock()
+# Guards _backfill_thread; _backfill_lock is held for a whole backfill
+_thread_lock = threading.Lock()
+_backfill_thread = None
+
+def normalize_date(date):
+    """'2024.11.02', '2023-11-20' or '11/29/2024, 1:50:06 PM' -> '2024-11-02'; None if unknown."""
+    if not date:
+        return None
+    match = re.match(r"(\d{4})[.\-/](\d{1,2})[.\-/](\d{1,2})", date)
+    if match:
+        year, month, day = match.groups()
+    else:
+        match = re.match(r"(\d{1,2})/(\d{1,2})/(\d{4})", date)
+        if not match:
+            return None
+        month, day, year = match.groups()
+    return f"{year}-{int(month):02d}-{int(day):02d}"
+
+def _player(name):
+    return name if name and name.strip("?") else None
+
+def phase(ply, fen):
+    if ply < OPENING_PLIES:
+        return "opening"
+    placement = fen.split(" ", 1)[0]
+    pieces = sum(placement.count(piece) for piece in "QRBNqrbn")
+    return "endgame" if pieces <= ENDGAME_PIECES else "middlegame"
+
+def game_rows(row, evals, fens, puzzles=()):
+    """
+    game_stats rows (database.GAME_STATS_COLUMNS order) for one game.
+    fens[i] is the position before ply i; puzzles: [(move_index, turn)].
+    """
+    plies = len(evals) - 1
+    if plies < 1:
+        return []
+    values = np.asarray(evals, dtype=np.float64)
+    sides = np.array(["white" if fens[ply].split(" ", 2)[1] == "w" else "black" for ply in range(plies)])
+    phases = np.array([phase(ply, fens[ply]) for ply in range(plies)])
+    sign = np.where(sides == "white", 1.0, -1.0)
+
+    capped = np.clip(values, -CP_CAP, CP_CAP)
+    cp_loss = np.maximum(0.0, sign * (capped[:-1] - capped[1:]))
+    win = puzzle_finder.win_probability(values)
+    drop = np.maximum(0.0, sign * (win[:-1] - win[1:]))
+    accuracy = np.clip(103.1668 * np.exp(-0.04354 * drop) - 3.1669, 0.0, 100.0)
+    inaccuracy = (drop >= INACCURACY) & (drop < MISTAKE)
+    mistake = (drop >= MISTAKE) & (drop < BLUNDER)
+    blunder = drop >= BLUNDER
+    puzzle_counts = Counter((turn, phase(move, fens[move])) for move, turn in puzzles if 0 <= move < plies)
+
+    date = normalize_date(row.get('date'))
+    rows = []
+    for side in ("white", "black"):
+        for name in PHASES:
+            mask = (sides == side) & (phases == name)
+            if not mask.any():
+                continue
+            rows.append((row['id'], side, name, _player(row.get(side)), date, int(mask.sum()),
+                         int(round(cp_loss[mask].sum())), float(accuracy[mask].sum()),
+                         int(inaccuracy[mask].sum()), int(mistake[mask].sum()), int(blunder[mask].sum()),
+                         puzzle_counts[(side, name)]))
+    return rows
+
+def update_games(game_ids):
+    """
+    Recomputes the stats rows of the given games from their stored evals and
+    puzzles. Games without usable evals end up with no rows. Returns how many
+    games have stats.
+    """
+    ids = sorted(set(game_ids))
+    scored = 0
+    for start in range(0, len(ids), database.EXPORT_BATCH_SIZE):
+        chunk = ids[start:start + database.EXPORT_BATCH_SIZE]
+        puzzles = database.get_puzzle_moves(chunk)
+        rows, rebuilt = [], {}
+        for row in database.iter_games(game_ids=chunk, columns=COLUMNS):
+            evals = json.loads(row['evals']) if row['evals'] else []
+            game_replay = puzzle_finder.load_replay(row, rebuilt) if evals else None
+            # Evals from before the PGN was edited no longer line up with its moves
+            if game_replay is None or len(game_replay["uci"]) != len(evals):
+                continue
+            game = game_rows(row, evals, replay.fens(game_replay), puzzles.get(row['id'], []))
+            scored += bool(game)
+            rows.extend(game)
+        if rebuilt:
+            database.save_replays(rebuilt)
+        database.replace_game_stats(chunk, rows)
+    return scored
+
+def backfill():
+    """
+    Scores games that have evals but no stats (scanned before stats were kept).
+    Looked for again only after the library changes. Returns the games scored.
+    """
+    global _checked
+    key = (database.DB_PATH, database.get_library_version())
+    if key == _checked:
+        return 0
+    with _backfill_lock:
+        if (database.DB_PATH, database.get_library_version()) == _checked:
+            return 0
+        missing = database.get_games_missing_stats()
+        scored = update_games(missing) if missing else 0
+        _checked = (database.DB_PATH, database.get_library_version())
+    return scored
+
+def start_backfill():
+    """
+    Runs backfill() in a background thread, unless one is running or the
+    library is unchanged since the last check. Returns whether it started one.
+    """
+    global _backfill_thread
+    if (database.DB_PATH, database.get_library_version()) == _checked:
+        return False
+    with _thread_lock:
+        if _backfill_thread is not None and _backfill_thread.is_alive():
+            return False
+        _backfill_thread = threading.Thread(target=_run_backfill, daemon=True)
+        _backfill_thread.start()
+    return True
+
+def _run_backfill():
+    try:
+        backfill()
+    except Exception as e:
+        # Looked for again on the next report
+        print(f"Stats backfill failed: {e}")
+
+def _summary(row):
+    moves = row['moves'] or 0
+    return {
+        "games": row['games'],
+        "moves": moves,
+        "acpl": round(row['cp_loss'] / moves, 1) if moves else None,
+        "accuracy": round(row['accuracy'] / moves, 1) if moves else None,
+        "inaccuracies": row['inaccuracies'] or 0,
+        "mistakes": row['mistakes'] or 0,
+        "blunders": row['blunders'] or 0,
+        "puzzles": row['puzzles'] or 0,
+    }
+
+def report(player=None, folder_id=None, trend="month"):
+    """
+    Totals, per phase, per side and over time (per month or year of the game's
+    date) for a player's games, a folder, or both. Accuracy is averaged over moves.
+    """
+    if trend not in TRENDS:
+        raise ValueError(f"trend must be one of {', '.join(TRENDS)}")
+    start_backfill()
+    totals = database.sum_game_stats(player, folder_id)
+    empty = {"games": 0, "moves": 0, "cp_loss": 0, "accuracy": 0, "inaccuracies": 0,
+             "mistakes": 0, "blunders": 0, "puzzles": 0}
+    by_phase = {row['key']: _summary(row) for row in database.sum_game_stats(player, folder_id, "phase")}
+    return {
+        "player": player,
+        "folder_id": folder_id,
+        **_summary(totals[0] if totals else empty),
+        "phases": {name: by_phase.get(name, _summary(empty)) for name in PHASES},
+        "sides": {row['key']: _summary(row) for row in database.sum_game_stats(player, folder_id, "side")},
+        "trend": [{"period": row['key'], **_summary(row)}
+                  for row in database.sum_game_stats(player, folder_id, trend) if row['key']],
+    }
@@ -0,0 +1,136 @@
+"""
+Player models as Polyglot opening books (.bin).
+
+A book is a sorted array of 16-byte big-endian entries:
+    key (u64 Zobrist hash) | move (u16) | weight (u16) | learn (u32)
+so any UCI GUI or engine can use a player's repertoire, and lookups are a
+binary search over a memory-mapped file instead of a JSON dict in memory.
+
+- weight: how often the player chose the move ("count"), or Polyglot's own
+  make-book rule 2 * wins + draws ("score"). Scaled down to fit 16 bits.
+- learn: wins in the high 16 bits, draws in the low 16 bits, on the same
+  scale as the count. GUIs ignore the field; BookModel reads it back so the
+  mimic predictor keeps its win/loss/draw numbers. Books the model store
+  serves from are always "count" books. Their numbers are the model's own
+  as long as no count exceeds 65535; past that the whole book is scaled by
+  one factor, which keeps the proportions but rounds small counts down
+  (never below a weight of 1).
+
+A BookModel counts its file size against the model store's memory budget
+(the mapped pages are what it holds) and is closed when the store replaces
+or evicts it.
+"""
+import os
+import struct
+import time
+import chess
+import chess.polyglot
+
+ENTRY = struct.Struct(">QHHI")
+WEIGHTINGS = ("count", "score")
+MAX_WEIGHT = 0xFFFF
+
+def encode_move(board, move):
+    """Polyglot move encoding: castling is written as the king capturing its rook."""
+    to_square = move.to_square
+    if board.is_kingside_castling(move):
+        to_square = chess.square(7, chess.square_rank(move.from_square))
+    elif board.is_queenside_castling(move):
+        to_square = chess.square(0, chess.square_rank(move.from_square))
+    promotion = move.promotion - 1 if move.promotion else 0
+    return (chess.square_file(to_square) | chess.square_rank(to_square) << 3 |
+            chess.square_file(move.from_square) << 6 | chess.square_rank(move.from_square) << 9 |
+            promotion << 12)
+
+def _board(fen):
+    # Model keys are FENs without move counters
+    parts = fen.split()
+    return chess.Board(" ".join(parts[:4] + ["0", "1"]))
+
+def compile_entries(raw, weighting="count"):
+    """
+    raw: a model as written by ingest.py, {fen: {uci: {count, win, loss, draw}}}.
+    Returns the book's entries as (key, move, weight, learn) tuples, sorted by
+    key and then by weight, highest first.
+    """
+    if weighting not in WEIGHTINGS:
+        raise ValueError(f"weighting must be one of {', '.join(WEIGHTINGS)}")
+    moves = []
+    for fen, fen_moves in raw.items():
+        board = _board(fen)
+        key = chess.polyglot.zobrist_hash(board)
+        for uci, stats in fen_moves.items():
+            move = chess.Move.from_uci(uci)
+            if not board.is_legal(move):
+                continue
+            if not isinstance(stats, dict):
+                stats = {"count": stats}
+            count, win, draw = stats.get("count", 0), stats.get("win", 0), stats.get("draw", 0)
+            weight = count if weighting == "count" else 2 * win + draw
+            if count:
+                moves.append((key, encode_move(board, move), weight, win, draw))
+
+    # One scale for the whole book keeps weights and learn counts comparable
+    top = max([max(weight, win, draw) for _, _, weight, win, draw in moves] or [0])
+    scale = min(1.0, MAX_WEIGHT / top) if top else 1.0
+    entries = []
+    for key, raw_move, weight, win, draw in moves:
+        learn = min(int(win * scale), MAX_WEIGHT) << 16 | min(int(draw * scale), MAX_WEIGHT)
+        entries.append((key, raw_move, max(1, int(weight * scale)), learn))
+    entries.sort(key=lambda e: (e[0], -e[2]))
+    return entries
+
+def book_bytes(raw, weighting="count"):
+    """The book file's contents for a model dict."""
+    return b"".join(ENTRY.pack(*entry) for entry in compile_entries(raw, weighting))
+
+def write_book(path, raw, weighting="count"):
+    """Compiles a model dict into a Polyglot book at `path` (written atomically). Returns the entry count."""
+    data = book_bytes(raw, weighting)
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+    return len(data) // ENTRY.size
+
+class BookModel:
+    """
+    A player model served from a Polyglot book. Same lookup() as
+    model_store.PlayerModel; each probe is a binary search on the mapped file.
+    """
+    format = "polyglot"
+
+    def __init__(self, path):
+        self.path = path
+        self.mtime = os.path.getmtime(path)
+        self.reader = chess.polyglot.MemoryMappedReader(path)
+        self.loaded_at = time.time()
+        self.checked_at = self.loaded_at
+        self.entries = len(self.reader)
+        self.size = os.path.getsize(path)
+        self.closed = False
+
+    @classmethod
+    def load(cls, path):
+        return cls(path)
+
+    def lookup(self, board):
+        """[(uci, {count, win, loss, draw})] for the position, most played first."""
+        result = []
+        try:
+            for entry in self.reader.find_all(board):
+                win, draw = entry.learn >> 16, entry.learn & MAX_WEIGHT
+                result.append((entry.move.uci(), {"count": entry.weight, "win": win,
+                                                  "loss": max(entry.weight - win - draw, 0), "draw": draw}))
+        except ValueError:
+            # A request still holding a model the store has just closed gets no moves, not an error
+            if not self.closed:
+                raise
+            return []
+        result.sort(key=lambda e: e[1]["count"], reverse=True)
+        return result
+
+    def close(self):
+        self.closed = True
+        self.reader.close()
@@ -0,0 +1,161 @@
+import io
+import chess
+import chess.pgn
+import chess.polyglot
+import database
+
+# Set once the backfill of games stored before the index existed has run
+_backfilled = False
+
+def position_key(board):
+    """
+    Returns the Zobrist hash of the position as a signed 64-bit integer
+    (SQLite INTEGER is signed). Covers pieces, turn, castling and en passant,
+    so transpositions map to the same key.
+    """
+    h = chess.polyglot.zobrist_hash(board)
+    return h - (1 << 64) if h >= (1 << 63) else h
+
+_POLYGLOT_PIECE_INDEX = {"p": 0, "P": 1, "n": 2, "N": 3, "b": 4, "B": 5,
+                         "r": 6, "R": 7, "q": 8, "Q": 9, "k": 10, "K": 11}
+_POLYGLOT_CASTLING = {"K": 768, "Q": 769, "k": 770, "q": 771}
+
+def fen_zobrist(fen):
+    """
+    Polyglot Zobrist hash (unsigned) straight from a FEN string, without
+    building a Board. Accepts FENs without clocks, e.g. the 4-field keys of
+    mimic models. Equal to chess.polyglot.zobrist_hash(chess.Board(fen)).
+    """
+    parts = fen.split()
+    placement = parts[0]
+    turn = parts[1] if len(parts) > 1 else "w"
+    castling = parts[2] if len(parts) > 2 else "-"
+    ep = parts[3] if len(parts) > 3 else "-"
+    array = chess.polyglot.POLYGLOT_RANDOM_ARRAY
+
+    h = 0
+    squares = {}
+    rank, file = 7, 0
+    for ch in placement:
+        if ch == "/":
+            rank -= 1
+            file = 0
+        elif ch.isdigit():
+            file += int(ch)
+        else:
+            sq = rank * 8 + file
+            h ^= array[64 * _POLYGLOT_PIECE_INDEX[ch] + sq]
+            squares[sq] = ch
+            file += 1
+
+    if castling != "-":
+        for ch in castling:
+            if ch not in _POLYGLOT_CASTLING:
+                # Shredder/X-FEN castling notation: let python-chess work it out
+                return chess.polyglot.zobrist_hash(chess.Board(fen if len(parts) > 4 else fen + " 0 1"))
+            h ^= array[_POLYGLOT_CASTLING[ch]]
+
+    if ep != "-":
+        # Only hashed if a pawn of the side to move could capture en passant
+        ep_sq = chess.parse_square(ep)
+        ep_file = chess.square_file(ep_sq)
+        pawn, from_rank = ("P", 4) if turn == "w" else ("p", 3)
+        for f in (ep_file - 1, ep_file + 1):
+            if 0 <= f <= 7 and squares.get(from_rank * 8 + f) == pawn:
+                h ^= array[772 + ep_file]
+                break
+
+    if turn == "w":
+        h ^= array[780]
+    return h
+
+# Nibble order of the material signature: white P N B R Q, then black P N B R Q
+MATERIAL_PIECES = [(color, piece_type) for color in (chess.WHITE, chess.BLACK)
+                   for piece_type in (chess.PAWN, chess.KNIGHT, chess.BISHOP, chess.ROOK, chess.QUEEN)]
+
+def material_signature(board):
+    """
+    Packs the piece counts into one integer, 4 bits per piece type and colour
+    (see MATERIAL_PIECES). Equal signatures mean equal material.
+    """
+    sig = 0
+    for i, (color, piece_type) in enumerate(MATERIAL_PIECES):
+        count = chess.popcount(board.pieces_mask(piece_type, color))
+        sig |= min(count, 15) << (4 * i)
+    return sig
+
+def position_row(board):
+    """Returns (zobrist, white_pawns, black_pawns, material) for a board."""
+    return (
+        position_key(board),
+        board.pieces_mask(chess.PAWN, chess.WHITE),
+        board.pieces_mask(chess.PAWN, chess.BLACK),
+        material_signature(board)
+    )
+
+def game_positions(game):
+    """
+    Yields (ply, zobrist, white_pawns, black_pawns, material) for every position
+    of the mainline, starting with ply 0 for the initial position.
+    Ply N is the position after N half-moves.
+    """
+    board = game.board()
+    yield (0,) + position_row(board)
+    for ply, move in enumerate(game.mainline_moves(), start=1):
+        board.push(move)
+        yield (ply,) + position_row(board)
+
+def index_game(game_id, game):
+    """
+    Adds index entries for a stored game. `game` is a chess.pgn.Game or PGN text.
+    """
+    if isinstance(game, str):
+        game = chess.pgn.read_game(io.StringIO(game))
+        if game is None:
+            return 0
+    rows = [(game_id,) + row for row in game_positions(game)]
+    database.add_positions(game_id, rows)
+    return len(rows)
+
+def index_missing_games():
+    """
+    Indexes games that have no index entries yet (e.g. stored before the
+    index existed). Returns the number of games indexed.
+    """
+    count = 0
+    for game_id, pgn in database.get_unindexed_games():
+        index_game(game_id, pgn)
+        count += 1
+    return count
+
+def ensure_indexed():
+    global _backfilled
+    if not _backfilled:
+        index_missing_games()
+        _backfilled = True
+
+def search_position(fen):
+    """
+    Returns every stored game that reached the position, with the plies
+    where it occurred:
+    [ { "id": int, "white": str, "black": str, "result": str, "date": str,
+        "name": str, "folder_id": int, "plies": [int] } ]
+    """
+    ensure_indexed()
+    key = position_key(chess.Board(fen))
+    games = {}
+    for row in database.find_positions(key):
+        g = games.get(row['game_id'])
+        if g is None:
+            g = games[row['game_id']] = {
+                "id": row['game_id'], "white": row['white'], "black": row['black'],
+                "result": row['result'], "date": row['date'], "name": row['name'],
+                "folder_id": row['folder_id'], "plies": []
+            }
+        g["plies"].append(row['ply'])
+    return list(games.values())
+
+if __name__ == "__main__":
+    database.init_db()
+    n = index_missing_games()
+    print(f"✅ Indexed {n} games.")
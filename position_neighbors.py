@@ -0,0 +1,298 @@
+"""
+Approximate nearest-neighbour move prediction for positions missing from a
+player's model.
+
+Every position from the player's history (where they were to move) is
+embedded as a binary code: the 12 piece-square bit-planes plus a word of
+pawn-structure bits. Codes are bucketed by several bit-sampling LSH tables;
+a query probes its own bucket and the buckets one bit away in every table,
+reranks the candidates by exact Hamming distance, and maps the moves played
+in the k closest positions onto the query board.
+
+The index is built with `python position_neighbors.py "<player>"` and saved
+next to the player's model (models/<player>.ann.npz).
+"""
+import io
+import os
+import threading
+import collections
+import numpy as np
+import chess
+import chess.pgn
+import database
+import feature_planes
+import model_store
+import positional_engine
+
+TABLES = 8
+BITS_PER_TABLE = 16
+# Bits considered for LSH keys: the ones that split the data most evenly
+CANDIDATE_BITS = 128
+# Rows taken from one bucket, and the candidate count below which neighbouring buckets are probed
+MAX_BUCKET = 512
+MIN_CANDIDATES = 256
+DEFAULT_K = 16
+
+WORDS = 13  # 12 piece planes + 1 pawn-structure word
+
+_U64 = np.uint64
+_FILES = np.array(chess.BB_FILES, dtype=_U64)
+_ADJACENT_FILES = np.array(positional_engine.BB_ADJACENT_FILES, dtype=_U64)
+_FILE_BITS = (np.uint64(1) << np.arange(8, dtype=_U64))
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+def index_path(player):
+    return os.path.join(model_store.MODELS_DIR, model_store.model_filename(player) + ".ann.npz")
+
+def _file_bits(mask):
+    """uint64[N, 8] file-presence flags packed into the low 8 bits."""
+    return (np.where((mask[:, None] & _FILES) != 0, _FILE_BITS, _U64(0))).sum(axis=1, dtype=_U64)
+
+def embed(planes):
+    """
+    uint64[N, 12] piece planes -> uint64[N, 13] codes. The extra word holds
+    white/black pawn files (bits 0-15) and white/black isolated-pawn files (bits 16-31).
+    """
+    planes = np.asarray(planes, dtype=_U64)
+    white_pawns, black_pawns = planes[:, 0], planes[:, 6]
+    structure = _file_bits(white_pawns) | (_file_bits(black_pawns) << _U64(8))
+    for shift, pawns in ((16, white_pawns), (24, black_pawns)):
+        present = (pawns[:, None] & _FILES) != 0
+        adjacent = (pawns[:, None] & _ADJACENT_FILES) != 0
+        isolated = np.where(present & ~adjacent, _FILE_BITS, _U64(0)).sum(axis=1, dtype=_U64)
+        structure |= isolated << _U64(shift)
+    return np.concatenate([planes, structure[:, None]], axis=1)
+
+def embed_board(board):
+    planes, _ = feature_planes.boards_to_packed([board])
+    return embed(planes)[0]
+
+def hamming(codes, code):
+    return feature_planes.popcount(codes ^ code).sum(axis=1)
+
+def _bit_columns(codes, bits):
+    """Extracts the given global bit positions (word * 64 + bit) as a uint8[N, len(bits)] array."""
+    words = bits // 64
+    shifts = (bits % 64).astype(_U64)
+    return ((codes[:, words] >> shifts) & _U64(1)).astype(np.uint8)
+
+def _keys(codes, table_bits):
+    cols = _bit_columns(codes, table_bits).astype(np.uint32)
+    return (cols << np.arange(len(table_bits), dtype=np.uint32)).sum(axis=1, dtype=np.uint32)
+
+def player_history(player):
+    """
+    Replays the player's stored games and returns
+    (planes uint64[N, 12], turns bool[N], moves uint8[N, 3] (from, to, promotion), game_ids int32[N])
+    for every position where the player was to move.
+    """
+    needle = player.lower()
+
+    def games():
+        for g in database.get_all_games():
+            is_white = needle in (g.get('white') or '').lower()
+            is_black = needle in (g.get('black') or '').lower()
+            if not (is_white or is_black):
+                continue
+            game = chess.pgn.read_game(io.StringIO(g['pgn']))
+            if game is not None:
+                yield g['id'], game, is_white, is_black
+
+    return games_history(games())
+
+def games_history(games):
+    """
+    Same arrays as player_history() for an iterable of
+    (game_id, chess.pgn.Game, is_white, is_black).
+    """
+    planes, turns, moves, game_ids = [], [], [], []
+    for game_id, game, is_white, is_black in games:
+        board = game.board()
+        for move in game.mainline_moves():
+            if (board.turn == chess.WHITE and is_white) or (board.turn == chess.BLACK and is_black):
+                white, black = board.occupied_co[chess.WHITE], board.occupied_co[chess.BLACK]
+                planes.append((
+                    board.pawns & white, board.knights & white, board.bishops & white,
+                    board.rooks & white, board.queens & white, board.kings & white,
+                    board.pawns & black, board.knights & black, board.bishops & black,
+                    board.rooks & black, board.queens & black, board.kings & black,
+                ))
+                turns.append(board.turn)
+                moves.append((move.from_square, move.to_square, move.promotion or 0))
+                game_ids.append(game_id)
+            board.push(move)
+    return (np.array(planes, dtype=_U64).reshape(-1, 12), np.array(turns, dtype=bool),
+            np.array(moves, dtype=np.uint8).reshape(-1, 3), np.array(game_ids, dtype=np.int32))
+
+class NeighborIndex:
+    def __init__(self, codes, turns, moves, game_ids, table_bits, table_keys, table_order):
+        self.codes = codes
+        self.turns = turns
+        self.moves = moves
+        self.game_ids = game_ids
+        self.table_bits = table_bits    # int64[TABLES, BITS_PER_TABLE]
+        self.table_keys = table_keys    # uint32[TABLES, N], sorted per table
+        self.table_order = table_order  # int32[TABLES, N], row for each sorted key
+
+    @classmethod
+    def build(cls, planes, turns, moves, game_ids, seed=33):
+        codes = embed(planes)
+        n = len(codes)
+        # Pick the bits closest to a 50/50 split on a sample of the data
+        sample = codes[np.random.default_rng(seed).choice(n, size=min(n, 100000), replace=False)] if n else codes
+        all_bits = np.arange(WORDS * 64)
+        freq = _bit_columns(sample, all_bits).mean(axis=0) if n else np.zeros(len(all_bits))
+        candidates = all_bits[np.argsort(np.abs(freq - 0.5))[:CANDIDATE_BITS]]
+
+        rng = np.random.default_rng(seed)
+        table_bits = np.stack([rng.choice(candidates, size=BITS_PER_TABLE, replace=False) for _ in range(TABLES)])
+        table_keys = np.empty((TABLES, n), dtype=np.uint32)
+        table_order = np.empty((TABLES, n), dtype=np.int32)
+        for t in range(TABLES):
+            keys = _keys(codes, table_bits[t])
+            order = np.argsort(keys, kind="stable").astype(np.int32)
+            table_keys[t] = keys[order]
+            table_order[t] = order
+        return cls(codes, turns, moves, game_ids, table_bits, table_keys, table_order)
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = path + ".tmp.npz"
+        np.savez(tmp, codes=self.codes, turns=self.turns, moves=self.moves, game_ids=self.game_ids,
+                 table_bits=self.table_bits, table_keys=self.table_keys, table_order=self.table_order)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(**{name: data[name] for name in data.files})
+
+    def _probe(self, keys_by_table, per_bucket):
+        found = []
+        for t, probes in enumerate(keys_by_table):
+            lo = np.searchsorted(self.table_keys[t], probes, side="left")
+            hi = np.minimum(np.searchsorted(self.table_keys[t], probes, side="right"), lo + per_bucket)
+            found.extend(self.table_order[t][a:b] for a, b in zip(lo, hi) if b > a)
+        return found
+
+    def candidates(self, code):
+        """
+        Rows sharing an LSH bucket with the code in any table. If that yields
+        fewer than MIN_CANDIDATES rows, buckets one bit away are probed too.
+        """
+        keys = [int(_keys(code[None, :], self.table_bits[t])[0]) for t in range(TABLES)]
+        found = self._probe([np.array([key], dtype=np.uint32) for key in keys], MAX_BUCKET)
+        if sum(len(f) for f in found) < MIN_CANDIDATES:
+            flips = np.uint32(1) << np.arange(BITS_PER_TABLE, dtype=np.uint32)
+            found += self._probe([np.uint32(key) ^ flips for key in keys], MAX_BUCKET // 8)
+        if not found:
+            return np.empty(0, dtype=np.int32)
+        return np.unique(np.concatenate(found))
+
+    def query(self, board, k=DEFAULT_K):
+        """Returns (rows, distances) of up to k nearest positions with the same side to move."""
+        code = embed_board(board)
+        rows = self.candidates(code)
+        rows = rows[self.turns[rows] == board.turn]
+        if len(rows) == 0:
+            return rows, np.empty(0, dtype=np.int32)
+        dist = hamming(self.codes[rows], code)
+        best = np.argsort(dist, kind="stable")[:k]
+        return rows[best], dist[best]
+
+def map_move(board, from_sq, to_sq, promotion, piece_type):
+    """
+    Maps a move played in a neighbouring position onto `board`: the same move
+    if it is legal with the same piece, otherwise the same piece type going
+    to the same square. Returns (move, exact) or (None, False).
+    """
+    promotion = promotion or None
+    move = chess.Move(from_sq, to_sq, promotion)
+    if board.piece_type_at(from_sq) == piece_type and board.is_legal(move):
+        return move, True
+    for candidate in board.legal_moves:
+        if candidate.to_square == to_sq and candidate.promotion == promotion and \
+                board.piece_type_at(candidate.from_square) == piece_type:
+            return candidate, False
+    return None, False
+
+def get_index(player):
+    """The player's index from memory or disk, or None if it was never built."""
+    path = index_path(player)
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return None
+    with _indexes_lock:
+        cached = _indexes.get(path)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+    index = NeighborIndex.load(path)
+    with _indexes_lock:
+        _indexes[path] = (mtime, index)
+    return index
+
+def is_loaded(player):
+    """True if get_index(player) would not read the disk: the index is in memory and current, or there is none."""
+    try:
+        mtime = os.path.getmtime(index_path(player))
+    except OSError:
+        return True
+    with _indexes_lock:
+        cached = _indexes.get(index_path(player))
+    return cached is not None and cached[0] == mtime
+
+def predict(board, player, k=DEFAULT_K, limit=5):
+    """
+    Predicts the player's move from the k most similar positions in their history.
+    Returns [ { "move": uci, "count": int, "probability": float } ] like ModelStore.predict,
+    where count is the number of neighbours voting for the move.
+    """
+    index = get_index(player)
+    if index is None:
+        return []
+    return predict_from_index(index, board, k, limit)
+
+def predict_from_index(index, board, k=DEFAULT_K, limit=5):
+    rows, dist = index.query(board, k)
+    votes = collections.Counter()
+    counts = collections.Counter()
+    for row, d in zip(rows, dist):
+        from_sq, to_sq, promotion = (int(x) for x in index.moves[row])
+        piece_type = _piece_type_at(index.codes[row], from_sq)
+        move, exact = map_move(board, from_sq, to_sq, promotion, piece_type)
+        if move is None:
+            continue
+        weight = (1.0 if exact else 0.5) / (1 + int(d))
+        votes[move.uci()] += weight
+        counts[move.uci()] += 1
+    total = sum(votes.values()) or 1
+    return [{"move": uci, "count": counts[uci], "probability": round(w / total, 4)}
+            for uci, w in votes.most_common(limit)]
+
+def _piece_type_at(code, square):
+    bit = _U64(1) << _U64(square)
+    for plane in range(12):
+        if code[plane] & bit:
+            return plane % 6 + 1
+    return None
+
+def build_index(player):
+    planes, turns, moves, game_ids = player_history(player)
+    index = NeighborIndex.build(planes, turns, moves, game_ids)
+    index.save(index_path(player))
+    return index
+
+if __name__ == "__main__":
+    import sys
+    import time
+    if len(sys.argv) < 2:
+        print('Usage: python position_neighbors.py "<player>"')
+        sys.exit(1)
+    database.init_db()
+    start = time.perf_counter()
+    built = build_index(sys.argv[1])
+    print(f"✅ Indexed {len(built.codes)} positions for {sys.argv[1]} in {time.perf_counter() - start:.1f}s")
+    print(f"💾 Saved to {index_path(sys.argv[1])}")
@@ -0,0 +1,143 @@
+import io
+import os
+import json
+import collections
+from concurrent.futures import ProcessPoolExecutor
+import chess
+import chess.pgn
+import database
+import positional_engine
+
+# Stored results carrying another version are recomputed
+RESULTS_VERSION = 1
+# Below this many uncached games the pool start-up costs more than it saves
+MIN_GAMES_FOR_POOL = 16
+
+# Pawn hash table hits/misses over all batch runs, including pool workers
+_pawn_cache_totals = collections.Counter()
+
+def analyze_fens(fens):
+    """Returns the findings for each FEN, reusing a single board."""
+    board = chess.Board()
+    results = []
+    for fen in fens:
+        board.set_fen(fen)
+        results.append(positional_engine.analyze_board(board))
+    return results
+
+def summarize(plies, turns):
+    """
+    Counts, per side to move, how many plies had each finding type:
+    { "white": { "plies": int, "counts": { type: int } }, "black": {...} }
+    """
+    summary = {"white": {"plies": 0, "counts": collections.Counter()},
+               "black": {"plies": 0, "counts": collections.Counter()}}
+    for findings, turn in zip(plies, turns):
+        side = summary[turn]
+        side["plies"] += 1
+        side["counts"].update(set(f["type"] for f in findings))
+    for side in summary.values():
+        side["counts"] = dict(side["counts"])
+    return summary
+
+def analyze_game(pgn):
+    """
+    Replays a game on one board and returns the stored result format:
+    { "version": int, "plies": [findings for ply 0..N], "turns": ["white"|"black"],
+      "summary": {...} }
+    """
+    game = chess.pgn.read_game(io.StringIO(pgn))
+    if game is None:
+        return {"version": RESULTS_VERSION, "plies": [], "turns": [], "summary": summarize([], [])}
+    board = game.board()
+    plies = [positional_engine.analyze_board(board)]
+    turns = ["white" if board.turn == chess.WHITE else "black"]
+    for move in game.mainline_moves():
+        board.push(move)
+        plies.append(positional_engine.analyze_board(board))
+        turns.append("white" if board.turn == chess.WHITE else "black")
+    return {"version": RESULTS_VERSION, "plies": plies, "turns": turns, "summary": summarize(plies, turns)}
+
+def _analyze_source(source):
+    game_id, pgn = source
+    before = positional_engine.pawn_structure.cache_info()
+    data = analyze_game(pgn)
+    after = positional_engine.pawn_structure.cache_info()
+    return game_id, data, (after.hits - before.hits, after.misses - before.misses)
+
+def pawn_cache_stats():
+    """Pawn hash table hit rate accumulated over batch-analysed games."""
+    lookups = _pawn_cache_totals["hits"] + _pawn_cache_totals["misses"]
+    return {
+        "hits": _pawn_cache_totals["hits"],
+        "misses": _pawn_cache_totals["misses"],
+        "hit_rate": round(_pawn_cache_totals["hits"] / lookups, 4) if lookups else None,
+    }
+
+def analyze_games(game_ids, processes=None):
+    """
+    Returns {game_id: result} for the given games. Stored results are reused;
+    the rest are computed (in a process pool when there are many) and saved.
+    """
+    results = {}
+    pending = []
+    for game_id, pgn, stored in database.get_positional_sources(game_ids):
+        if stored:
+            try:
+                data = json.loads(stored)
+                if data.get("version") == RESULTS_VERSION:
+                    results[game_id] = data
+                    continue
+            except ValueError:
+                pass
+        pending.append((game_id, pgn))
+
+    if len(pending) >= MIN_GAMES_FOR_POOL and (processes or os.cpu_count() or 1) > 1:
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            computed = list(pool.map(_analyze_source, pending, chunksize=max(1, len(pending) // 64)))
+    else:
+        computed = [_analyze_source(source) for source in pending]
+
+    for game_id, data, (hits, misses) in computed:
+        results[game_id] = data
+        _pawn_cache_totals["hits"] += hits
+        _pawn_cache_totals["misses"] += misses
+    database.save_positional_many(
+        (json.dumps(results[game_id], separators=(",", ":")), game_id) for game_id, _, _ in computed
+    )
+    return results
+
+def player_profile(results, games, player):
+    """
+    Aggregates per-game summaries over the plies where `player` was to move.
+    `games` maps game_id -> game row (white/black); matching follows ingest.py.
+    Returns { "games": int, "plies": int, "counts": {type: int}, "rates": {type: float} }
+    """
+    needle = player.lower()
+    profile = {"games": 0, "plies": 0, "counts": collections.Counter()}
+    for game_id, data in results.items():
+        g = games.get(game_id)
+        if not g:
+            continue
+        sides = [side for side in ("white", "black") if needle in (g.get(side) or "").lower()]
+        if not sides:
+            continue
+        profile["games"] += 1
+        for side in sides:
+            profile["plies"] += data["summary"][side]["plies"]
+            profile["counts"].update(data["summary"][side]["counts"])
+    profile["counts"] = dict(profile["counts"])
+    profile["rates"] = {t: round(c / profile["plies"], 4) for t, c in profile["counts"].items()} if profile["plies"] else {}
+    return profile
+
+if __name__ == "__main__":
+    import sys
+    import time
+    database.init_db()
+    ids = [g["id"] for g in database.get_all_games()]
+    start = time.perf_counter()
+    analyzed = analyze_games(ids)
+    print(f"✅ Positional profiles for {len(analyzed)} games in {time.perf_counter() - start:.1f}s")
+    print(f"   Pawn cache: {pawn_cache_stats()}")
+    if len(sys.argv) > 1:
+        print(json.dumps(player_profile(analyzed, database.get_games_by_ids(ids), sys.argv[1]), indent=2))
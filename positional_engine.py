@@ -1,21 +1,116 @@
+import collections
+import functools
 import chess
 
-def get_bad_bishops(board):
+# Number of distinct pawn structures kept by the pawn hash table (LRU)
+PAWN_CACHE_SIZE = 16384
+
+# Precomputed masks so each detector is a handful of integer operations per piece
+BB_FILES = chess.BB_FILES
+BB_ADJACENT_FILES = [
+    (BB_FILES[f - 1] if f > 0 else 0) | (BB_FILES[f + 1] if f < 7 else 0)
+    for f in range(8)
+]
+# BB_RANKS_ABOVE[r]: every square on a rank greater than r (BB_RANKS_BELOW likewise)
+BB_RANKS_ABOVE = [sum(chess.BB_RANKS[r + 1:]) for r in range(8)]
+BB_RANKS_BELOW = [sum(chess.BB_RANKS[:r]) for r in range(8)]
+
+# BB_FORWARD_ADJACENT_SPAN[color][sq]: squares on the adjacent files ahead of sq
+# from `color`'s point of view. An enemy pawn there can still advance to attack sq.
+BB_FORWARD_ADJACENT_SPAN = {
+    chess.WHITE: [BB_ADJACENT_FILES[chess.square_file(sq)] & BB_RANKS_ABOVE[chess.square_rank(sq)] for sq in chess.SQUARES],
+    chess.BLACK: [BB_ADJACENT_FILES[chess.square_file(sq)] & BB_RANKS_BELOW[chess.square_rank(sq)] for sq in chess.SQUARES],
+}
+
+# Ranks 4-6 for White, 3-5 for Black
+BB_OUTPOST_RANKS = {
+    chess.WHITE: chess.BB_RANK_4 | chess.BB_RANK_5 | chess.BB_RANK_6,
+    chess.BLACK: chess.BB_RANK_3 | chess.BB_RANK_4 | chess.BB_RANK_5,
+}
+
+# Pawn-only facts for the side to move; everything the detectors need besides piece placement
+PawnStructure = collections.namedtuple("PawnStructure", [
+    "isolated",         # own pawns with no own pawn on an adjacent file
+    "light_pawns",      # number of own pawns on light squares
+    "dark_pawns",       # number of own pawns on dark squares
+    "open_files",       # files with no pawns at all
+    "semi_open_files",  # files with no own pawn (includes open files)
+    "outposts",         # outpost-rank squares no enemy pawn can still challenge
+    "pawn_supported",   # squares defended by own pawns
+])
+
+@functools.lru_cache(maxsize=PAWN_CACHE_SIZE)
+def pawn_structure(white_pawns, black_pawns, turn):
+    """
+    Computes the pawn-only part of the analysis. Memoized on the pawn
+    bitboards, so consecutive plies that did not move a pawn are a cache hit.
+    """
+    own_pawns, enemy_pawns = (white_pawns, black_pawns) if turn == chess.WHITE else (black_pawns, white_pawns)
+
+    isolated = 0
+    open_files = 0
+    semi_open_files = 0
+    for f in range(8):
+        file_mask = BB_FILES[f]
+        if not own_pawns & file_mask:
+            semi_open_files |= file_mask
+            if not enemy_pawns & file_mask:
+                open_files |= file_mask
+        elif not own_pawns & BB_ADJACENT_FILES[f]:
+            isolated |= own_pawns & file_mask
+
+    # A square is challenged if an enemy pawn sits ahead of it on an adjacent file
+    challenged = 0
+    for sq in chess.scan_forward(enemy_pawns):
+        challenged |= BB_FORWARD_ADJACENT_SPAN[not turn][sq]
+
+    pawn_supported = 0
+    for sq in chess.scan_forward(own_pawns):
+        pawn_supported |= chess.BB_PAWN_ATTACKS[turn][sq]
+
+    light_pawns = chess.popcount(own_pawns & chess.BB_LIGHT_SQUARES)
+    return PawnStructure(
+        isolated=isolated,
+        light_pawns=light_pawns,
+        dark_pawns=chess.popcount(own_pawns) - light_pawns,
+        open_files=open_files,
+        semi_open_files=semi_open_files,
+        outposts=BB_OUTPOST_RANKS[turn] & ~challenged,
+        pawn_supported=pawn_supported,
+    )
+
+def get_pawn_structure(board):
+    """Looks up the pawn structure of a board in the pawn hash table."""
+    return pawn_structure(board.pawns & board.occupied_co[chess.WHITE],
+                          board.pawns & board.occupied_co[chess.BLACK],
+                          board.turn)
+
+def pawn_cache_info():
+    """Hit/miss counters of the pawn hash table."""
+    info = pawn_structure.cache_info()
+    lookups = info.hits + info.misses
+    return {
+        "hits": info.hits,
+        "misses": info.misses,
+        "size": info.currsize,
+        "maxsize": info.maxsize,
+        "hit_rate": round(info.hits / lookups, 4) if lookups else None,
+    }
+
+def clear_pawn_cache():
+    pawn_structure.cache_clear()
+
+def get_bad_bishops(board, pawns=None):
     """
     Identifies 'bad' bishops that are restricted by their own pawns on the same color squares.
     """
     findings = []
-    for square in board.pieces(chess.BISHOP, board.turn):
-        is_light = chess.BB_SQUARES[square] & chess.BB_LIGHT_SQUARES
-        own_pawns = board.pieces(chess.PAWN, board.turn)
-        
+    pawns = pawns or get_pawn_structure(board)
+    for square in chess.scan_forward(board.pieces_mask(chess.BISHOP, board.turn)):
         # Count pawns on the same color as the bishop
-        restricted_count = 0
-        for p_sq in own_pawns:
-            p_is_light = chess.BB_SQUARES[p_sq] & chess.BB_LIGHT_SQUARES
-            if bool(is_light) == bool(p_is_light):
-                restricted_count += 1
-        
+        is_light = chess.BB_SQUARES[square] & chess.BB_LIGHT_SQUARES
+        restricted_count = pawns.light_pawns if is_light else pawns.dark_pawns
+
         if restricted_count >= 4:
             findings.append({
                 "type": "Bad Bishop",
@@ -25,67 +120,44 @@ def get_bad_bishops(board):
             })
     return findings
 
-def get_isolated_pawns(board):
+def get_isolated_pawns(board, pawns=None):
     """
     Identifies pawns that have no friendly pawns on adjacent files.
     """
     findings = []
-    own_pawns = board.pieces(chess.PAWN, board.turn)
-    
-    for square in own_pawns:
-        file = chess.square_file(square)
-        adjacent_files = []
-        if file > 0: adjacent_files.append(file - 1)
-        if file < 7: adjacent_files.append(file + 1)
-        
-        is_isolated = True
-        for adj_file in adjacent_files:
-            # Check if any friendly pawn exists on the adjacent file
-            if any(chess.square_file(p_sq) == adj_file for p_sq in own_pawns):
-                is_isolated = False
-                break
-        
-        if is_isolated:
-            findings.append({
-                "type": "Isolated Pawn",
-                "square": chess.square_name(square),
-                "severity": "Medium",
-                "description": f"The pawn on {chess.square_name(square)} is isolated and may become a target."
-            })
+    pawns = pawns or get_pawn_structure(board)
+    for square in chess.scan_forward(pawns.isolated):
+        findings.append({
+            "type": "Isolated Pawn",
+            "square": chess.square_name(square),
+            "severity": "Medium",
+            "description": f"The pawn on {chess.square_name(square)} is isolated and may become a target."
+        })
     return findings
 
-def get_open_files(board):
+def get_open_files(board, pawns=None):
     """
     Identifies rooks on open or semi-open files.
     """
     findings = []
-    own_rooks = board.pieces(chess.ROOK, board.turn)
-    
-    for square in own_rooks:
-        file = chess.square_file(square)
-        
-        # Check for pawns on this file
-        white_pawns = board.pieces(chess.PAWN, chess.WHITE)
-        black_pawns = board.pieces(chess.PAWN, chess.BLACK)
-        
-        wp_on_file = any(chess.square_file(p_sq) == file for p_sq in white_pawns)
-        bp_on_file = any(chess.square_file(p_sq) == file for p_sq in black_pawns)
-        
-        if not wp_on_file and not bp_on_file:
+    pawns = pawns or get_pawn_structure(board)
+
+    for square in chess.scan_forward(board.pieces_mask(chess.ROOK, board.turn) & pawns.semi_open_files):
+        if chess.BB_SQUARES[square] & pawns.open_files:
             findings.append({
                 "type": "Open File",
                 "square": chess.square_name(square),
                 "severity": "Good",
                 "description": f"The rook on {chess.square_name(square)} is well-placed on an open file."
             })
-        elif (board.turn == chess.WHITE and not wp_on_file) or (board.turn == chess.BLACK and not bp_on_file):
+        else:
             findings.append({
                 "type": "Semi-Open File",
                 "square": chess.square_name(square),
                 "severity": "Good",
                 "description": f"The rook on {chess.square_name(square)} is on a semi-open file."
             })
-            
+
     return findings
 
 def get_king_safety(board):
@@ -99,34 +171,18 @@ def get_king_safety(board):
     if king_sq is None:
         return findings
 
-    king_rank = chess.square_rank(king_sq)
-    king_file = chess.square_file(king_sq)
-
-    # Gather adjacent squares
-    adjacent_squares = []
-    for dr in [-1, 0, 1]:
-        for df in [-1, 0, 1]:
-            if dr == 0 and df == 0:
-                continue
-            r, f = king_rank + dr, king_file + df
-            if 0 <= r <= 7 and 0 <= f <= 7:
-                adjacent_squares.append(chess.square(f, r))
-
     # Count light vs dark among adjacent squares
-    light_count = sum(1 for sq in adjacent_squares if chess.BB_SQUARES[sq] & chess.BB_LIGHT_SQUARES)
-    dark_count = len(adjacent_squares) - light_count
+    adjacent = chess.BB_KING_ATTACKS[king_sq]
+    light_count = chess.popcount(adjacent & chess.BB_LIGHT_SQUARES)
+    dark_count = chess.popcount(adjacent) - light_count
 
     # Determine the dominant color
     dominant_is_light = light_count >= dark_count
     dominant_count = max(light_count, dark_count)
+    dominant_mask = chess.BB_LIGHT_SQUARES if dominant_is_light else chess.BB_DARK_SQUARES
 
     # Check if the friendly bishop on the dominant color exists
-    has_matching_bishop = False
-    for bsq in board.pieces(chess.BISHOP, board.turn):
-        bishop_is_light = bool(chess.BB_SQUARES[bsq] & chess.BB_LIGHT_SQUARES)
-        if bishop_is_light == dominant_is_light:
-            has_matching_bishop = True
-            break
+    has_matching_bishop = bool(board.pieces_mask(chess.BISHOP, board.turn) & dominant_mask)
 
     if not has_matching_bishop and dominant_count >= 3:
         color_name = "light" if dominant_is_light else "dark"
@@ -145,64 +201,18 @@ def get_king_safety(board):
     return findings
 
 
-def get_knight_outposts(board):
+def get_knight_outposts(board, pawns=None):
     """
     Identifies knight outposts: knights on advanced ranks (4-6 for White,
     3-5 for Black) that cannot be challenged by enemy pawns on adjacent files.
     """
     findings = []
-    enemy_color = not board.turn
-    enemy_pawns = board.pieces(chess.PAWN, enemy_color)
-    own_pawns = board.pieces(chess.PAWN, board.turn)
-
-    for sq in board.pieces(chess.KNIGHT, board.turn):
-        rank = chess.square_rank(sq)
-        file = chess.square_file(sq)
-
-        # Advanced rank check (ranks 4-6 for White = indices 3-5, mirrored for Black)
-        if board.turn == chess.WHITE:
-            if rank < 3 or rank > 5:
-                continue
-        else:
-            if rank < 2 or rank > 4:
-                continue
-
-        # Check if any enemy pawn on adjacent files can advance to challenge
-        can_be_challenged = False
-        adj_files = [f for f in [file - 1, file + 1] if 0 <= f <= 7]
-
-        for p_sq in enemy_pawns:
-            p_file = chess.square_file(p_sq)
-            if p_file not in adj_files:
-                continue
-            p_rank = chess.square_rank(p_sq)
-            # Enemy pawn must be behind the knight (able to advance toward it)
-            if enemy_color == chess.WHITE:
-                # White enemy pawns advance up (increasing rank)
-                if p_rank < rank:
-                    can_be_challenged = True
-                    break
-            else:
-                # Black enemy pawns advance down (decreasing rank)
-                if p_rank > rank:
-                    can_be_challenged = True
-                    break
-
-        if can_be_challenged:
-            continue
-
-        # Check if supported by a friendly pawn
-        supported = False
-        for p_sq in own_pawns:
-            p_file = chess.square_file(p_sq)
-            p_rank = chess.square_rank(p_sq)
-            if p_file in adj_files:
-                if board.turn == chess.WHITE and p_rank == rank - 1:
-                    supported = True
-                    break
-                elif board.turn == chess.BLACK and p_rank == rank + 1:
-                    supported = True
-                    break
+    pawns = pawns or get_pawn_structure(board)
+
+    # Outpost squares exclude any square an enemy pawn on an adjacent file can still advance to challenge
+    for sq in chess.scan_forward(board.pieces_mask(chess.KNIGHT, board.turn) & pawns.outposts):
+        # Supported if a friendly pawn attacks the square (adjacent file, one rank behind)
+        supported = bool(pawns.pawn_supported & chess.BB_SQUARES[sq])
 
         severity = "Good" if supported else "Medium"
         support_str = "supported by a pawn" if supported else "unsupported"
@@ -219,21 +229,27 @@ def get_knight_outposts(board):
     return findings
 
 
-def analyze_positional_features(fen):
+def analyze_board(board):
     """
-    Main entry point for the positional engine.
+    Runs every detector on a board, from the side to move's point of view.
     """
-    board = chess.Board(fen)
     all_findings = []
-    
-    all_findings.extend(get_bad_bishops(board))
-    all_findings.extend(get_isolated_pawns(board))
-    all_findings.extend(get_open_files(board))
+    pawns = get_pawn_structure(board)
+
+    all_findings.extend(get_bad_bishops(board, pawns))
+    all_findings.extend(get_isolated_pawns(board, pawns))
+    all_findings.extend(get_open_files(board, pawns))
     all_findings.extend(get_king_safety(board))
-    all_findings.extend(get_knight_outposts(board))
-    
+    all_findings.extend(get_knight_outposts(board, pawns))
+
     return all_findings
 
+def analyze_positional_features(fen):
+    """
+    Main entry point for the positional engine.
+    """
+    return analyze_board(chess.Board(fen))
+
 if __name__ == "__main__":
     # Test 1: Isolated Queen's Pawn
     test1 = "r1bqk2r/pp2bppp/2n1p3/3pP3/3P4/5N2/PP3PPP/RNBQKB1R w KQkq - 0 1"
@@ -0,0 +1,187 @@
+"""
+On-demand cProfile capture of live requests.
+
+A request is profiled when any of these holds:
+- it carries an `X-Profile: 1` header or a `profile=1` query parameter;
+- a profiling window is open (`open_window(seconds, path_prefix)`), in which
+  case every matching request is profiled until it closes.
+
+For streamed responses (the SSE scans) the profiler is also switched on
+around each step of the generator, so the engine loop inside the stream is
+captured, not just the view that built it. Each profile is written to
+PROFILE_DIR as a .prof file (pstats format: `python -m pstats`, snakeviz,
+flameprof, ...). Only the newest MAX_PROFILES are kept.
+
+When no flag is present and no window is open, the cost per request is one
+header lookup and one substring check on the raw query string.
+"""
+import io
+import os
+import re
+import time
+import sys
+import uuid
+import pstats
+import cProfile
+import threading
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+PROFILE_DIR = os.environ.get("CHESS_MIMIC_PROFILE_DIR", os.path.join(BASE_DIR, "profiles"))
+MAX_PROFILES = int(os.environ.get("CHESS_MIMIC_PROFILE_KEEP", 50))
+# Longest window that can be opened in one go
+MAX_WINDOW_SECONDS = 3600
+
+_NAME_RE = re.compile(r"^[\w.-]+\.prof$")
+_lock = threading.Lock()
+_window = {"until": 0.0, "path": None}
+
+def open_window(seconds, path_prefix=None):
+    """Profiles every request (optionally only paths starting with path_prefix) for `seconds`."""
+    seconds = max(0.0, min(float(seconds), MAX_WINDOW_SECONDS))
+    with _lock:
+        _window["until"] = time.time() + seconds
+        _window["path"] = path_prefix or None
+    return window_status()
+
+def close_window():
+    with _lock:
+        _window["until"] = 0.0
+        _window["path"] = None
+    return window_status()
+
+def window_status():
+    remaining = _window["until"] - time.time()
+    return {"open": remaining > 0, "seconds_left": round(max(remaining, 0), 1), "path": _window["path"]}
+
+def _wanted(request):
+    if request.headers.get("X-Profile") in ("1", "true"):
+        return True
+    # Cheap test on the raw bytes before parsing the query string
+    if b"profile=" in request.query_string and request.args.get("profile") in ("1", "true"):
+        return True
+    if _window["until"] > time.time():
+        prefix = _window["path"]
+        return prefix is None or request.path.startswith(prefix)
+    return False
+
+class _Run:
+    """One profiled request: its profiler and the file it will be saved to."""
+
+    def __init__(self, request):
+        route = request.url_rule.rule if request.url_rule is not None else request.path
+        slug = re.sub(r"[^\w]+", "_", f"{request.method}{route}").strip("_")
+        self.name = f"{time.strftime('%Y%m%d-%H%M%S')}-{slug}-{uuid.uuid4().hex[:6]}.prof"
+        self.profiler = cProfile.Profile()
+        self.started = False
+        self.active = False
+
+    def enable(self):
+        """Switches the profiler on; False if another profiler is already active in this thread."""
+        # 3.12+ raises; before that enable() would silently take over the other hook
+        if sys.getprofile() is not None:
+            return False
+        try:
+            self.profiler.enable()
+        except ValueError:
+            return False
+        self.started = self.active = True
+        return True
+
+    def disable(self):
+        # Only our own: disabling clears the thread's profile hook, whoever set it
+        if self.active:
+            self.profiler.disable()
+            self.active = False
+
+    def save(self):
+        if not self.started:
+            return
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        path = os.path.join(PROFILE_DIR, self.name)
+        tmp = path + ".tmp"
+        self.profiler.dump_stats(tmp)
+        os.replace(tmp, path)
+        _prune()
+
+def _profiled_stream(iterable, run):
+    """Re-yields a streamed body with the profiler on while each chunk is produced."""
+    iterator = iter(iterable)
+    try:
+        while True:
+            run.enable()
+            try:
+                chunk = next(iterator)
+            except StopIteration:
+                break
+            finally:
+                run.disable()
+            yield chunk
+    finally:
+        close = getattr(iterable, "close", None)
+        if close is not None:
+            close()
+        run.save()
+
+def init_app(app):
+    from flask import request, g
+
+    @app.before_request
+    def _start():
+        if _wanted(request):
+            run = _Run(request)
+            # Left unprofiled (and without an X-Profile-Id) if another profiler holds the thread
+            if run.enable():
+                g.profile_run = run
+
+    @app.after_request
+    def _finish(response):
+        run = g.pop("profile_run", None)
+        if run is None:
+            return response
+        run.disable()
+        response.headers["X-Profile-Id"] = run.name
+        if response.is_streamed:
+            response.response = _profiled_stream(response.response, run)
+        else:
+            run.save()
+        return response
+
+def _prune():
+    with _lock:
+        entries = list_profiles()
+        for entry in entries[MAX_PROFILES:]:
+            try:
+                os.remove(os.path.join(PROFILE_DIR, entry["name"]))
+            except OSError:
+                pass
+
+def list_profiles():
+    """Saved profiles, newest first."""
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+    entries = []
+    for entry in os.scandir(PROFILE_DIR):
+        if _NAME_RE.match(entry.name):
+            stat = entry.stat()
+            entries.append({"name": entry.name, "size": stat.st_size, "created": round(stat.st_mtime, 3)})
+    entries.sort(key=lambda e: e["created"], reverse=True)
+    return entries
+
+def profile_path(name):
+    """Path of a saved profile, or None for unknown or malformed names."""
+    if not _NAME_RE.match(name):
+        return None
+    path = os.path.join(PROFILE_DIR, name)
+    return path if os.path.isfile(path) else None
+
+def summary(name, sort="cumulative", limit=60):
+    """pstats text report of a saved profile."""
+    path = profile_path(name)
+    if path is None:
+        return None
+    out = io.StringIO()
+    stats = pstats.Stats(path, stream=out)
+    if sort not in pstats.Stats.sort_arg_dict_default:
+        sort = "cumulative"
+    stats.strip_dirs().sort_stats(sort).print_stats(limit)
+    return out.getvalue()
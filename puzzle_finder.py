@@ -0,0 +1,156 @@
+"""
+Puzzle detection from stored per-ply evals.
+
+A scan stores, for every ply i, the engine's evaluation of the position
+before move i (games.evals: centipawns from White's view, mates as +-10000)
+and its best move there (games.best_moves). A puzzle is a move after which
+the evaluation swings by more than a threshold, so trying another threshold
+only needs those two arrays, not the engine:
+
+- mode "cp": |evals[i] - evals[i-1]| > threshold centipawns, the scan's rule;
+- mode "winprob": the same on win probability (0-100), so a swing between
+  two already-won positions no longer counts as a mistake.
+
+find_swings() handles a whole batch of games in one NumPy pass. Best moves
+that were never stored (games scanned before they were kept) are asked of
+the engine for the puzzle positions only, and saved for next time.
+"""
+import json
+import time
+import numpy as np
+import chess
+import chess.engine
+import database
+import replay
+
+MODES = ("cp", "winprob")
+# Lichess's centipawn -> win percentage curve
+WIN_PROB_K = 0.00368208
+# Engine time per missing best move, as in the scan
+BEST_MOVE_SECONDS = 0.1
+
+def win_probability(cp):
+    return 50 + 50 * (2 / (1 + np.exp(-WIN_PROB_K * np.asarray(cp, dtype=np.float64))) - 1)
+
+def find_swings(evals_per_game, threshold, mode="cp"):
+    """
+    evals_per_game: one list of evals per game.
+    Returns [(index into evals_per_game, ply)] for every ply whose eval differs
+    from the previous ply's by more than `threshold`; the puzzle is move ply - 1.
+    """
+    if mode not in MODES:
+        raise ValueError(f"mode must be one of {', '.join(MODES)}")
+    lengths = np.fromiter((len(e) for e in evals_per_game), dtype=np.int64, count=len(evals_per_game))
+    if lengths.sum() < 2:
+        return []
+    values = np.concatenate([np.asarray(e, dtype=np.float64) for e in evals_per_game if len(e)])
+    if mode == "winprob":
+        values = win_probability(values)
+    starts = np.cumsum(lengths) - lengths
+    # swing[j] compares flat plies j and j + 1; +1 gives the later ply
+    hits = np.flatnonzero(np.abs(np.diff(values)) > threshold) + 1
+    games = np.searchsorted(starts, hits, side="right") - 1
+    plies = hits - starts[games]
+    # Ply 0 of a game was compared with the last ply of the previous one
+    keep = plies > 0
+    return list(zip(games[keep].tolist(), plies[keep].tolist()))
+
+def load_replay(row, rebuilt):
+    """A game row's replay, rebuilt from row["pgn"] (and added to `rebuilt` for saving) when it was cleared."""
+    game_replay = replay.unpack(row['replay'])
+    if game_replay is None and row.get('pgn'):
+        game_replay = replay.build_from_pgn(row['pgn'])
+        if game_replay is not None:
+            rebuilt[row['id']] = replay.pack(game_replay)
+    return game_replay
+
+def _fill_best_moves(missing, stats):
+    """missing: [(game_id, best_moves list, ply, fen)]; fills the lists in place. False if there is no engine."""
+    import engine_pool
+    pool = engine_pool.get_pool()
+    if not pool.available():
+        return False
+    limit = chess.engine.Limit(time=BEST_MOVE_SECONDS)
+    try:
+        with pool.engine(priority=engine_pool.BACKGROUND) as engine:
+            for _, best_moves, ply, fen in missing:
+                pool.wait_turn(engine)
+                info = engine_pool.analyse(engine, chess.Board(fen), limit, engine_pool.BACKGROUND)
+                if info.get("pv"):
+                    best_moves[ply] = info["pv"][0].uci()
+                stats["engine_calls"] += 1
+    except engine_pool.EngineUnavailable:
+        return False
+    return True
+
+def _rethreshold_batch(rows, threshold, mode, stats):
+    # Imported here: player_stats builds on this module
+    import player_stats
+    games = []
+    for row in rows:
+        evals = json.loads(row['evals'])
+        best_moves = json.loads(row['best_moves']) if row.get('best_moves') else []
+        games.append((row, evals, best_moves + [None] * (len(evals) - len(best_moves))))
+    found = [(games[index], ply) for index, ply in find_swings([evals for _, evals, _ in games], threshold, mode)]
+
+    replays = {}
+    rebuilt = {}
+    candidates = []
+    missing = []
+    for (row, evals, best_moves), ply in found:
+        if row['id'] not in replays:
+            replays[row['id']] = load_replay(row, rebuilt)
+        game_replay = replays[row['id']]
+        # Evals from before the PGN was edited no longer line up with its moves
+        if game_replay is None or len(game_replay["uci"]) != len(evals):
+            stats["skipped"] += 1
+            continue
+        move = ply - 1
+        fen = replay.fens(game_replay)[move]
+        if best_moves[move] is None:
+            missing.append((row['id'], best_moves, move, fen))
+        candidates.append((row, evals, best_moves, move, fen, game_replay["uci"][move]))
+
+    if rebuilt:
+        database.save_replays(rebuilt)
+    if missing and _fill_best_moves(missing, stats):
+        for game_id, best_moves in {game_id: best_moves for game_id, best_moves, _, _ in missing}.items():
+            database.save_best_moves(game_id, json.dumps(best_moves))
+
+    puzzles = []
+    for row, evals, best_moves, move, fen, played in candidates:
+        if best_moves[move] is None:
+            stats["skipped"] += 1
+            continue
+        puzzles.append((row['id'], fen, best_moves[move], played, evals[move], evals[move + 1],
+                        move // 2 + 1, move, "white" if move % 2 == 0 else "black"))
+    # Games without evals keep whatever puzzles they have
+    database.replace_puzzles([row['id'] for row, _, _ in games], puzzles)
+    player_stats.update_games([row['id'] for row, _, _ in games])
+    stats["puzzles"] += len(puzzles)
+
+def rethreshold(threshold, mode="cp", folder_id=None, game_ids=None):
+    """
+    Re-derives the puzzles of every scanned game (optionally of one folder or
+    some games) from stored evals. Returns counters and the time taken.
+    """
+    if mode not in MODES:
+        raise ValueError(f"mode must be one of {', '.join(MODES)}")
+    start = time.perf_counter()
+    stats = {"games": 0, "scanned_games": 0, "puzzles": 0, "engine_calls": 0, "skipped": 0}
+    columns = "id, evals, best_moves, replay, CASE WHEN replay IS NULL THEN pgn END AS pgn"
+    batch = []
+    for row in database.iter_games(folder_id, game_ids, columns=columns):
+        stats["games"] += 1
+        if not row['evals']:
+            continue
+        batch.append(row)
+        if len(batch) >= database.EXPORT_BATCH_SIZE:
+            _rethreshold_batch(batch, threshold, mode, stats)
+            stats["scanned_games"] += len(batch)
+            batch = []
+    if batch:
+        _rethreshold_batch(batch, threshold, mode, stats)
+        stats["scanned_games"] += len(batch)
+    stats["seconds"] = round(time.perf_counter() - start, 3)
+    return stats
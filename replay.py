@@ -0,0 +1,50 @@
+"""
+Pre-parsed move lists for the game viewer.
+
+The SAN/UCI/FEN of every ply is computed once when a game is stored and kept
+in games.replay as zlib-compressed JSON, so opening a game is one row read
+instead of a PGN parse and replay. A trigger clears the blob whenever the
+PGN changes; it is rebuilt on the next read.
+"""
+import io
+import json
+import zlib
+import chess.pgn
+
+FORMAT_VERSION = 1
+
+def build(game):
+    """chess.pgn.Game -> {"v", "initial_fen", "san": [...], "uci": [...], "fen": [...]} (FEN after each ply)."""
+    board = game.board()
+    initial_fen = board.fen()
+    san, uci, fen = [], [], []
+    for move in game.mainline_moves():
+        san.append(board.san(move))
+        uci.append(move.uci())
+        board.push(move)
+        fen.append(board.fen())
+    return {"v": FORMAT_VERSION, "initial_fen": initial_fen, "san": san, "uci": uci, "fen": fen}
+
+def build_from_pgn(pgn):
+    game = chess.pgn.read_game(io.StringIO(pgn))
+    return build(game) if game is not None else None
+
+def pack(replay):
+    return zlib.compress(json.dumps(replay, separators=(",", ":")).encode("utf-8"))
+
+def unpack(blob):
+    """Returns the replay dict, or None if the blob is missing or from an older format."""
+    if not blob:
+        return None
+    replay = json.loads(zlib.decompress(blob))
+    return replay if replay.get("v") == FORMAT_VERSION else None
+
+def fens(replay):
+    """Every position of the game, the initial one first."""
+    return [replay["initial_fen"]] + replay["fen"]
+
+def moves(replay, annotations=None):
+    """Viewer move list: [{"san", "uci", "fen", "comment"}]."""
+    annotations = annotations or {}
+    return [{"san": s, "uci": u, "fen": f, "comment": annotations.get(f, "")}
+            for s, u, f in zip(replay["san"], replay["uci"], replay["fen"])]
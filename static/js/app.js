@@ -6,6 +6,9 @@
         let gameMoves = [];
         let gameEvals = [];
         const ARROW_COLOR = '#60a5fa';
+        // One id per tab: the server cancels this tab's older /analyze request when a newer one arrives
+        const ANALYSIS_CLIENT = Math.random().toString(36).slice(2);
+        let analysisRequest = null;
 
         function onDrop(source, target) {
             let move = game.move({ from: source, to: target, promotion: 'q' });
@@ -111,7 +114,11 @@
             }
 
             $('#engine-status').text('Engine: Thinking...');
-            $.get('/analyze?fen=' + encodeURIComponent(game.fen()), function (data) {
+            if (analysisRequest) analysisRequest.abort();
+            let analyzeUrl = '/analyze?fen=' + encodeURIComponent(game.fen()) + '&client=' + ANALYSIS_CLIENT;
+            // Lets the server pre-analyse the neighbouring plies of the open game
+            if (selectedGameId !== null) analyzeUrl += '&game_id=' + selectedGameId + '&ply=' + (currentMoveIndex + 1);
+            analysisRequest = $.get(analyzeUrl, function (data) {
                 if (!data) return;
                 while (svg.firstChild) svg.removeChild(svg.firstChild);
                 $('#engine-status').text('Engine: Ready');
@@ -978,7 +985,7 @@
                     fetch(`/games/${gameIds[i]}/scan-chunked`, {
                         method: 'POST',
                         headers: { 'Content-Type': 'application/json' },
-                        body: JSON.stringify({ chunk_size: 10, delay_ms: 500, threshold: 100 })
+                        body: JSON.stringify({ chunk_size: 10, threshold: 100 })
                     }).then(response => {
                         const reader = response.body.getReader();
                         function read() {
@@ -1279,10 +1286,11 @@
 
             // Use fetch + ReadableStream to consume SSE from POST endpoint
             const threshold = parseInt($(`#threshold-${id}`).val()) || 100;
+            // workers: 0 lets the server analyse ranges of this game on every free engine
             fetch(`/games/${id}/scan-chunked`, {
                 method: 'POST',
                 headers: { 'Content-Type': 'application/json' },
-                body: JSON.stringify({ chunk_size: 10, delay_ms: 500, threshold: threshold })
+                body: JSON.stringify({ chunk_size: 10, threshold: threshold, workers: 0 })
             }).then(response => {
                 const reader = response.body.getReader();
                 const decoder = new TextDecoder();
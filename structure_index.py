@@ -0,0 +1,113 @@
+import numpy as np
+import chess
+import database
+import position_index
+
+# Columnar copy of the positions table, rebuilt when the index changes
+_columns = None
+_columns_version = None
+
+# Pawn masks and material signatures fit in 63 bits, so SQLite's signed integers read back as-is
+_ROW_DTYPE = np.dtype([("game_id", np.int64), ("ply", np.int32), ("white_pawns", np.uint64),
+                       ("black_pawns", np.uint64), ("material", np.uint64)])
+
+_POPCOUNT8 = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+_NIBBLE_SHIFTS = np.arange(len(position_index.MATERIAL_PIECES), dtype=np.uint64) * np.uint64(4)
+
+def _popcount(a):
+    """Per-element popcount of a uint64 array."""
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(a).astype(np.int32)
+    return _POPCOUNT8[a.view(np.uint8).reshape(-1, 8)].sum(axis=1, dtype=np.int32)
+
+def _material_counts(material):
+    """Unpacks material signatures into an (N, 10) array of piece counts."""
+    material = np.asarray(material, dtype=np.uint64).reshape(-1, 1)
+    return ((material >> _NIBBLE_SHIFTS) & np.uint64(0xF)).astype(np.int32)
+
+def load_columns():
+    """
+    Returns the index as parallel arrays:
+    { "game_id": int64[N], "ply": int32[N], "white_pawns": uint64[N],
+      "black_pawns": uint64[N], "material": uint64[N],
+      "material_counts": int8[N, 10] }
+    """
+    global _columns, _columns_version
+    position_index.ensure_indexed()
+    version = database.get_positions_version()
+    if _columns is not None and _columns_version == version:
+        return _columns
+
+    # Each batch goes straight into a record array; no list of every row's tuple
+    chunks = [np.fromiter(rows, dtype=_ROW_DTYPE, count=len(rows))
+              for rows in database.iter_position_structures()]
+    rows = np.concatenate(chunks) if chunks else np.empty(0, dtype=_ROW_DTYPE)
+    _columns = {name: np.ascontiguousarray(rows[name]) for name in _ROW_DTYPE.names}
+    _columns["material_counts"] = _material_counts(_columns["material"]).astype(np.int8)
+    _columns_version = version
+    return _columns
+
+def distances(board, mode="pawns"):
+    """
+    Returns (columns, distance) where distance[i] is how far indexed ply i is
+    from the board:
+      "pawns":    Hamming distance between the white and black pawn masks
+      "material": sum of absolute piece-count differences
+      "both":     the sum of the two
+    """
+    cols = load_columns()
+    _, white_pawns, black_pawns, material = position_index.position_row(board)
+
+    dist = np.zeros(len(cols["ply"]), dtype=np.int32)
+    if mode in ("pawns", "both"):
+        dist += _popcount(cols["white_pawns"] ^ np.uint64(white_pawns))
+        dist += _popcount(cols["black_pawns"] ^ np.uint64(black_pawns))
+    if mode in ("material", "both"):
+        diff = cols["material_counts"] - _material_counts(material).astype(np.int8)
+        dist += np.abs(diff).sum(axis=1, dtype=np.int32)
+    return cols, dist
+
+def search_structure(fen, mode="pawns", max_distance=4, limit=50):
+    """
+    Returns games that reached a position similar to `fen`, best match first:
+    [ { "id": int, "white": str, ..., "distance": int, "plies": [int] } ]
+    `plies` lists the plies of the game at the best distance.
+    """
+    if mode not in ("pawns", "material", "both"):
+        raise ValueError(f"Unknown mode: {mode}")
+    board = chess.Board(fen)
+    cols, dist = distances(board, mode)
+
+    hits = np.nonzero(dist <= max_distance)[0]
+    if len(hits) == 0:
+        return []
+    # Sort by (distance, game, ply), then keep the first (best) ply per game
+    order = hits[np.lexsort((cols["ply"][hits], cols["game_id"][hits], dist[hits]))]
+    _, first = np.unique(cols["game_id"][order], return_index=True)
+    best = order[np.sort(first)][:limit]
+
+    game_ids = [int(g) for g in cols["game_id"][best]]
+    info = database.get_games_by_ids(game_ids)
+    results = []
+    for idx, game_id in zip(best, game_ids):
+        if game_id not in info:
+            continue
+        best_dist = dist[idx]
+        same_game = hits[(cols["game_id"][hits] == game_id) & (dist[hits] == best_dist)]
+        entry = dict(info[game_id])
+        entry["distance"] = int(best_dist)
+        entry["plies"] = sorted(int(p) for p in cols["ply"][same_game])
+        results.append(entry)
+    return results
+
+if __name__ == "__main__":
+    import sys
+    import time
+    fen = sys.argv[1] if len(sys.argv) > 1 else chess.STARTING_FEN
+    mode = sys.argv[2] if len(sys.argv) > 2 else "pawns"
+    load_columns()
+    start = time.perf_counter()
+    matches = search_structure(fen, mode)
+    print(f"Found {len(matches)} games in {(time.perf_counter() - start) * 1000:.1f} ms")
+    for m in matches[:10]:
+        print(f"  #{m['id']} {m['white']} - {m['black']} (distance {m['distance']}, plies {m['plies']})")